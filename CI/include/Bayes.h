@@ -10,17 +10,24 @@
 //          30 May 2015 HBP add a constructor to take RooFit
 //                      models directly rather than through
 //                      PDFWrapper
+//          18-Oct-2026     add log-space mode
+//          18-Oct-2026     tabulate the cdf in a single sweep and add
+//                          percentiles
+//          18-Oct-2026     use the table of a tabulated likelihood
+//          18-Oct-2026     call RooInclusiveJetPdf directly
+//          18-Oct-2026     add constructor for a tabulated likelihood
 //
 //--------------------------------------------------------------
 #include <vector>
 #include <string>
 #include "PDFunction.h"
 #include "PriorFunction.h"
-#include "Math/Interpolator.h"
 #include "RooAbsPdf.h"
 #include "RooArgSet.h"
 #include "RooRealVar.h"
 //--------------------------------------------------------------
+class RooInclusiveJetPdf;
+
 class Bayes
 {
 public:
@@ -50,14 +57,40 @@ public:
 	double cl=0.95,
 	RooAbsPdf* prior_=0);
 
+  /** Tabulated likelihood constructor. The posterior is computed in
+      log space from the table (see normalize) over [x.front(), x.back()].
+      @param x      - points, in increasing order
+      @param logy   - log(likelihood) at the points x
+      @param cl     - confidence level
+      @param prior  - prior funtion (default = flat)
+  */
+  Bayes(const std::vector<double>& x,
+	const std::vector<double>& logy,
+	double cl=0.95,
+	PriorFunction* prior_=0);
+
   virtual ~Bayes();
 
   ///
   void reset() { normalize(); }
+
+  /** Integrate the posterior in log space. The likelihood is obtained
+      from PDFunction::logLikelihood and scaled by its maximum before
+      exponentiation, so the posterior does not underflow when the
+      likelihood itself does.
+  */
+  void setLogSpace(bool yes=true) { _logspace = yes; _normalize = true; }
+  bool logSpace() { return _logspace; }
+
+  /// Log of the normalization of the (unscaled) posterior density.
+  double logNormalization();
   
   /// Compute a percentile of the posterior density.
   double percentile(double p=-1);
 
+  /// Compute several percentiles of the posterior density.
+  std::vector<double> percentiles(const std::vector<double>& p);
+
   /// Compute estimate (take it to be the mode of posterior density).
   std::pair<double, double> estimate(double guess=0);
   
@@ -69,7 +102,13 @@ public:
    */  
   double likelihood(double poi);
 
-  /** Compute normalization of posterior density.
+  /** Compute normalization of posterior density. The product of
+      likelihood and prior is computed at _nsteps+1 equally spaced
+      points and taken to be linear between them. The posterior
+      density, cdf and percentiles are computed from this table.
+      If the likelihood is tabulated (see PDFunction::table) over the
+      range of the parameter of interest, the points of its table are
+      used instead and the likelihood is not evaluated.
    */  
   double normalize();
 
@@ -90,6 +129,7 @@ public:
 
 private:
   PDFunction*    _pdf;
+  RooInclusiveJetPdf* _jetpdf; // if wrapped by PDFWrapper
   std::vector<double> _data;
   double _poimin;
   double _poimax;
@@ -99,18 +139,29 @@ private:
   RooRealVar*    _rfpoi;
   bool   _normalize;
   
-  ROOT::Math::Interpolator* _interp;  
   int _nsteps;
-  std::vector<double> _x;
-  std::vector<double> _y;
+  std::vector<double> _x; // grid
+  std::vector<double> _y; // likelihood * prior (scaled in log space)
+  std::vector<double> _c; // cdf
+
+  // log(likelihood) table, if not given by _pdf
+  std::vector<double> _tablex;
+  std::vector<double> _tablelogy;
   
   double _normalization;
   double _likeprior(double poi);
-  double _q(double prob);
-  double _f(double prob);
+  void   _grid();
+  bool   _table();
+  double _interpolate(const std::vector<double>& x,
+		      const std::vector<double>& logy,
+		      double poi);
+  int    _interval(double poi);
+  double _quantile(double prob);
   double _nsig;
   double _postmax;
   int    _verbosity;
+  bool   _logspace;
+  double _logmax;
 };
 
 #endif
@@ -7,6 +7,7 @@
 #include "RooAbsReal.h"
 #include "TH1D.h"
 #include "TFile.h"
+#include "SpectrumStore.h"
 
 class CISpectrum : public RooAbsReal
 {
@@ -18,6 +19,15 @@ class CISpectrum : public RooAbsReal
 	     double ptmin=0,
 	     std::string prefix="",
 	     std::string filename="");
+
+  /** Read the coefficients from record key of a spectrum store
+      (see SpectrumStore), rather than from ROOT files.
+  */
+  CISpectrum(const char* namen, const char* title,
+	     SpectrumStore& store, std::string key,
+	     int nbins=0,
+	     double ptmin=0,
+	     std::string prefix="");
   CISpectrum(const CISpectrum& other, const char* newname=0);
   ~CISpectrum() {}
 
@@ -29,7 +39,15 @@ class CISpectrum : public RooAbsReal
   TH1D*  operator()(double lambda, std::vector<double>& kappa);
   double operator()(double lambda,
 		    std::vector<double>& kappa, int index) const;
-  void set(int which_=0) { which = which_; }
+  void set(int which_=0) { which = which_; w_.clear(); }
+  bool leadingOrder() const { return which < 0; }
+
+  /// Fold the coefficients into basis weights if kappa has changed.
+  void setKappa(const std::vector<double>& kappa) const;
+
+  /// Coefficients of bin ii packed in the order bi, aig, ai, bij, aijg,
+  /// aij, bi4, ai4g, ai4.
+  std::vector<double> coefficients(int ii) const;
 
   std::vector<double> get()
     {
@@ -76,6 +94,8 @@ class CISpectrum : public RooAbsReal
   void init(std::string rootfile, 
 	    std::string hname);
 
+  void book(std::string prefix);
+
   void get(std::string histdir, 
 	   std::string histname, 
 	   std::string name, 
@@ -84,6 +104,10 @@ class CISpectrum : public RooAbsReal
 
   int which;
   double blo, alo, bnlo, anlo;
+
+  mutable std::vector<double> kappa_; //! kappa of current weights
+  mutable std::vector<double> w_;     //! basis weights (4 per bin)
+
   ClassDef(CISpectrum,1)
 };
 
@@ -80,6 +80,24 @@ public:
 	     const std::vector<double>& ai4g, 
 	     const std::vector<double>& ai4);
 
+  /** For fixed kappa, the CI cross section in a bin is
+      w[0] f[0] + w[1] f[1] + w[2] f[2] + w[3] f[3], where
+      f = (lambda, lambda log(sqrt(lambda)), lambda^2,
+      lambda^2 log(sqrt(lambda))) are the basis functions and w are
+      the weights computed from the coefficients packed in the order
+      bi, aig, ai, bij, aijg, aij, bi4, ai4g, ai4 (57 numbers).
+      If lo is true, the weights of the LO cross section are returned.
+  */
+  static void basisWeights(const std::vector<double>& kappa,
+			   const double* coef, bool lo, double* w);
+
+  static void basisFunctions(double lambda, double* f);
+
+  static double basisSum(const double* w, const double* f)
+  {
+    return w[0]*f[0] + w[1]*f[1] + w[2]*f[2] + w[3]*f[3];
+  }
+
 private:
   std::string _filename;
   int _status;
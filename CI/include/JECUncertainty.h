@@ -17,19 +17,58 @@
 //   double ptnew = pt * (1 + x*unc);           
 //
 // Created:     17-May-2016 Harrison B. Prosper   (Bari, Italy)   
+// Updated:     18-Oct-2026 copy the table into an array and close the file
+//                          in the constructor. add bilinear interpolation.
+//              18-Oct-2026 add setHistogram, to benchmark the lookup.
 //-----------------------------------------------------------------------------
 #include <string>
+#include <vector>
 #include "TFile.h"
 #include "TH2F.h"
 //-----------------------------------------------------------------------------
 class JECUncertainty
 {
  public:
-  JECUncertainty() {}
-  JECUncertainty(std::string rootFileName);
+  JECUncertainty()
+    : table_(0), values(std::vector<double>()), bilinear(false),
+      histogram_(0),
+      ptbins(0), ptmin(0), ptmax(0), ptscale(0), ptstep(0),
+      etabins(0), etamin(0), etamax(0), etascale(0), etastep(0) {}
+
+  /** Read table from file.
+      @param rootFileName - file containing the 2-D histogram htable
+      @param bilinear_    - interpolate bilinearly between bin centers
+  */
+  JECUncertainty(std::string rootFileName, bool bilinear_=false);
+  JECUncertainty(const JECUncertainty&);
+  JECUncertainty& operator=(const JECUncertainty&);
   ~JECUncertainty();
-  double operator()(double pt, double eta);
 
+  double operator()(double pt, double eta)
+  {
+    if ( (pt < ptmin) | (pt > ptmax) | (eta < etamin) | (eta > etamax) )
+      return outOfRange_(pt, eta);
+    if ( bilinear | (histogram_ != 0) )
+      return histogram_ ? histogramLookup_(pt, eta) : interpolate_(pt, eta);
+    
+    // the upper edges belong to the last bins
+    int ix = (int)((pt  - ptmin) *ptscale);
+    int iy = (int)((eta - etamin)*etascale);
+    ix -= ix == ptbins;
+    iy -= iy == etabins;
+    return values[iy*ptbins + ix];
+  }
+
+  void   setBilinear(bool yes=true) { bilinear = yes; }
+  bool   isBilinear() { return bilinear; }
+
+  /** Look the values up in histogram h, which is not copied, as was
+      done before 18-Oct-2026 (bin number from the bin width, then
+      GetBinContent). This is slower and is used only to benchmark the
+      lookup. If h is 0, the array is used again.
+  */
+  void   setHistogram(TH2F* h=0);
+  
   int    ptBins()  { return ptbins; }    
   double ptMin()   { return ptmin; }
   double ptMax()   { return ptmax; }
@@ -38,21 +77,30 @@ class JECUncertainty
   double etaMin()  { return etamin; }
   double etaMax()  { return etamax; }
 
+  /// Copy of the table, not attached to any file.
   TH2F*  table()   { return table_; }
 
  private:
-  TFile* rfile;
   TH2F*  table_;
+  std::vector<double> values; // values[iy*ptbins + ix]
+  bool   bilinear;
+  TH2F*  histogram_; // not owned (see setHistogram)
 
   int    ptbins;
   double ptmin;
   double ptmax;
-  double ptstep;
+  double ptscale;  // 1/(bin width)
+  double ptstep;   // bin width of histogram_
 
   int    etabins;
   double etamin;
   double etamax;
-  double etastep;
+  double etascale; // 1/(bin width)
+  double etastep;  // bin width of histogram_
+
+  double outOfRange_(double pt, double eta);
+  double interpolate_(double pt, double eta);
+  double histogramLookup_(double pt, double eta);
 };
 
 #endif
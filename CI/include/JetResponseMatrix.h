@@ -0,0 +1,82 @@
+#ifndef JETRESPONSEMATRIX_H
+#define JETRESPONSEMATRIX_H
+// ---------------------------------------------------------------------------
+// file: JetResponseMatrix.h
+// Description: the jet response function of JetSpectrumSmeared, for a given
+//              choice of JES and JER variates (x, y), discretized as a
+//              matrix that maps a true spectrum, tabulated on a uniform
+//              grid of true pT, to the smeared spectrum at the reco-level
+//              pT points of JetSpectrumSmeared. The matrix is computed once
+//              and can be applied to any number of spectra.
+// Usage:
+//   JetResponseMatrix R(&JESunc, 0.1, x, y, 500, 4000);
+//   JetSpectrumSmeared sspectrum(&spectrum, &R);
+//           :  :
+//   std::vector<double> xsection = R.apply(&spectrum);
+//
+// Created: 18-Oct-2026
+// ---------------------------------------------------------------------------
+#include <vector>
+// ---------------------------------------------------------------------------
+class JetSpectrum;
+class JECUncertainty;
+
+class JetResponseMatrix
+{
+ public:
+  JetResponseMatrix() {}
+
+  /** Compute the response matrix.
+      @param JESunc_ - jet energy scale uncertainty
+      @param JERunc_ - relative uncertainty in jet energy resolution
+      @param x_      - JES variate
+      @param y_      - JER variate
+      @param pTmin_  - minimum reco-level pT
+      @param pTmax_  - maximum reco-level pT
+      @param npT_    - number of reco-level pT intervals
+      @param step_   - step size of the true pT grid (GeV)
+  */
+  JetResponseMatrix(JECUncertainty* JESunc_,
+		    double JERunc_=0.1,
+		    double x_=0, double y_=0,
+		    double pTmin_=500.0,
+		    double pTmax_=4000.0,
+		    int npT_=100,
+		    double step_=2.0);
+
+  ~JetResponseMatrix() {}
+
+  /// Smeared cross section at the reco-level pT points.
+  std::vector<double> apply(JetSpectrum* spectrum);
+
+  /// Same, given the true spectrum at the true pT points.
+  std::vector<double> apply(const std::vector<double>& xsection);
+
+  /// Reco-level pT points.
+  std::vector<double>& pT() { return pTreco; }
+
+  /// True pT points.
+  std::vector<double>& truepT() { return pTtrue; }
+
+  double response(double pTreco, double pT);
+  double sigmapT(double pT);
+
+  double JESvariate() { return x; }
+  double JERvariate() { return y; }
+  JECUncertainty* JES() { return JESunc; }
+  double JER() { return JERunc; }
+
+ private:
+  JECUncertainty* JESunc;
+  double JERunc;
+  double x, y;
+  double step;
+  std::vector<double> pTreco;
+  std::vector<double> pTtrue;
+
+  // non-zero elements of each row start at column first[c]
+  std::vector<int> first;
+  std::vector<std::vector<double> > weight;
+};
+
+#endif
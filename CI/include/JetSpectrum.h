@@ -3,6 +3,7 @@
 // ----------------------------------------------------------------------------
 // file: JetSpectrum.h
 // HBP 2012 - 2014
+// Updated: 18-Oct-2026 add binIntegrals
 // ----------------------------------------------------------------------------
 #include <vector>
 #include <string>
@@ -35,6 +36,13 @@ class JetSpectrum
   
   double operator()(double pT);
   double operator()(double pTlow, double pThigh);
+
+  /** Integrals of the spectrum over the bins defined by the bin edges,
+      computed using Gauss-Legendre quadrature on each interpolation
+      segment within a bin. As for operator()(pTlow, pThigh), a bin
+      that is not within the range of the spectrum is set to zero.
+  */
+  std::vector<double> binIntegrals(const std::vector<double>& edges);
   double NPC(double pT);
   double EWKC(double pT);
   bool   positive() {return _positive;}
@@ -5,6 +5,9 @@
 // HBP 2012 - 2014
 // Updated: 23-Jun-2016 HBP use JECUncertainty
 //          28-Sep-2016 HBP fix upper pT limit bug in constructor.
+//          18-Oct-2026     add smearing with a JetResponseMatrix
+//          18-Oct-2026     add Gauss-Hermite smearing
+//          18-Oct-2026     add binIntegrals
 // ---------------------------------------------------------------------------
 #include <vector>
 #include <string>
@@ -23,19 +26,34 @@
 // --------------------------------------------------------------------------
 class JetSpectrum;
 class JECUncertainty;
+class JetResponseMatrix;
 
 class JetSpectrumSmeared
 {
  public:
   JetSpectrumSmeared() {}
 
+  /** Smear the spectrum at npT_+1 reco-level pT points. If nhermite_ > 0,
+      the convolution of the spectrum with the response function is
+      computed using nhermite_ Gauss-Hermite nodes, after a change of
+      variables that absorbs the pT dependence of the resolution,
+      rather than by adaptive integration.
+  */
   JetSpectrumSmeared(JetSpectrum* spectrum_,
 		     JECUncertainty* JESunc_=0,
 		     double JERunc_=0.1,
 		     double x_=0, double y_=0,
 		     double pTmin_=500.0,
 		     double pTmax_=4000.0,
-		     int npT_=100);
+		     int npT_=100,
+		     int nhermite_=0);
+
+  /** Smear the spectrum with a precomputed response matrix, which
+      defines the JES and JER variates and the reco-level pT points.
+      The matrix can be shared by any number of spectra.
+  */
+  JetSpectrumSmeared(JetSpectrum* spectrum_,
+		     JetResponseMatrix* matrix);
 
   JetSpectrumSmeared(const JetSpectrumSmeared&);
 
@@ -61,8 +79,17 @@ class JetSpectrumSmeared
   
   double operator()(double pT);
   double operator()(double pTlow, double pThigh);
+
+  /** Integrals of the smeared spectrum over the bins defined by the bin
+      edges. The spectrum is linear, or if positive, exponential between
+      the reco-level pT points, so the integrals are computed exactly.
+      As for operator()(pTlow, pThigh), a bin that is not within the
+      range of the spectrum is set to zero.
+  */
+  std::vector<double> binIntegrals(const std::vector<double>& edges);
   double response(double pTreco, double pT);
   double sigmapT(double pT);
+  static double resolution(double pT);
   double integrand(double pT);
   void setxy(double x_, double y_) { x = x_; y = y_; }
 
@@ -75,6 +102,9 @@ private:
   double x, y;
   double pTmin, pTmax;
   int npT;
+  int nhermite;
+  std::vector<double> hermiteu;
+  std::vector<double> hermitew;
   std::vector<double> pT;
   std::vector<double> xsection;
   ROOT::Math::Interpolator* interp;
@@ -91,6 +121,7 @@ private:
   
   double pTreco_;
   double applySmearing_(double pT);
+  double applyHermiteSmearing_(double pT);
 
 };
 
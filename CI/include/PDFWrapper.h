@@ -8,6 +8,9 @@
 // 
 // Created: 14-Mar-2013
 // Updated: 06-Mar-2014
+//          18-Oct-2026 add logLikelihood
+//          18-Oct-2026 add table
+//          18-Oct-2026 call RooInclusiveJetPdf directly
 //
 //--------------------------------------------------------------
 #include <vector>
@@ -18,6 +21,7 @@
 #include "RooArgList.h"
 #include "RooArgSet.h"
 #include "RooRealVar.h"
+#include "RooInclusiveJetPdf.h"
 
 /**  A wrapper for RooAbsPdf objects.
 */
@@ -47,10 +51,32 @@ class PDFWrapper : public PDFunction
   */
   std::vector<double>& generate(double poi);
   
-  /** Computes PDF.
+  /** Computes PDF. If the pdf is a RooInclusiveJetPdf, it is called
+      directly using its snapshot of the counts and kappa, which is
+      taken when the wrapper is created and when setData is called.
+      Call snapshot() if the counts or kappa are changed otherwise.
       @param poi  - parameter of interest 
   */
   double operator() (double poi);
+
+  /** Computes log(PDF). If the pdf is a RooInclusiveJetPdf, the
+      logarithm is computed directly so that it does not underflow.
+      @param poi  - parameter of interest 
+  */
+  double logLikelihood(double poi);
+
+  /** Get the tabulated log likelihood (see RooInclusiveJetPdf::table).
+      Returns false if the pdf is not a RooInclusiveJetPdf that is
+      being interpolated.
+  */
+  bool table(std::vector<double>& x, std::vector<double>& logy);
+
+  /// Copy counts and kappa of a RooInclusiveJetPdf into plain arrays.
+  void snapshot() { if ( _jetpdf ) _jetpdf->snapshot(); }
+
+  /// Return the pdf if it is a RooInclusiveJetPdf, otherwise 0.
+  RooInclusiveJetPdf* jetPdf() { return _jetpdf; }
+
   virtual RooRealVar* getPoi() {return _poi;}
   virtual std::string GetTitle() {return _pdf->GetTitle(); }
 
@@ -62,6 +88,7 @@ class PDFWrapper : public PDFunction
   RooArgSet*  _obs;
   RooRealVar* _poi;
   RooArgList  _list;
+  RooInclusiveJetPdf* _jetpdf;
 
   std::vector<double> _data;
   
@@ -19,6 +19,7 @@
 //
 // Created: June 11, 2010
 // Modifications: 
+//   18-Oct-2026 add table
 //
 //--------------------------------------------------------------
 #include <vector>
@@ -61,6 +62,13 @@ class PDFunction
   virtual void setData(std::vector<double>& _data)=0;
 
   virtual double logLikelihood(double /** theta */) { return 0; }
+
+  /** If the likelihood is tabulated, get its log at the points x
+      and return true; otherwise return false. The likelihood is
+      taken to be linear between the points.
+  */
+  virtual bool table(std::vector<double>& /** x */,
+		     std::vector<double>& /** logy */) { return false; }
   
  private:
   ClassDef(PDFunction,1)
@@ -7,6 +7,7 @@
 #include "RooAbsReal.h"
 #include "TH1D.h"
 #include "TFile.h"
+#include "SpectrumStore.h"
 
 class QCDSpectrum : public RooAbsReal
 {
@@ -16,6 +17,14 @@ class QCDSpectrum : public RooAbsReal
 	      std::string _histdir, std::string _histname,
 	      int nbins=0, double ptmin=0,
 	      std::string _prefix="");
+
+  /** Read the spectrum from record key of a spectrum store
+      (see SpectrumStore), rather than from qcd.root.
+  */
+  QCDSpectrum(const char* namen, const char* title,
+	      SpectrumStore& store, std::string key,
+	      int nbins=0, double ptmin=0,
+	      std::string _prefix="");
   
   QCDSpectrum(const QCDSpectrum& other, const char* newname=0);
   ~QCDSpectrum() {}
@@ -53,6 +62,8 @@ class QCDSpectrum : public RooAbsReal
 	   std::string histname, 
 	   std::vector<double>& h);
 
+  void book(std::string prefix);
+
   ClassDef(QCDSpectrum,1)
 };
 
@@ -8,6 +8,28 @@
 //                      likelihoods from the ensemble of likelihoods.
 //          18-Sep-2016 HBP in setBinRange, use ROOT convention and start
 //                      bin count at one
+//          18-Oct-2026 compute the likelihoods of all spectra in one pass
+//                      using a SpectrumEnsemble
+//          18-Oct-2026 add logEvaluate, which marginalizes in log space
+//          18-Oct-2026 optionally, compute likelihoods in several threads
+//          18-Oct-2026 add toyPercentiles for batches of pseudo-experiments
+//          18-Oct-2026 cache the predictions at the lambda grid points
+//          18-Oct-2026 add compact, which replaces the spectra by a flat
+//                      block of cross sections and coefficients, either
+//                      stored in the workspace or in a memory-mapped file
+//          18-Oct-2026 in initialize(-1), choose grid points adaptively and
+//                      interpolate log(likelihood) with Akima splines
+//          18-Oct-2026 add findRange
+//          18-Oct-2026 add table, which returns the interpolated likelihood
+//          18-Oct-2026 add likelihood and logLikelihood, which use a
+//                      snapshot of the counts and kappa
+//          18-Oct-2026 track which of counts, kappa, lambda range, bin
+//                      range and spectra have changed, so that only the
+//                      cached quantities that depend on them are rebuilt
+//          18-Oct-2026 compute the data constants of the log multinomial
+//                      once per data set
+//          18-Oct-2026 add asimovGrid and asimovPercentiles for grids of
+//                      luminosities and lambda values
 //---------------------------------------------------------------------------
 #include "RooAbsPdf.h"
 #include "RooAbsReal.h"
@@ -16,12 +38,18 @@
 #include "RooListProxy.h"
 #include "QCDSpectrum.h"
 #include "CISpectrum.h"
+#include "SpectrumEnsemble.h"
 #include "Math/Interpolator.h"
 //---------------------------------------------------------------------------
+class PriorFunction;
+
 class RooInclusiveJetPdf : public RooAbsPdf
 {
 public:
-  RooInclusiveJetPdf() {}
+  RooInclusiveJetPdf() 
+    : useinterpolation(false), interp(0), loginterp(0), ensemble_(0),
+      nthreads_(1), gridparallel_(false), tolerance_(1.e-4),
+      nevaluations_(0), nlnn_(0) {}
   RooInclusiveJetPdf(const char* name, const char* title,
 		     RooArgSet&   _count,
 		     RooAbsReal&  _lambda,
@@ -34,7 +62,7 @@ public:
   
   void add(QCDSpectrum& _qcd, CISpectrum& _ci);
 
-  virtual ~RooInclusiveJetPdf() {}
+  virtual ~RooInclusiveJetPdf() { delete ensemble_; }
 
   int getAnalyticalIntegral(RooArgSet& allVars,
   			    RooArgSet& analVars,
@@ -43,12 +71,65 @@ public:
   double analyticalIntegral(int code,
   			    const char* /*rangeName*/) const;
 
+  /// Return spectrum c (0 after compact has been called).
   QCDSpectrum* QCD(int c);
   CISpectrum*  CI(int c);
 
-  ///
+  /// True if compact has been called, that is, QCD and CI return 0.
+  bool compacted() const { return leadingorder.size() > 0; }
+
+  /** Replace the QCDSpectrum and CISpectrum objects by one flat block
+      of QCD cross sections and packed CI coefficients of which the
+      spectra are views. If filename is given, the block is written to
+      that (sidecar) file, which is memory-mapped when the model is
+      used, and only the name of the file is stored in the workspace;
+      the file must therefore be written in the directory of the
+      workspace file, where it is looked for when the workspace is
+      read. Otherwise the block itself is stored in the workspace.
+  */
+  void compact(std::string filename="");
+
+  /** Tabulate the likelihood on a grid of lambda values and
+      thereafter interpolate it. If which < 0, the likelihood
+      (averaged over all spectra) is computed at adaptively chosen grid
+      points (see setTolerance) and its log is interpolated with Akima
+      splines; otherwise that of spectrum which is computed at 251
+      equally-spaced points and interpolated linearly, as before. The
+      interpolant is not stored in the workspace, so initialize must
+      be called again after the model is read back.
+  */
   void initialize(int which=-1);
 
+  /** Set the tolerance of the adaptive grid: intervals are bisected
+      until the interpolation error is less than tolerance x maximum
+      likelihood. If tolerance <= 0, all 257 grid points are used.
+  */
+  void setTolerance(double tolerance=1.e-4) { tolerance_ = tolerance; }
+  double tolerance() { return tolerance_; }
+
+  /** Find the range [lambda.min(), upper] outside of which the
+      likelihood (averaged over all spectra) is less than cut x its
+      maximum. The mode is bracketed by doubling steps from lambda.min()
+      and refined by golden-section search; upper is then found by
+      regula falsi in log(likelihood) to a relative precision of
+      reltol. If the likelihood does not fall below the cut, upper is
+      lambda.max().
+  */
+  std::pair<double, double> findRange(double cut=1.e-3, double reltol=1.e-2);
+
+  /** Get the log likelihood tabulated by initialize(). If which < 0,
+      it is tabulated at 257 equally spaced points, which include the
+      grid points of the adaptive grid, and between the grid points the
+      values are those of the interpolant; otherwise, it is tabulated at
+      the 251 grid points.
+      Returns false if the likelihood is not being interpolated.
+  */
+  bool table(std::vector<double>& x, std::vector<double>& logy) const;
+
+  /// Number of likelihood evaluations in last call to initialize
+  /// or findRange.
+  int numberOfEvaluations() { return nevaluations_; }
+
   ///
   void bootstrap(bool yes=true, int number=500);
 
@@ -62,8 +143,10 @@ public:
 		 double lam=0,
 		 bool use_average=false);
   
-  size_t size() { return qcd.size(); }  
+  size_t size() const
+  { return leadingorder.size() > 0 ? leadingorder.size() : qcd.size(); }  
   int    numberOfBins() { return count.getSize(); }
+  int    numberOfSpectra() { return index.size(); }
   
   std::vector<double>& Asimov() { return asimov; }
   std::vector<double>& crossSection(int n);
@@ -72,7 +155,94 @@ public:
   static double logMultinomial(std::vector<double>& n, std::vector<double>& p);
   
   double logProfileLikelihood(double poi);
+
+  /** Log of the likelihood returned by evaluate(). The sum over
+      spectra is computed with a running maximum and log-sum-exp, so the
+      result is finite even when every likelihood underflows.
+  */
+  double logEvaluate() const;
+
+  /** Copy the values of the counts and kappa into plain arrays. The
+      snapshot is taken by evaluate() (that is, through RooFit), by
+      setAsimov and at the start of initialize, findRange and the other
+      calculations over a grid of lambda values. It must be taken
+      explicitly before calling likelihood or logLikelihood if the
+      counts or kappa have been changed otherwise. (PDFWrapper takes it
+      when it is created and in setData, and Bayes before each sweep.)
+  */
+  void snapshot() const;
+
+  /** Likelihood (as returned by evaluate()) at lambda = l, computed
+      directly from the snapshot of the counts and kappa, that is,
+      without going through RooFit. lambda itself is not changed.
+  */
+  double likelihood(double l) const;
+
+  /// Log of the likelihood at lambda = l (see likelihood).
+  double logLikelihood(double l) const;
+
+  /** Set the number of threads. By default, the spectra are divided
+      between the threads. If gridparallel is true, initialize() instead
+      divides the lambda grid points between the threads, both for
+      which >= 0 and for the adaptive grid (which < 0). In either case,
+      the results are identical to those computed with one thread.
+  */
+  void setNumberOfThreads(int n, bool gridparallel=false);
+  int  numberOfThreads() { return nthreads_; }
+
+  /** Compute the log likelihood of every spectrum at lambda = poi or,
+      if a spectrum has been selected by initialize(which >= 0), of
+      that spectrum only. logf must point to an array (e.g., a numpy
+      array) of size numberOfSpectra(). Returns the number of log
+      likelihoods computed.
+  */
+  int logLikelihoods(double poi, double* logf);
   double underflowFraction() { return ufraction; }
+
+  /** Generate ntoys Poisson fluctuations of the Asimov data set for
+      (lumi, lam) and, for each, compute the percentiles of the
+      posterior density of lambda (flat prior, unless prior is given)
+      averaged over all spectra. The likelihoods of all toys are
+      computed together on the same grid of lambda values as used by
+      initialize(); the percentiles are computed from them by Bayes.
+      Returns a (ntoys x percentiles.size()) matrix, row-major; a
+      percentile is -1 if it could not be computed. The expected counts
+      are computed as by asimovGrid, so the state of the model,
+      including its Asimov data set, is not changed.
+  */
+  std::vector<double> toyPercentiles(int ntoys,
+				     const std::vector<double>& percentiles,
+				     double lumi=35100,
+				     double lam=0,
+				     PriorFunction* prior=0);
+
+  /** Compute the Asimov data sets (see setAsimov) for every pair
+      (lams[i], lumis[j]), with the current values of kappa. The
+      cross sections are computed once per lambda value. The state of
+      the model, including its Asimov data set, is not changed.
+      Returns a (lams.size() x lumis.size() x numberOfBins()) array,
+      row-major.
+  */
+  std::vector<double> asimovGrid(const std::vector<double>& lumis,
+				 const std::vector<double>& lams,
+				 bool use_average=false);
+
+  /** Compute the percentiles of the posterior density of lambda (flat
+      prior, unless prior is given) for every Asimov data set of
+      asimovGrid. As in
+      toyPercentiles, the likelihoods of all data sets are computed
+      together from the cached predictions at the lambda grid points.
+      If which < 0, the likelihood is averaged over all spectra;
+      otherwise only spectrum which is used. Returns a
+      (lams.size() x lumis.size() x percentiles.size()) array,
+      row-major; a percentile is -1 if it could not be computed.
+  */
+  std::vector<double> asimovPercentiles(const std::vector<double>& lumis,
+					const std::vector<double>& lams,
+					const std::vector<double>& percentiles,
+					int which=-1,
+					bool use_average=false,
+					PriorFunction* prior=0);
   
  protected:
   double evaluate() const;
@@ -85,6 +255,11 @@ public:
   std::vector<QCDSpectrum> qcd;
   std::vector<CISpectrum>  ci;
   std::vector<int>         index;
+
+  // flat representation of the spectra (see compact)
+  std::string              sidecar;      // memory-mapped file, if any
+  std::vector<double>      block;        // QCD cross sections, coefficients
+  std::vector<int>         leadingorder; // LO flag of each spectrum
   
   double smallest;
   int number;
@@ -95,13 +270,60 @@ public:
   double ufraction;
   int firstbin;
   int lastbin;
-  bool useinterpolation;
+  bool useinterpolation;               //! interpolants are not stored
   bool usebootstrap;
   bool useprofile;
   
-  mutable ROOT::Math::Interpolator* interp;
+  mutable ROOT::Math::Interpolator* interp;    //! likelihood (which >= 0)
+  mutable ROOT::Math::Interpolator* loginterp; //! log likelihood (which < 0)
+
+  mutable SpectrumEnsemble* ensemble_; //! built on first use
+  mutable std::vector<double> n_;      //! counts in bin range
+  mutable std::vector<double> k_;      //! kappa
+  mutable std::vector<double> logf_;   //! log likelihood per spectrum
+  int  nthreads_;                      //! number of threads
+  bool gridparallel_;                  //! divide lambda grid between threads
+
+  // log(p/sum p) at each lambda grid point for each spectrum and bin
+  // (grid x spectrum x bin), which does not depend on the counts.
+  mutable std::vector<double> logp_;   //! cached log predictions
+  mutable std::vector<int> logpindex_; //! spectra of cached predictions
+  mutable std::vector<char> logpdone_; //! grid points computed
+  double tolerance_;                   //! tolerance of adaptive grid
+  int nevaluations_;                    //! likelihood evaluations
+  std::vector<double> tablex_;         //! lambda points of table
+  std::vector<double> tablelogy_;      //! interpolated log likelihood
+  mutable std::vector<double> countval_;//! snapshot of counts
+
+  // parameters on which the cached quantities depend (see changes_)
+  enum { KAPPA=1, RANGE=2, BINS=4, SPECTRA=8 };
+  mutable std::vector<double> kappakey_;//! kappa
+  mutable std::vector<double> rangekey_;//! lambda range
+  mutable std::vector<int> binkey_;    //! bin range
+
+  // term of the log multinomial that depends only on the counts
+  mutable std::vector<double> countkey_;//! counts of nlnn_
+  mutable double nlnn_;                //! sum n log(n/sum n)
+
+  const SpectrumEnsemble& ensemble() const;
+  void setCounts() const;
+  double logMarginal_(double l, std::vector<double>& logf, int nthreads) const;
+  int  changes_() const;
+  const double* dataConstants_() const;
+  void checkPredictions() const;
+  const double* logPredictions(int c) const;
+  const double* logPredictions() const;
+  void logMarginals_(const std::vector<int>& nodes,
+		     std::vector<double>& logy) const;
+  std::vector<int> adaptiveGrid_(const std::vector<double>& x,
+				 std::vector<double>& logy) const;
+  std::vector<double> gridPercentiles_(const std::vector<double>& n,
+				       int ndata,
+				       const std::vector<double>& percentiles,
+				       int which=-1,
+				       PriorFunction* prior=0);
   
-  ClassDef(RooInclusiveJetPdf,1)  
+  ClassDef(RooInclusiveJetPdf,2)  
 };
 //---------------------------------------------------------------------------
 #endif
@@ -0,0 +1,224 @@
+#ifndef SPECTRUMENSEMBLE_H
+#define SPECTRUMENSEMBLE_H
+//---------------------------------------------------------------------------
+// File: SpectrumEnsemble.h
+// Description: QCD cross sections and CI coefficients of an ensemble of
+//              spectra stored as contiguous (spectrum x bin) arrays so that
+//              the multinomial likelihoods of all spectra can be computed
+//              in a single pass. For fixed kappa, the CI coefficients are
+//              folded into four basis weights per bin (see CIXsection).
+//              The spectra may be split across several threads, which
+//              persist between calls; each likelihood is computed by
+//              exactly one thread, so the results do not depend on the
+//              number of threads.
+// Created: 18-Oct-2026
+// Updated: 18-Oct-2026 add logMarginals for batches of data sets
+//          18-Oct-2026 the arrays may be views of an external block or of
+//                      a memory-mapped file written by write()
+//          18-Oct-2026 cache the sums of the QCD cross sections and of the
+//                      basis weights over the bin range
+//          18-Oct-2026 compute the constants of the log multinomial that
+//                      depend only on the counts once per data set
+//          18-Oct-2026 reuse the worker threads between calls
+//---------------------------------------------------------------------------
+#include <vector>
+#include <string>
+//---------------------------------------------------------------------------
+class SpectrumEnsemble
+{
+ public:
+  /// Offsets of the coefficient families within the packed
+  /// coefficients of a bin (see CISpectrum::coefficients).
+  enum
+    {
+      BI  = 0,  AIG = 6,  AI  = 12,
+      BIJ = 18, AIJG= 27, AIJ = 36,
+      BI4 = 45, AI4G= 49, AI4 = 53,
+      NCOEF = 57
+    };
+
+  SpectrumEnsemble(int nbins=0);
+  ~SpectrumEnsemble();
+
+  /** Add a spectrum.
+      @param qcd  - QCD cross sections (one per bin)
+      @param coef - packed CI coefficients (NCOEF per bin)
+      @param lo   - if true, use the LO CI cross section
+  */
+  void add(const std::vector<double>& qcd,
+	   const std::vector<double>& coef,
+	   bool lo=false);
+
+  /** Use arrays owned by the caller rather than copies. The arrays
+      must outlive the ensemble.
+      @param qcd  - QCD cross sections (nspectra x nbins)
+      @param coef - packed CI coefficients (nspectra x nbins x NCOEF)
+      @param lo   - LO flags (one per spectrum)
+  */
+  void attach(const double* qcd, const double* coef,
+	      const std::vector<int>& lo);
+
+  /** Write the ensemble to a file that can be memory-mapped by map.
+      Layout (native byte order): char magic[8], int version, nspectra,
+      nbins, ncoef, int lo[nspectra] (padded to a multiple of 8 bytes),
+      double qcd[nspectra][nbins], double coef[nspectra][nbins][ncoef].
+  */
+  bool write(std::string filename) const;
+
+  /// Map a file written by write() into memory.
+  bool map(std::string filename);
+
+  size_t size() const { return lo_.size(); }
+  int    numberOfBins() const { return nbins_; }
+
+  /** Set number of threads used by logLikelihoods and logMarginals
+      (default = 1). The threads are started on first use and are
+      reused by later calls.
+  */
+  void setNumberOfThreads(int n) { nthreads_ = n > 1 ? n : 1; }
+  int  numberOfThreads() const { return nthreads_; }
+
+  /// QCD cross sections of spectrum c.
+  const double* qcd(int c) const { return qcdp_ + (size_t)c*nbins_; }
+
+  /// Packed CI coefficients of spectrum c.
+  const double* coefficients(int c) const
+  { return coefp_ + (size_t)c*nbins_*NCOEF; }
+
+  /// CI cross section of spectrum c in bin ii.
+  double ci(double lambda, const std::vector<double>& kappa,
+	    int c, int ii) const;
+
+  /** Compute log multinomial likelihoods of the spectra listed in index
+      for the counts n, which correspond to bins [firstbin...lastbin]
+      (C++ convention).
+      @param logf - array of size index.size() to receive results
+      @param nthreads - number of threads (if < 1, use numberOfThreads())
+      @param nlnn - data term from dataTerms (if 0, computed here)
+  */
+  void logLikelihoods(double lambda, const std::vector<double>& kappa,
+		      const std::vector<double>& n,
+		      int firstbin, int lastbin,
+		      const std::vector<int>& index,
+		      double* logf,
+		      int nthreads=0,
+		      const double* nlnn=0) const;
+
+  /** Compute log(p/sum p) of the spectra listed in index for bins
+      [firstbin...lastbin] (C++ convention).
+      @param logp - array of size index.size() x (lastbin-firstbin+1)
+      @param nthreads - number of threads (if < 1, use numberOfThreads())
+  */
+  void logPredictions(double lambda, const std::vector<double>& kappa,
+		      int firstbin, int lastbin,
+		      const std::vector<int>& index,
+		      double* logp,
+		      int nthreads=1) const;
+
+  /** Compute, for each of ntoys data sets, the log of the sum of the
+      multinomial likelihoods of the spectra listed in index. The
+      normalized predictions, log(p/sum p), are computed once and are
+      shared by all data sets.
+      @param n    - counts (ntoys x (lastbin-firstbin+1), row-major)
+      @param logy - array of size ntoys to receive results
+      @param nthreads - number of threads (if < 1, use numberOfThreads())
+  */
+  void logMarginals(double lambda, const std::vector<double>& kappa,
+		    const std::vector<double>& n, int ntoys,
+		    int firstbin, int lastbin,
+		    const std::vector<int>& index,
+		    double* logy,
+		    int nthreads=0) const;
+
+  /** Same as above, but using predictions from logPredictions.
+      @param logp - log predictions (nspectra x nbins)
+      @param n    - counts (ntoys x nbins, row-major)
+      @param nlnn - data terms from dataTerms (if 0, computed here)
+  */
+  void logMarginals(const double* logp, size_t nspectra,
+		    const std::vector<double>& n, int ntoys,
+		    double* logy,
+		    int nthreads=0,
+		    const double* nlnn=0) const;
+
+  /** Compute the term sum N log(N/sum N) of the log multinomial
+      likelihood, which depends only on the counts, for each of ntoys
+      data sets.
+      @param n    - counts (ntoys x nbins, row-major)
+      @param nlnn - array of size ntoys to receive results
+  */
+  static void dataTerms(const std::vector<double>& n, int ntoys,
+			double* nlnn);
+
+  /// Fold the CI coefficients into basis weights if kappa has changed.
+  void setKappa(const std::vector<double>& kappa) const;
+
+  /** Sum the QCD cross sections over bins [firstbin...lastbin] if the
+      bin range has changed and the basis weights if either the bin
+      range or kappa has changed. setKappa must have been called.
+  */
+  void setBinRange(int firstbin, int lastbin) const;
+
+  /// Basis weights (4 per bin) of spectrum c for the current kappa.
+  const double* weights(int c) const { return &w_[c*nbins_*4]; }
+
+  /** Log multinomial likelihood of counts n given predictions p,
+      relative to that of the saturated model (p = n).
+  */
+  static double logMultinomial(const double* n, const double* p, int nbins);
+
+  /** Same as above, but using the normalized log predictions
+      logp[jj] = log(p[jj]/sum p) and the data term nlnn from dataTerms:
+      sum n[jj] logp[jj] - nlnn, summed over bins with n[jj] > 0 in long
+      double. This is the kernel used by both logLikelihoods and
+      logMarginals, so the two give identical results.
+  */
+  static double logMultinomial(const double* n, const double* logp,
+			       double nlnn, int nbins);
+
+  /** Compute log(sum exp(logf[j])) with a running maximum, in order
+      j=0..n-1. Return NaN if any logf[j] is NaN.
+  */
+  static double logSumExp(const double* logf, int n);
+
+ private:
+  SpectrumEnsemble(const SpectrumEnsemble&);
+  SpectrumEnsemble& operator=(const SpectrumEnsemble&);
+  void unmap();
+
+  int nbins_;
+  int nthreads_;
+  std::vector<double> qcd_;
+  std::vector<double> coef_;
+  std::vector<bool>   lo_;
+  const double* qcdp_;   // QCD cross sections (owned or not)
+  const double* coefp_;  // coefficients (owned or not)
+  void*  map_;           // memory-mapped file
+  size_t mapsize_;
+  mutable void* pool_;   // worker threads (see WorkerPool)
+
+  mutable std::vector<double> kappa_; // kappa of current weights
+  mutable std::vector<double> w_;     // basis weights
+  mutable int first_;                 // bin range of current sums
+  mutable int last_;
+  mutable std::vector<double> qsum_;  // QCD cross section summed over bins
+  mutable std::vector<double> wsum_;  // basis weights summed over bins
+
+  void logPrediction_(const double* f, int c, int firstbin, int nbins,
+		      double* logp) const;
+
+  void logLikelihoods_(const double* f,
+		       const std::vector<double>& n,
+		       int firstbin, int lastbin,
+		       const std::vector<int>& index,
+		       size_t first, size_t last,
+		       double nlnn,
+		       double* logf) const;
+
+  void logMarginals_(const double* logp, size_t nspectra,
+		     const std::vector<double>& n,
+		     int nbins, size_t first, size_t last,
+		     const double* nlnn,
+		     double* logy) const;
+};
+#endif
@@ -0,0 +1,68 @@
+#ifndef SPECTRUMSTORE_H
+#define SPECTRUMSTORE_H
+//---------------------------------------------------------------------------
+// File: SpectrumStore.h
+// Description: read-only, memory-mapped store of binned spectra. A store
+//              holds many records (e.g., all PDF members x scale choices
+//              of a PDF set), each an array of (bin x column) doubles.
+//              CI stores have NCOEF columns (the packed CI coefficients,
+//              see SpectrumEnsemble); QCD stores have one. Stores are
+//              written by work/spectrumstore.py.
+//
+//              Layout (native byte order):
+//                char   magic[8]     "CISTORE"
+//                int    version, nrecords, nbins, ncols, keysize, unused
+//                double edges[nbins+1]
+//                char   keys[nrecords][keysize]
+//                double data[nrecords][nbins][ncols]
+// Created: 18-Oct-2026
+//---------------------------------------------------------------------------
+#include <vector>
+#include <string>
+#include <map>
+//---------------------------------------------------------------------------
+class SpectrumStore
+{
+ public:
+  SpectrumStore(std::string filename="");
+  ~SpectrumStore();
+
+  /// Map a store into memory.
+  bool open(std::string filename);
+  void close();
+  bool good() const { return data_ != 0; }
+
+  std::string filename() const { return filename_; }
+  int    size() const { return nrecords_; }
+  int    numberOfBins() const { return nbins_; }
+  int    numberOfColumns() const { return ncols_; }
+
+  /// Bin edges (numberOfBins()+1 values).
+  const double* edges() const { return edges_; }
+
+  /// Record number of key, or -1 if key is not in the store.
+  int find(std::string key) const;
+
+  /// Key of record r.
+  std::string key(int r) const;
+
+  /// Data of record r (numberOfBins() x numberOfColumns() values).
+  const double* record(int r) const { return data_ + (size_t)r*nbins_*ncols_; }
+
+ private:
+  SpectrumStore(const SpectrumStore&);
+  SpectrumStore& operator=(const SpectrumStore&);
+
+  std::string filename_;
+  void*  map_;
+  size_t mapsize_;
+  int nrecords_;
+  int nbins_;
+  int ncols_;
+  int keysize_;
+  const double* edges_;
+  const char*   keys_;
+  const double* data_;
+  std::map<std::string, int> index_;
+};
+#endif
@@ -6,6 +6,13 @@
 // Updated: 13 Mar 2011 HBP - fix normalization of post.
 //          06 Mar 2014 HBP
 //          30 May 2015 HBP - implement direct RooFit interface.
+//          18 Oct 2026     - add log-space mode
+//          18 Oct 2026     - compute a single cdf table, from which
+//                            all percentiles are computed
+//          18 Oct 2026     - if the likelihood is tabulated, use the
+//                            table rather than evaluating the likelihood
+//          18 Oct 2026     - call RooInclusiveJetPdf directly
+//          18 Oct 2026     - add constructor for a tabulated likelihood
 //--------------------------------------------------------------
 #include <iostream>
 #include <fstream>
@@ -13,6 +20,7 @@
 #include <cmath>
 #include <algorithm>
 #include <stdlib.h>
+#include <limits>
 
 #include "Bayes.h"
 #include "PDFWrapper.h"
@@ -20,8 +28,6 @@
 #include "TMinuit.h"
 #include "TMath.h"
 #include "Math/WrappedFunction.h"
-#include "Math/Integrator.h"
-#include "Math/RootFinder.h"
 
 using namespace std;
 // ---------------------------------------------------------------------------
@@ -50,6 +56,7 @@ Bayes::Bayes(PDFunction& model,
 	     double cl,
 	     PriorFunction* prior_)
   : _pdf(&model),
+    _jetpdf(0),
     _poimin(poimin),
     _poimax(poimax),
     _cl(cl),
@@ -57,21 +64,28 @@ Bayes::Bayes(PDFunction& model,
     _rfprior(0),
     _rfpoi(0),
     _normalize(true),
-    _interp(0),
     _nsteps(200),
     _x(vector<double>()),
     _y(vector<double>()),
-    _verbosity(-1)
+    _c(vector<double>()),
+    _verbosity(-1),
+    _logspace(false),
+    _logmax(0)
 {
   if ( getenv("limits_verbosity") != (char*)0 )
     _verbosity = atoi(getenv("limits_verbosity"));
   OBJ = this;
+
+  // if the likelihood is a RooInclusiveJetPdf, call it directly
+  PDFWrapper* wrapper = dynamic_cast<PDFWrapper*>(_pdf);
+  if ( wrapper ) _jetpdf = wrapper->jetPdf();
 }
 
 Bayes::Bayes(RooAbsPdf& pdf, RooArgSet& obs, RooRealVar& poi,
 	     double cl,
 	     RooAbsPdf* prior_)
   : _pdf(new PDFWrapper(pdf, obs, poi)),
+    _jetpdf(0),
     _poimin(poi.getMin()),
     _poimax(poi.getMax()),
     _cl(cl),
@@ -79,24 +93,56 @@ Bayes::Bayes(RooAbsPdf& pdf, RooArgSet& obs, RooRealVar& poi,
     _rfprior(prior_),
     _rfpoi(&poi),
     _normalize(true),
-    _interp(0),
     _nsteps(200),
     _x(vector<double>()),
     _y(vector<double>()),
-    _verbosity(-1)
+    _c(vector<double>()),
+    _verbosity(-1),
+    _logspace(false),
+    _logmax(0)
 {
   if ( getenv("limits_verbosity") != (char*)0 )
     _verbosity = atoi(getenv("limits_verbosity"));
   OBJ = this;
+
+  // if the likelihood is a RooInclusiveJetPdf, call it directly
+  PDFWrapper* wrapper = dynamic_cast<PDFWrapper*>(_pdf);
+  if ( wrapper ) _jetpdf = wrapper->jetPdf();
 }
 
+Bayes::Bayes(const vector<double>& x,
+	     const vector<double>& logy,
+	     double cl,
+	     PriorFunction* prior_)
+  : _pdf(0),
+    _jetpdf(0),
+    _poimin(x.front()),
+    _poimax(x.back()),
+    _cl(cl),
+    _prior(prior_),
+    _rfprior(0),
+    _rfpoi(0),
+    _normalize(true),
+    _nsteps(200),
+    _x(vector<double>()),
+    _y(vector<double>()),
+    _c(vector<double>()),
+    _tablex(x),
+    _tablelogy(logy),
+    _verbosity(-1),
+    _logspace(true),
+    _logmax(0)
+{
+  if ( getenv("limits_verbosity") != (char*)0 )
+    _verbosity = atoi(getenv("limits_verbosity"));
+  OBJ = this;
+}
 
 Bayes::~Bayes() 
 {
   // if _rfpoi is non-zero, this means we are using the RooFit
   // interface
   if (_rfpoi) delete _pdf;
-  if (_interp) delete _interp;
 }
 
 double 
@@ -117,61 +163,78 @@ Bayes::prior(double poi)
 void Bayes::setData(std::vector<double>& d) 
 { 
   _data = d;
-  _pdf->setData(_data);
+  if ( _pdf ) _pdf->setData(_data);
 }
 
 double 
 Bayes::likelihood(double poi)
 {
+  if ( _jetpdf ) return _jetpdf->likelihood(poi);
+  if ( ! _pdf ) return exp(_interpolate(_tablex, _tablelogy, poi));
   return (*_pdf)(poi);
 }
 
 double 
 Bayes::normalize()
 {
-  ROOT::Math::WrappedMemFunction<Bayes, double (Bayes::*)(double)> 
-    fn(*this, &Bayes::_likeprior);
-  ROOT::Math::Integrator ifn(fn);
-  ifn.SetRelTolerance(RELTOL);
-  _normalization = ifn.Integral(_poimin, _poimax);
-  _normalize = false;
-  
-  // Compute cdf at several points
-  _x.clear();
-  _y.clear();  
-  _x.push_back(_poimin);
-  _y.push_back(0);
-  double step = (_poimax - _poimin)/_nsteps;
-  double ysum = 0;
-  for(int i=1; i < _nsteps+1; i++)
+  // tabulate likelihood * prior in a single sweep over the grid. in
+  // log space, scale the posterior by the maximum of
+  // log(likelihood * prior) on the grid. if the likelihood is already
+  // tabulated, its table is used instead.
+  _logmax = 0;
+  if ( ! _table() )
     {
-      double xx = _poimin + i*step;
-      _x.push_back(xx);
-      double y = _likeprior(xx);
-      ysum += y;
-      _y.push_back(y + _y.back());
+      // counts and kappa may have changed since the last sweep
+      if ( _jetpdf ) _jetpdf->snapshot();
+      _grid();
+      if ( _logspace )
+	{
+	  _logmax = -numeric_limits<double>::infinity();
+	  for(int i=0; i < _nsteps+1; i++)
+	    {
+	      double logl = _jetpdf ? _jetpdf->logLikelihood(_x[i])
+		: _pdf->logLikelihood(_x[i]);
+	      _y[i] = logl + log(prior(_x[i]));
+	      if ( _y[i] > _logmax ) _logmax = _y[i];
+	    }
+	  if ( _logmax != _logmax ||
+	       _logmax == -numeric_limits<double>::infinity() )
+	    _logmax = 0;
+	  for(int i=0; i < _nsteps+1; i++)
+	    {
+	      _y[i] = exp(_y[i] - _logmax);
+	      if ( _y[i] != _y[i] ) _y[i] = 0;
+	    }
+	}
+      else
+	for(int i=0; i < _nsteps+1; i++) _y[i] = _likeprior(_x[i]);
     }
-  for(int i=0; i < _nsteps+1; i++) _y[i] /= ysum;
-
-  try
-    {
-      delete _interp;
-    }
-  catch (...)
-    {}
-  _interp = new ROOT::Math::Interpolator(_x.size(),
-					 ROOT::Math::
-					 Interpolation::kLINEAR);
-  _interp->SetData(_x, _y);
 
+  // cdf of the posterior density, taken to be linear between
+  // grid points
+  int npts = _x.size();
+  _c.resize(npts);
+  _c[0] = 0;
+  for(int i=1; i < npts; i++)
+    _c[i] = _c[i-1] + 0.5*(_x[i]-_x[i-1])*(_y[i]+_y[i-1]);
+  _normalization = _c[npts-1];
+  if ( _normalization > 0 )
+    for(int i=0; i < npts; i++) _c[i] /= _normalization;
+  _normalize = false;
   return _normalization;
 }
 
 double 
 Bayes::posterior(double poi)
 {
+  if ( poi < _poimin || poi > _poimax ) return 0;
   if ( _normalize ) normalize();
-  return _likeprior(poi) / _normalization;
+  if ( ! (_normalization > 0) ) return 0;
+
+  // interpolate table
+  int i = _interval(poi);
+  double t = (poi - _x[i])/(_x[i+1] - _x[i]);
+  return ((1-t)*_y[i] + t*_y[i+1]) / _normalization;
 }
 
 double 
@@ -183,11 +246,13 @@ Bayes::cdf(double poi)
     return 1;
 
   if ( _normalize ) normalize();
-  // Compute CDF
-  ROOT::Math::WrappedMemFunction<Bayes, double (Bayes::*)(double)> 
-    fn(*this, &Bayes::posterior);
-  ROOT::Math::Integrator ifn(fn);
-  return ifn.Integral(_poimin, poi);
+  if ( ! (_normalization > 0) ) return 0;
+
+  // integrate the linear density from the start of the interval
+  int i = _interval(poi);
+  double h = poi - _x[i];
+  double slope = (_y[i+1] - _y[i])/(_x[i+1] - _x[i]);
+  return _c[i] + h*(_y[i] + 0.5*slope*h) / _normalization;
 }
 
 double 
@@ -195,21 +260,16 @@ Bayes::percentile(double p)
 {
   if ( p > 0 ) _cl = p; // Credibility level
   if ( _normalize ) normalize();
+  return _quantile(_cl);
+}
 
-  // function whose root is to be found
-  ROOT::Math::WrappedMemFunction<Bayes, double (Bayes::*)(double)> 
-    fn(*this, &Bayes::_q);
-  ROOT::Math::RootFinder rootfinder;
-  
-  rootfinder.SetFunction(fn, _poimin, _poimax);
-  int status = rootfinder.Solve();
-  if ( status != 1 )
-    {
-      cout << "*** Bayes *** RootFinder failed to find quantile"
-           << endl;
-      return -1;
-    }
-  return rootfinder.Root();
+vector<double>
+Bayes::percentiles(const vector<double>& p)
+{
+  if ( _normalize ) normalize();
+  vector<double> q(p.size());
+  for(size_t i=0; i < p.size(); i++) q[i] = _quantile(p[i]);
+  return q;
 }
 
 pair<double, double>
@@ -218,6 +278,9 @@ Bayes::estimate(double guess)
   if ( _normalize ) normalize();
     
   pair<double, double> results(0, 0);
+
+  // other instances may have been created since this one
+  OBJ = this;
   
   TMinuit minuit(1);
   minuit.SetPrintLevel(_verbosity);
@@ -253,6 +316,13 @@ Bayes::estimate(double guess)
   return results;
 }
 
+double 
+Bayes::logNormalization()
+{
+  if ( _normalize ) normalize();
+  return log(_normalization) + _logmax;
+}
+
 double 
 Bayes::_likeprior(double poi)
 {
@@ -262,17 +332,129 @@ Bayes::_likeprior(double poi)
            << poi << endl;
       exit(0);
     }
-  return likelihood(poi) * prior(poi);
+  if ( _logspace )
+    {
+      double logl = _jetpdf ? _jetpdf->logLikelihood(poi)
+	: _pdf->logLikelihood(poi);
+      return exp(logl + log(prior(poi)) - _logmax);
+    }
+  else
+    return likelihood(poi) * prior(poi);
 }
 
-double 
-Bayes::_q(double poi)
+void
+Bayes::_grid()
 {
-  if ( poi < _poimin ) 
-    return 0;
-  else if ( poi > _poimax )
-    return 1;
+  // _nsteps+1 equally spaced points
+  _x.resize(_nsteps+1);
+  _y.resize(_nsteps+1);
+  double step = (_poimax - _poimin)/_nsteps;
+  for(int i=0; i < _nsteps+1; i++) _x[i] = _poimin + i*step;
+}
+
+bool
+Bayes::_table()
+{
+  // use the points of the tabulated likelihood within [poimin, poimax]
+  // as the grid
+  vector<double> x, logy;
+  if ( _pdf )
+    {
+      if ( ! _pdf->table(x, logy) ) return false;
+    }
   else
-    return _interp->Eval(poi) - _cl;
+    {
+      x = _tablex;
+      logy = _tablelogy;
+    }
+  if ( x.size() < 2 || _poimin < x.front() || _poimax > x.back() )
+    return false;
+
+  _x.clear();
+  vector<double> logp;
+  _x.push_back(_poimin);
+  logp.push_back(_interpolate(x, logy, _poimin));
+  for(size_t i=0; i < x.size(); i++)
+    if ( x[i] > _poimin && x[i] < _poimax )
+      {
+	_x.push_back(x[i]);
+	logp.push_back(logy[i]);
+      }
+  _x.push_back(_poimax);
+  logp.push_back(_interpolate(x, logy, _poimax));
+
+  // scale by the maximum of log(likelihood * prior)
+  int npts = _x.size();
+  _y.resize(npts);
+  _logmax = -numeric_limits<double>::infinity();
+  for(int i=0; i < npts; i++)
+    {
+      _y[i] = logp[i] + log(prior(_x[i]));
+      if ( _y[i] > _logmax ) _logmax = _y[i];
+    }
+  if ( _logmax != _logmax ||
+       _logmax == -numeric_limits<double>::infinity() )
+    _logmax = 0;
+  for(int i=0; i < npts; i++)
+    {
+      _y[i] = exp(_y[i] - _logmax);
+      if ( _y[i] != _y[i] ) _y[i] = 0;
+    }
+  
+  // outside of log space, the posterior is not scaled
+  if ( ! _logspace )
+    {
+      double scale = exp(_logmax);
+      for(int i=0; i < npts; i++) _y[i] *= scale;
+      _logmax = 0;
+    }
+  return true;
+}
+
+double
+Bayes::_interpolate(const vector<double>& x, const vector<double>& logy,
+		    double poi)
+{
+  // linear interpolation of log(likelihood) table
+  int i = upper_bound(x.begin(), x.end(), poi) - x.begin() - 1;
+  if ( i < 0 ) i = 0;
+  if ( i > (int)x.size()-2 ) i = x.size()-2;
+  double t = (poi - x[i])/(x[i+1] - x[i]);
+  if ( t <= 0 ) return logy[i];
+  if ( t >= 1 ) return logy[i+1];
+  return (1-t)*logy[i] + t*logy[i+1];
 }
 
+int
+Bayes::_interval(double poi)
+{
+  // index of grid interval containing poi
+  int i = upper_bound(_x.begin(), _x.end(), poi) - _x.begin() - 1;
+  if ( i < 0 ) i = 0;
+  if ( i > (int)_x.size()-2 ) i = _x.size()-2;
+  return i;
+}
+
+double
+Bayes::_quantile(double p)
+{
+  if ( ! (_normalization > 0) || p < 0 || p > 1 )
+    {
+      cout << "*** Bayes *** unable to compute quantile " << p << endl;
+      return -1;
+    }
+  
+  // find interval, then invert the (quadratic) cdf within it
+  int i = upper_bound(_c.begin(), _c.end(), p) - _c.begin() - 1;
+  if ( i < 0 ) i = 0;
+  if ( i > (int)_c.size()-2 ) i = _c.size()-2;
+  double h = _x[i+1] - _x[i];
+  double r = (p - _c[i]) * _normalization / h;
+  double a = 0.5*(_y[i+1] - _y[i]);
+  double b = _y[i];
+  double d = b + sqrt(b*b + 4*a*r);
+  double t = d > 0 ? 2*r/d : 0;
+  if ( t < 0 ) t = 0;
+  if ( t > 1 ) t = 1;
+  return _x[i] + t*h;
+}
@@ -1,6 +1,7 @@
 // ---------------------------------------------------------------------------
 // Read coefficients histograms c and compute CI cross
 // section. HBP 2014
+// Updated: 18-Oct-2026 add constructor that reads a SpectrumStore
 // ---------------------------------------------------------------------------
 #include <stdio.h>
 #include <stdlib.h>
@@ -11,6 +12,7 @@
 #include <cmath>
 #include "CISpectrum.h"
 #include "CIXsection.h"
+#include "SpectrumEnsemble.h"
 #include "TFile.h"
 #include "TClass.h"
 #include "TKey.h"
@@ -58,7 +60,9 @@ CISpectrum::CISpectrum(const char* _name, const char* _title,
     pt(vector<double>()),
 
     xsec(0),
-    which(0)
+    which(0),
+    kappa_(vector<double>()),
+    w_(vector<double>())
 {
   char name[2048];
   if ( fname == "" )
@@ -91,9 +95,87 @@ CISpectrum::CISpectrum(const char* _name, const char* _title,
       get(hdir, string(name), fname, bij, 1.0/625);
     }
 
+  book(prefix);
+}
+
+CISpectrum::CISpectrum(const char* _name, const char* _title,
+		       SpectrumStore& store, string key,
+		       int nbins,
+		       double ptmin,
+		       string prefix)
+  : RooAbsReal(_name, _title),
+    histdir_(store.filename()),
+    histname_(key),
+    nbins_(nbins),
+    ptmin_(ptmin),
+    
+    bi(vector<vector<double> >()),
+    aig(vector<vector<double> >()),
+    ai(vector<vector<double> >()),
 
+    bij(vector<vector<double> >()),
+    aijg(vector<vector<double> >()),
+    aij(vector<vector<double> >()),
+
+    bi4(vector<vector<double> >()),
+    ai4g(vector<vector<double> >()),
+    ai4(vector<vector<double> >()),
+
+    pt(vector<double>()),
+
+    xsec(0),
+    which(0),
+    kappa_(vector<double>()),
+    w_(vector<double>())
+{
+  if ( ! store.good() )
+    error("CISpectrum", string("bad store ") + store.filename());
+  if ( store.numberOfColumns() != SpectrumEnsemble::NCOEF )
+    error("CISpectrum", store.filename() + string(" is not a CI store"));
+  int r = store.find(key);
+  if ( r < 0 )
+    error("CISpectrum", string("can't find ") + key);
+
+  // find first bin (as in init)
+  const double* edges = store.edges();
+  int offset = 0;
+  if ( nbins_ > 0 )
+    {
+      nbins = nbins_;
+      while ( offset < store.numberOfBins()-1 &&
+	      edges[offset+1] <= ptmin_+1 ) offset++;
+    }
+  else
+    nbins = store.numberOfBins();
+  if ( offset + nbins > store.numberOfBins() )
+    error("CISpectrum", string("too few bins in ") + store.filename());
+  
+  for(int ii=0; ii <= nbins; ii++) pt.push_back(edges[offset+ii]);
+
+  // unpack coefficients (see coefficients)
+  const double* data = store.record(r);
+  for(int ii=0; ii < nbins; ii++)
+    {
+      const double* a = data + (offset+ii)*SpectrumEnsemble::NCOEF;
+      bi.push_back(vector<double>(a,      a+6));
+      aig.push_back(vector<double>(a+6,   a+12));
+      ai.push_back(vector<double>(a+12,   a+18));
+
+      bij.push_back(vector<double>(a+18,  a+27));
+      aijg.push_back(vector<double>(a+27, a+36));
+      aij.push_back(vector<double>(a+36,  a+45));
+
+      bi4.push_back(vector<double>(a+45,  a+49));
+      ai4g.push_back(vector<double>(a+49, a+53));
+      ai4.push_back(vector<double>(a+53,  a+57));
+    }
+  book(prefix);
+}
+
+void CISpectrum::book(string prefix)
+{
   // create a histogram to receive spectrum
-  string title(hdir+hname);
+  string title(histdir_+histname_);
   if ( prefix != "" ) title = prefix + title;
 
   CISpectrum::histid++;
@@ -127,7 +209,9 @@ CISpectrum::CISpectrum(const CISpectrum& other, const char* newname)
 
     pt(other.pt),
     xsec(other.xsec),
-    which(other.which)
+    which(other.which),
+    kappa_(other.kappa_),
+    w_(other.w_)
 {
 }
 
@@ -163,19 +247,48 @@ double CISpectrum::operator()(double lambda, vector<double>& kappa,
 {
   if ( c < 0 ) return -999;
   if ( c > xsec->GetNbinsX()-1 ) return -999;
+
+  // for fixed kappa, the cross section is a dot product of basis
+  // weights and functions of lambda
+  setKappa(kappa);
+  double f[4];
+  CIXsection::basisFunctions(lambda, f);
+  return CIXsection::basisSum(&w_[4*c], f);
+}
+
+void CISpectrum::setKappa(const vector<double>& kappa) const
+{
+  int nbins = bi.size();
+  if ( (int)w_.size() == 4*nbins && kappa_ == kappa ) return;
+  kappa_ = kappa;
   
-  vector<double> xsecs = CIXsection::evaluate(lambda, kappa,
-					      bi[c],  aig[c],  ai[c], 
-					      bij[c], aijg[c], aij[c],
-					      bi4[c], ai4g[c], ai4[c]);
-  if ( which < 0 )
-    return xsecs[2] + xsecs[3];
-  else
-    return xsecs[0] + xsecs[1];
+  w_.resize(4*nbins);
+  for(int c=0; c < nbins; c++)
+    {
+      vector<double> coef = coefficients(c);
+      CIXsection::basisWeights(kappa_, &coef[0], which < 0, &w_[4*c]);
+    }
 }
 
 double CISpectrum::evaluate() const { return 1; }
 
+vector<double> CISpectrum::coefficients(int c) const
+{
+  vector<double> coef;
+  coef.insert(coef.end(), bi[c].begin(),   bi[c].end());
+  coef.insert(coef.end(), aig[c].begin(),  aig[c].end());
+  coef.insert(coef.end(), ai[c].begin(),   ai[c].end());
+
+  coef.insert(coef.end(), bij[c].begin(),  bij[c].end());
+  coef.insert(coef.end(), aijg[c].begin(), aijg[c].end());
+  coef.insert(coef.end(), aij[c].begin(),  aij[c].end());
+
+  coef.insert(coef.end(), bi4[c].begin(),  bi4[c].end());
+  coef.insert(coef.end(), ai4g[c].begin(), ai4g[c].end());
+  coef.insert(coef.end(), ai4[c].begin(),  ai4[c].end());
+  return coef;
+}
+
 void CISpectrum::init(string rootfile, 
 		      string hname)
 {
@@ -408,3 +408,81 @@ vector<double> CIXsection::evaluate(double lambda, std::vector<double>& kappa,
   return xsecs;
 }
 
+
+void CIXsection::basisWeights(const std::vector<double>& kappa,
+			      const double* coef, bool lo, double* w)
+{
+  const double* bi  = coef;
+  const double* aig = coef + 6;
+  const double* ai  = coef + 12;
+  const double* bij = coef + 18;
+  const double* aijg= coef + 27;
+  const double* aij = coef + 36;
+  const double* bi4 = coef + 45;
+  const double* ai4g= coef + 49;
+  const double* ai4 = coef + 53;
+  double x0 = log(1000.0);
+
+  // terms linear in kappa multiply norm1 = 25 lambda
+  double b0 = 0;
+  double b1 = 0;
+  for(int k=0; k < 6; k++)
+    {
+      if ( lo )
+	b0 += kappa[k]*bi[k];
+      else
+	{
+	  b0 += kappa[k]*(bi[k] + aig[k] + ai[k]*x0);
+	  b1 -= kappa[k]*ai[k];
+	}
+    }
+
+  // terms quadratic in kappa multiply norm2 = 625 lambda^2
+  double coe[9];
+  for(int k=0; k < 3; k++)
+    {
+      coe[  3*k] = kappa[2*k]  * kappa[2*k];
+      coe[1+3*k] = kappa[2*k+1]* kappa[2*k+1];
+      coe[2+3*k] = kappa[2*k]  * kappa[2*k+1];
+    }
+  double a0 = 0;
+  double a1 = 0;
+  for(int k=0; k < 9; k++)
+    {
+      if ( lo )
+	a0 += coe[k]*bij[k];
+      else
+	{
+	  a0 += coe[k]*(bij[k] + aijg[k] + aij[k]*x0);
+	  a1 -= coe[k]*aij[k];
+	}
+    }
+  coe[0] = kappa[0]*kappa[3];
+  coe[1] = kappa[1]*kappa[3];
+  coe[2] = kappa[4]*kappa[3];
+  coe[3] = kappa[5]*kappa[3];
+  for(int k=0; k < 4; k++)
+    {
+      if ( lo )
+	a0 += coe[k]*bi4[k];
+      else
+	{
+	  a0 += coe[k]*(bi4[k] + ai4g[k] + ai4[k]*x0);
+	  a1 -= coe[k]*ai4[k];
+	}
+    }
+  w[0] = 25*b0;
+  w[1] = 25*b1;
+  w[2] = 625*a0;
+  w[3] = 625*a1;
+}
+
+void CIXsection::basisFunctions(double lambda, double* f)
+{
+  // as in evaluate, the logarithmic terms go to zero as lambda => 0
+  double lnsqrtlambda = lambda > 0 ? 0.5*log(lambda) : 0;
+  f[0] = lambda;
+  f[1] = lambda*lnsqrtlambda;
+  f[2] = lambda*lambda;
+  f[3] = f[2]*lnsqrtlambda;
+}
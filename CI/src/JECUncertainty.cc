@@ -2,19 +2,29 @@
 // File:        JECUncertainty.cc
 // Description: see header
 // Created:     17-May-2016 Harrison B. Prosper      
+// Updated:     18-Oct-2026 copy the table into an array and close the file
+//                          in the constructor. add bilinear interpolation.
+//              18-Oct-2026 add setHistogram, to benchmark the lookup.
 //-----------------------------------------------------------------------------
 #include <iostream>
 #include <cassert>
+#include <cmath>
+#include <stdlib.h>
 #include "JECUncertainty.h"
 //-----------------------------------------------------------------------------
 using namespace std;
 //-----------------------------------------------------------------------------
 
-JECUncertainty::JECUncertainty(string rootFileName)
-  : rfile(new TFile(rootFileName.c_str())),
-    table_(0)
+JECUncertainty::JECUncertainty(string rootFileName, bool bilinear_)
+  : table_(0),
+    values(vector<double>()),
+    bilinear(bilinear_),
+    histogram_(0),
+    ptstep(0),
+    etastep(0)
 {
-  if ( ! rfile->IsOpen() )
+  TFile rfile(rootFileName.c_str());
+  if ( ! rfile.IsOpen() )
     {
       cout << "JECUncertainty ** file " << rootFileName 
 	   << " not opened " << endl
@@ -22,38 +32,124 @@ JECUncertainty::JECUncertainty(string rootFileName)
 	   << endl;
       exit(0);
     }
-  table_ = dynamic_cast<TH2F*>(rfile->Get("htable"));
-  assert(table_);
+  TH2F* h = dynamic_cast<TH2F*>(rfile.Get("htable"));
+  assert(h);
 
+  // keep a copy of the table that does not belong to the file
+  table_ = (TH2F*)h->Clone();
+  table_->SetDirectory(0);
+  rfile.Close();
+  
   TAxis* xaxis = table_->GetXaxis();
   ptbins = xaxis->GetNbins();
   ptmin  = xaxis->GetBinLowEdge(1);
   ptmax  = xaxis->GetBinUpEdge(ptbins);
-  ptstep = (ptmax-ptmin)/ptbins;
+  ptscale= ptbins/(ptmax-ptmin);
 
   TAxis* yaxis = table_->GetYaxis();
   etabins= yaxis->GetNbins();
   etamin = yaxis->GetBinLowEdge(1);
   etamax = yaxis->GetBinUpEdge(etabins);
-  etastep= (etamax-etamin)/etabins;
+  etascale= etabins/(etamax-etamin);
+
+  values.resize(ptbins*etabins);
+  for(int iy=0; iy < etabins; iy++)
+    for(int ix=0; ix < ptbins; ix++)
+      values[iy*ptbins + ix] = table_->GetBinContent(ix+1, iy+1);
+}
+
+JECUncertainty::JECUncertainty(const JECUncertainty& o)
+  : table_(0),
+    values(o.values),
+    bilinear(o.bilinear),
+    histogram_(o.histogram_),
+    ptbins(o.ptbins),
+    ptmin(o.ptmin),
+    ptmax(o.ptmax),
+    ptscale(o.ptscale),
+    ptstep(o.ptstep),
+    etabins(o.etabins),
+    etamin(o.etamin),
+    etamax(o.etamax),
+    etascale(o.etascale),
+    etastep(o.etastep)
+{
+  if ( o.table_ )
+    {
+      table_ = (TH2F*)o.table_->Clone();
+      table_->SetDirectory(0);
+    }
+}
+
+JECUncertainty& JECUncertainty::operator=(const JECUncertainty& o)
+{
+  if ( this == &o ) return *this;
+  if ( table_ ) delete table_;
+  table_ = 0;
+  if ( o.table_ )
+    {
+      table_ = (TH2F*)o.table_->Clone();
+      table_->SetDirectory(0);
+    }
+  values  = o.values;
+  bilinear= o.bilinear;
+  histogram_= o.histogram_;
+  ptbins  = o.ptbins;
+  ptmin   = o.ptmin;
+  ptmax   = o.ptmax;
+  ptscale = o.ptscale;
+  ptstep  = o.ptstep;
+  etabins = o.etabins;
+  etamin  = o.etamin;
+  etamax  = o.etamax;
+  etascale= o.etascale;
+  etastep = o.etastep;
+  return *this;
 }
     
 JECUncertainty::~JECUncertainty()
-
 { 
-  if ( rfile ) rfile->Close();
+  if ( table_ ) delete table_;
 }
 
-double JECUncertainty::operator()(double pt, double eta)
+void JECUncertainty::setHistogram(TH2F* h)
+{
+  histogram_ = h;
+  if ( ! h ) return;
+  ptstep  = (ptmax-ptmin)/ptbins;
+  etastep = (etamax-etamin)/etabins;
+}
+
+double JECUncertainty::outOfRange_(double pt, double eta)
 {
   if ( pt  < ptmin ) return -1;
   if ( pt  > ptmax ) return -2;
   if ( eta < etamin) return -3;
-  if ( eta > etamax) return -4;
+  return -4;
+}
+
+double JECUncertainty::interpolate_(double pt, double eta)
+{
+  // position relative to the bin centers, clamped so that the
+  // value is constant between the first (last) bin center and
+  // the lower (upper) edge
+  double u = (pt  - ptmin) *ptscale  - 0.5;
+  double v = (eta - etamin)*etascale - 0.5;
+  int ix = ptbins  > 1 ? min(max((int)floor(u), 0), ptbins-2)  : 0;
+  int iy = etabins > 1 ? min(max((int)floor(v), 0), etabins-2) : 0;
+  double a = ptbins  > 1 ? min(max(u - ix, 0.0), 1.0) : 0;
+  double b = etabins > 1 ? min(max(v - iy, 0.0), 1.0) : 0;
 
+  const double* z = &values[iy*ptbins + ix];
+  int dx = ptbins  > 1 ? 1 : 0;
+  int dy = etabins > 1 ? ptbins : 0;
+  return (1-b)*((1-a)*z[0]  + a*z[dx]) 
+    +       b *((1-a)*z[dy] + a*z[dy+dx]);
+}
+
+double JECUncertainty::histogramLookup_(double pt, double eta)
+{
   int ix = (int)((pt - ptmin)/ptstep) + 1;
   int iy = (int)((eta - etamin)/etastep) + 1;
-  return table_->GetBinContent(ix, iy);
+  return histogram_->GetBinContent(ix, iy);
 }
-
-
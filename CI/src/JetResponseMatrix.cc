@@ -0,0 +1,123 @@
+// ---------------------------------------------------------------------------
+// file: JetResponseMatrix.cc
+// Description: see header
+// Created: 18-Oct-2026
+// ---------------------------------------------------------------------------
+#include <vector>
+#include <algorithm>
+#include <iostream>
+#include <cmath>
+#include <stdlib.h>
+
+#include "TMath.h"
+
+#include "JetResponseMatrix.h"
+#include "JetSpectrumSmeared.h"
+#include "JetSpectrum.h"
+#include "JECUncertainty.h"
+// ---------------------------------------------------------------------------
+using namespace std;
+
+namespace {
+  // range of true pT (see JetSpectrumSmeared::applySmearing_)
+  const double TRUEPTMIN =  100.0;
+  const double TRUEPTMAX = 4200.0;
+};
+// ---------------------------------------------------------------------------
+JetResponseMatrix::JetResponseMatrix(JECUncertainty* JESunc_,
+				     double JERunc_,
+				     double x_, double y_,
+				     double pTmin_, double pTmax_,
+				     int npT_,
+				     double step_)
+  : JESunc(JESunc_),
+    JERunc(JERunc_),
+    x(x_), y(y_),
+    step(step_),
+    pTreco(vector<double>(npT_+1, 0)),
+    pTtrue(vector<double>()),
+    first(vector<int>(npT_+1, 0)),
+    weight(vector<vector<double> >(npT_+1))
+{
+  // range of true pT over which to integrate for each reco-level pT
+  vector<double> lower(npT_+1), upper(npT_+1);
+  double pTstep = (pTmax_-pTmin_)/npT_;
+  for(int c=0; c <= npT_; c++)
+    {
+      pTreco[c] = pTmin_ + c*pTstep;
+      double offset = 5 * sigmapT(pTreco[c]);
+      lower[c] = TMath::Max(TRUEPTMIN, pTreco[c] - offset);
+      upper[c] = TMath::Min(TRUEPTMAX, pTreco[c] + offset);
+    }
+
+  // true pT grid, aligned with TRUEPTMIN
+  double lo = *min_element(lower.begin(), lower.end());
+  double hi = *max_element(upper.begin(), upper.end());
+  int k0 = (int)ceil((lo - TRUEPTMIN)/step);
+  int k1 = (int)floor((hi - TRUEPTMIN)/step);
+  for(int k=k0; k <= k1; k++)
+    pTtrue.push_back(TRUEPTMIN + k*step);
+
+  // trapezoidal rule on the grid points within the range of each row
+  for(int c=0; c <= npT_; c++)
+    {
+      int a = (int)ceil((lower[c] - TRUEPTMIN)/step) - k0;
+      int b = (int)floor((upper[c] - TRUEPTMIN)/step) - k0;
+      first[c] = a;
+      if ( b <= a ) continue;
+      
+      vector<double>& w = weight[c];
+      w.resize(b-a+1);
+      for(int k=a; k <= b; k++)
+	w[k-a] = step * response(pTreco[c], pTtrue[k]);
+      w.front() *= 0.5;
+      w.back()  *= 0.5;
+    }
+}
+
+vector<double> JetResponseMatrix::apply(JetSpectrum* spectrum)
+{
+  if ( spectrum->null() ) return vector<double>(pTreco.size(), 0);
+  
+  vector<double> xsection(pTtrue.size());
+  for(size_t k=0; k < pTtrue.size(); k++)
+    xsection[k] = (*spectrum)(pTtrue[k]);
+  return apply(xsection);
+}
+
+vector<double> JetResponseMatrix::apply(const vector<double>& xsection)
+{
+  if ( xsection.size() != pTtrue.size() )
+    {
+      cout << "JetResponseMatrix::apply - expected "
+	   << pTtrue.size() << " true pT points, but got "
+	   << xsection.size() << endl;
+      exit(0);
+    }
+  
+  vector<double> smeared(pTreco.size(), 0);
+  for(size_t c=0; c < pTreco.size(); c++)
+    {
+      const double* w = weight[c].size() ? &weight[c][0] : 0;
+      const double* s = &xsection[0] + first[c];
+      int n = weight[c].size();
+      double sum = 0;
+      for(int k=0; k < n; k++) sum += w[k] * s[k];
+      smeared[c] = sum;
+    }
+  return smeared;
+}
+
+// Jet response function (see JetSpectrumSmeared::response)
+double JetResponseMatrix::response(double pTreco, double pT)
+{
+  JECUncertainty& JECunc = *JESunc;
+  double X = TMath::Max(1.e-3, 1.0 + x * JECunc(pTreco, 0));
+  double Y = TMath::Max(1.e-3, 1.0 + y * JERunc);
+  return TMath::Gaus(pTreco/X, pT, Y*sigmapT(pT), kTRUE); 
+}
+
+double JetResponseMatrix::sigmapT(double pT)
+{    
+  return pT * JetSpectrumSmeared::resolution(pT);
+}
@@ -4,6 +4,7 @@
 // it. 
 // HBP 2012 - 2014
 // Updated: 11-October-2014 HBP - add non-perturbative correction
+//          18-Oct-2026     add binIntegrals
 // ----------------------------------------------------------------------------
 #include <vector>
 #include <string>
@@ -12,6 +13,7 @@
 #include <sstream>
 #include <cmath>
 #include <stdlib.h>
+#include <algorithm>
 
 #include "TMath.h"
 #include "TFile.h"
@@ -30,6 +32,19 @@ using namespace ROOT::Math;
 const double ABSTOL=1.e-9;
 const double RELTOL=1.e-6;
 
+namespace {
+  // 8-point Gauss-Legendre nodes and weights on [-1, 1]
+  const int NGL = 8;
+  const double GLX[NGL] = {-0.9602898564975363, -0.7966664774136267,
+			   -0.5255324099163290, -0.1834346424956498,
+			    0.1834346424956498,  0.5255324099163290,
+			    0.7966664774136267,  0.9602898564975363};
+  const double GLW[NGL] = { 0.1012285362903763,  0.2223810344533745,
+			    0.3137066458778873,  0.3626837833783620,
+			    0.3626837833783620,  0.3137066458778873,
+			    0.2223810344533745,  0.1012285362903763};
+};
+
 // ----------------------------------------------------------------------------
 // Inclusive jet spectrum in |y| < 0.5
 // ----------------------------------------------------------------------------
@@ -131,3 +146,35 @@ double JetSpectrum::operator()(double pTlow, double pThigh)
   ifn.SetRelTolerance(RELTOL);
   return ifn.Integral(pTlow, pThigh);
 }
+
+vector<double> JetSpectrum::binIntegrals(const vector<double>& edges)
+{
+  vector<double> integrals(edges.size() > 0 ? edges.size()-1 : 0, 0);
+  if ( nullHist ) return integrals;
+  
+  for(size_t c=0; c < integrals.size(); c++)
+    {
+      double pTlow  = edges[c];
+      double pThigh = edges[c+1];
+      if ( pTlow  < ptcn.front() ) continue;
+      if ( pThigh > ptcn.back() )  continue;
+
+      // split the bin at the interpolation points
+      vector<double> pt(1, pTlow);
+      vector<double>::iterator it = upper_bound(ptcn.begin(), ptcn.end(),
+						pTlow);
+      for(; it != ptcn.end() && *it < pThigh; it++) pt.push_back(*it);
+      pt.push_back(pThigh);
+
+      double sum = 0;
+      for(size_t k=0; k < pt.size()-1; k++)
+	{
+	  double h = 0.5*(pt[k+1] - pt[k]);
+	  double m = 0.5*(pt[k+1] + pt[k]);
+	  for(int i=0; i < NGL; i++)
+	    sum += h * GLW[i] * (*this)(m + h*GLX[i]);
+	}
+      integrals[c] = sum;
+    }
+  return integrals;
+}
@@ -6,6 +6,9 @@
 //          18-Jun-2016 HBP update NP corrections and smearing (SMP-15-007)
 //          23-Jun-2016 HBP use JECUncertainty
 //          19-Sep-2016 HBP fix integration bug introduced since June 2016!
+//          18-Oct-2026     add smearing with a JetResponseMatrix
+//          18-Oct-2026     add Gauss-Hermite smearing
+//          18-Oct-2026     add binIntegrals
 // ---------------------------------------------------------------------------
 #include <vector>
 #include <string>
@@ -14,6 +17,7 @@
 #include <sstream>
 #include <cmath>
 #include <stdlib.h>
+#include <algorithm>
 
 #include "TMath.h"
 #include "TFile.h"
@@ -22,6 +26,7 @@
 #include "JetSpectrumSmeared.h"
 #include "JetSpectrum.h"
 #include "JECUncertainty.h"
+#include "JetResponseMatrix.h"
 // ---------------------------------------------------------------------------
 using namespace std;
 using namespace ROOT::Math;
@@ -44,7 +49,51 @@ namespace {
 	    wRho3*pow(gres_ofy0_3(x),2) +
 	    wRho4* pow(gres_ofy0_4(x),2) +
 	    wRho5*pow(gres_ofy0_5(x),2) );}
-  
+
+  // Gauss-Hermite nodes u and weights w for the standard normal density,
+  // sum_i w[i] f(u[i]) ~ int phi(u) f(u) du
+  // (see gauher in Numerical Recipes).
+  void gaussHermite(int n, vector<double>& u, vector<double>& w)
+  {
+    const double EPS  = 3.e-14;
+    const double PIM4 = 0.7511255444649425; // pi^(-1/4)
+    vector<double> x(n), v(n);
+    double z=0, pp=0;
+    for(int i=0; i < (n+1)/2; i++)
+      {
+	if      ( i == 0 ) z = sqrt(2.0*n+1) - 1.85575*pow(2.0*n+1, -0.16667);
+	else if ( i == 1 ) z-= 1.14*pow(n, 0.426)/z;
+	else if ( i == 2 ) z = 1.86*z - 0.86*x[0];
+	else if ( i == 3 ) z = 1.91*z - 0.91*x[1];
+	else               z = 2.0*z - x[i-2];
+	for(int iter=0; iter < 100; iter++)
+	  {
+	    double p1 = PIM4;
+	    double p2 = 0;
+	    for(int j=1; j <= n; j++)
+	      {
+		double p3 = p2;
+		p2 = p1;
+		p1 = z*sqrt(2.0/j)*p2 - sqrt((j-1.0)/j)*p3;
+	      }
+	    pp = sqrt(2.0*n)*p2;
+	    double z1 = z;
+	    z = z1 - p1/pp;
+	    if ( fabs(z-z1) <= EPS ) break;
+	  }
+	x[i] = z;
+	x[n-1-i] =-z;
+	v[i] = v[n-1-i] = 2.0/(pp*pp);
+      }
+    // change from weight exp(-x^2) to the standard normal density
+    u.resize(n);
+    w.resize(n);
+    for(int i=0; i < n; i++)
+      {
+	u[i] = sqrt(2.0)*x[i];
+	w[i] = v[i]/sqrt(M_PI);
+      }
+  }
 };
 // ---------------------------------------------------------------------------
 // Inclusive jet spectrum in |y| < 0.5
@@ -54,12 +103,16 @@ JetSpectrumSmeared::JetSpectrumSmeared(JetSpectrum* spectrum_,
 				       double JERunc_,
 				       double x_, double y_,
 				       double pTmin_, double pTmax_,
-				       int npT_)
+				       int npT_,
+				       int nhermite_)
   : spectrum(spectrum_), 
     JESunc(JESunc_),
     JERunc(JERunc_),
     x(x_), y(y_),
     pTmin(pTmin_), pTmax(pTmax_), npT(npT_),
+    nhermite(nhermite_),
+    hermiteu(std::vector<double>()),
+    hermitew(std::vector<double>()),
     pT(std::vector<double>(npT+1,0)),
     xsection(std::vector<double>(npT+1,0)),
     
@@ -79,6 +132,7 @@ JetSpectrumSmeared::JetSpectrumSmeared(JetSpectrum* spectrum_,
 {
   Intf1->SetRelTolerance(RELTOL);
   Intf2->SetRelTolerance(RELTOL);    
+  if ( nhermite > 0 ) gaussHermite(nhermite, hermiteu, hermitew);
   
   if ( spectrum->null() )
     interp = 0;
@@ -100,6 +154,48 @@ JetSpectrumSmeared::JetSpectrumSmeared(JetSpectrum* spectrum_,
     }
 }
 
+JetSpectrumSmeared::JetSpectrumSmeared(JetSpectrum* spectrum_,
+				       JetResponseMatrix* matrix)
+  : spectrum(spectrum_), 
+    JESunc(matrix->JES()),
+    JERunc(matrix->JER()),
+    x(matrix->JESvariate()),
+    y(matrix->JERvariate()),
+    pTmin(matrix->pT().front()),
+    pTmax(matrix->pT().back()),
+    npT(matrix->pT().size()-1),
+    nhermite(0),
+    hermiteu(std::vector<double>()),
+    hermitew(std::vector<double>()),
+    pT(matrix->pT()),
+    xsection(std::vector<double>()),
+    
+    interp(0),
+    f1(0),
+    Intf1(0),
+
+    f2(new ROOT::Math::WrappedMemFunction<JetSpectrumSmeared, 
+       double (JetSpectrumSmeared::*)(double)>
+       (*this, &JetSpectrumSmeared::operator())),
+    
+    Intf2(new ROOT::Math::Integrator(*f2))      
+{
+  Intf2->SetRelTolerance(RELTOL);    
+  
+  if ( spectrum->null() )
+    interp = 0;
+  else
+    {
+      // a matrix-vector product replaces the integrations
+      // in applySmearing_
+      xsection = matrix->apply(spectrum);
+      if ( spectrum->positive() )
+	for(int c=0; c <= npT; c++)
+	  xsection[c] = log(xsection[c]);
+      interp = new Interpolator(pT, xsection, Interpolation::kLINEAR);
+    }
+}
+
 JetSpectrumSmeared::JetSpectrumSmeared(const JetSpectrumSmeared& o)
   : spectrum(o.spectrum), 
     JESunc(o.JESunc),
@@ -109,6 +205,9 @@ JetSpectrumSmeared::JetSpectrumSmeared(const JetSpectrumSmeared& o)
     pTmin(o.pTmin),
     pTmax(o.pTmax),
     npT(o.npT),
+    nhermite(o.nhermite),
+    hermiteu(o.hermiteu),
+    hermitew(o.hermitew),
     pT(o.pT),
     xsection(o.xsection),
     interp(o.interp)
@@ -141,11 +240,57 @@ double JetSpectrumSmeared::operator()(double pTlow, double pThigh)
   return Intf2->Integral(pTlow, pThigh);
 }
 
+vector<double> JetSpectrumSmeared::binIntegrals(const vector<double>& edges)
+{
+  vector<double> integrals(edges.size() > 0 ? edges.size()-1 : 0, 0);
+  if ( spectrum->null() ) return integrals;
+  bool positive = spectrum->positive();
+  
+  for(size_t c=0; c < integrals.size(); c++)
+    {
+      double pTlow  = edges[c];
+      double pThigh = edges[c+1];
+      if ( pTlow  < pT.front() ) continue;
+      if ( pThigh > pT.back() )  continue;
+
+      // first segment [pT[k], pT[k+1]] that overlaps the bin
+      int k = (int)(upper_bound(pT.begin(), pT.end(), pTlow) - pT.begin()) - 1;
+      k = max(0, min(k, npT-1));
+      
+      double sum = 0;
+      for(; k < npT && pT[k] < pThigh; k++)
+	{
+	  double a = max(pTlow,  pT[k]);
+	  double b = min(pThigh, pT[k+1]);
+	  if ( b <= a ) continue;
+
+	  // value and slope of the interpolant at a
+	  double slope = (xsection[k+1] - xsection[k])/(pT[k+1] - pT[k]);
+	  double ya = xsection[k] + slope*(a - pT[k]);
+	  double d  = b - a;
+	  if ( positive )
+	    {
+	      // int_a^b exp(ya + slope*(t - a)) dt
+	      double z = slope*d;
+	      if ( fabs(z) < 1.e-6 )
+		sum += exp(ya) * d * (1 + z*(0.5 + z/6));
+	      else
+		sum += exp(ya) * (exp(z) - 1)/slope;
+	    }
+	  else
+	    sum += d * (ya + 0.5*slope*d);
+	}
+      integrals[c] = sum;
+    }
+  return integrals;
+}
+
 // Convolution of response function with NLO spectrum;
 double JetSpectrumSmeared::applySmearing_(double pTreco)
 {
   pTreco_ = pTreco; // NB: cache reco-level pT
   if ( spectrum->null() ) return 0;
+  if ( nhermite > 0 ) return applyHermiteSmearing_(pTreco);
   
   // define range over which to integrate over true pT
   double offset = 5 * sigmapT(pTreco);
@@ -155,6 +300,49 @@ double JetSpectrumSmeared::applySmearing_(double pTreco)
   return y;
 }
  
+// Convolution using Gauss-Hermite quadrature. The response function is
+// a normal density in r = pTreco/X, with mean pT and width s(pT) =
+// Y*sigmapT(pT). Changing variables from pT to u = (r - pT)/s(pT) gives
+//
+//   int dpT N(r; pT, s(pT)) f(pT) = int du phi(u) f(pT(u)) / (1 + u s'(pT(u)))
+//
+// where pT(u) solves r - pT = u s(pT), which is found by Newton's method
+// starting from the solution for a width linear in pT.
+double JetSpectrumSmeared::applyHermiteSmearing_(double pTreco)
+{
+  JECUncertainty& JECunc = *JESunc;
+  double X = TMath::Max(1.e-3, 1.0 + x * JECunc(pTreco, 0));
+  double Y = TMath::Max(1.e-3, 1.0 + y * JERunc);
+  double r = pTreco / X;
+
+  // width s(pT) and its derivative s'(pT)
+  const double h = 1.e-4;
+  double sr = Y * sigmapT(r);
+  double dsr= Y * (sigmapT(r*(1+h)) - sigmapT(r*(1-h)))/(2*h*r);
+  
+  double sum = 0;
+  for(int i=0; i < nhermite; i++)
+    {
+      double u = hermiteu[i];
+      double d = 1 + u*dsr;
+      if ( d <= 0 ) continue;
+      double pT = r - u*sr/d;
+      for(int iter=0; iter < 3; iter++)
+	{
+	  // same range of true pT as in applySmearing_
+	  if ( pT < 100.0 || pT > 4200.0 ) break;
+	  double s = Y * sigmapT(pT);
+	  double ds= Y * (sigmapT(pT*(1+h)) - sigmapT(pT*(1-h)))/(2*h*pT);
+	  d = 1 + u*ds;
+	  if ( iter == 2 ) break;
+	  pT += (r - pT - u*s)/d;
+	}
+      if ( pT < 100.0 || pT > 4200.0 || d <= 0 ) continue;
+      sum += hermitew[i] * (*spectrum)(pT) / d;
+    }
+  return sum;
+}
+ 
 double JetSpectrumSmeared::integrand(double pT)
 {
   double y = response(pTreco_, pT) * (*spectrum)(pT);
@@ -182,5 +370,10 @@ double JetSpectrumSmeared::response(double pTreco, double pT)
 
 double JetSpectrumSmeared::sigmapT(double pT)
 {    
-  return pT * gres_ofy0_all(pT);
+  return pT * resolution(pT);
+}
+
+double JetSpectrumSmeared::resolution(double pT)
+{    
+  return gres_ofy0_all(pT);
 }
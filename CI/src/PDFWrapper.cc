@@ -19,6 +19,7 @@ using namespace std;
 //--------------------------------------------------------------
 PDFWrapper::PDFWrapper()
   : PDFunction(),
+    _jetpdf(0),
     _data(vector<double>())
 {}
 
@@ -27,14 +28,18 @@ PDFWrapper::PDFWrapper(RooAbsPdf& pdf, RooArgSet& obs, RooRealVar& poi)
     _pdf(&pdf),
     _obs(&obs),
     _poi(&poi),
+    _jetpdf(dynamic_cast<RooInclusiveJetPdf*>(&pdf)),
     _data(vector<double>(_obs->getSize()))
-{}
+{
+  snapshot();
+}
 
 PDFWrapper::PDFWrapper(const PDFWrapper& other)
   : PDFunction(),
     _pdf(other._pdf),
     _obs(other._obs),
     _poi(other._poi),
+    _jetpdf(other._jetpdf),
     _data(other._data)
 {}
 
@@ -63,11 +68,13 @@ PDFWrapper::setData(std::vector<double>& data)
     RooAbsArg* arg = list.at(c);
     (dynamic_cast<RooRealVar*>(arg))->setVal(_data[c]);
   }
+  snapshot();
 }
 
 double 
 PDFWrapper::operator() (double poi)
 {
+  if ( _jetpdf ) return _jetpdf->likelihood(poi);
   _poi->setVal(poi);
   double p =  _pdf->getVal();
   return p;
@@ -75,3 +82,18 @@ PDFWrapper::operator() (double poi)
 
 
 
+
+double 
+PDFWrapper::logLikelihood(double poi)
+{
+  if ( _jetpdf ) return _jetpdf->logLikelihood(poi);
+  _poi->setVal(poi);
+  return log(_pdf->getVal());
+}
+
+bool
+PDFWrapper::table(vector<double>& x, vector<double>& logy)
+{
+  if ( _jetpdf ) return _jetpdf->table(x, logy);
+  return false;
+}
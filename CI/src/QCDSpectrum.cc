@@ -1,6 +1,7 @@
 // ---------------------------------------------------------------------------
 // Read a QCD histogram
 // HBP 2014
+// Updated: 18-Oct-2026 add constructor that reads a SpectrumStore
 // ---------------------------------------------------------------------------
 #include <stdio.h>
 #include <stdlib.h>
@@ -42,9 +43,58 @@ QCDSpectrum::QCDSpectrum(const  char* _name, const char* _title,
     xsec(0)
 {
   get(hdir, hname, y);
-  
+  book(prefix);
+}
+
+QCDSpectrum::QCDSpectrum(const  char* _name, const char* _title,
+			 SpectrumStore& store, string key,
+			 int nbins, double ptmin,
+			 string prefix)
+  : RooAbsReal(_name, _title),
+    histdir_(store.filename()),
+    histname_(key),
+    nbins_(nbins),
+    ptmin_(ptmin),    
+    y(vector<double>()),
+    pt(vector<double>()),
+    xsec(0)
+{
+  if ( ! store.good() )
+    error("QCDSpectrum", string("bad store ") + store.filename());
+  if ( store.numberOfColumns() != 1 )
+    error("QCDSpectrum", store.filename() + string(" is not a QCD store"));
+  int r = store.find(key);
+  if ( r < 0 )
+    error("QCDSpectrum", string("can't find ") + key);
+
+  // find first bin (as in get)
+  const double* edges = store.edges();
+  int offset = 0;
+  if ( nbins_ > 0 )
+    {
+      nbins = nbins_;
+      while ( offset < store.numberOfBins()-1 &&
+	      edges[offset+1] <= ptmin_+1 ) offset++;
+    }
+  else
+    nbins = store.numberOfBins();
+  if ( offset + nbins > store.numberOfBins() )
+    error("QCDSpectrum", string("too few bins in ") + store.filename());
+
+  const double* data = store.record(r);
+  for(int ii=0; ii < nbins; ii++)
+    {
+      y.push_back(data[offset+ii]);
+      pt.push_back(edges[offset+ii]);
+    }
+  pt.push_back(edges[offset+nbins]);
+  book(prefix);
+}
+
+void QCDSpectrum::book(string prefix)
+{
   // create a histogram to receive spectrum
-  string title(hdir+hname);
+  string title(histdir_+histname_);
   if ( prefix != "" ) title = prefix + title;
 
   QCDSpectrum::histid++;
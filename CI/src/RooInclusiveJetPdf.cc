@@ -6,11 +6,18 @@
 #include <vector>
 #include <iostream>
 #include <limits>
+#include <unistd.h>
+#include <thread>
+#include <algorithm>
 #include "TMath.h"
 #include "RooFit.h"
 #include "RooInclusiveJetPdf.h"
+#include "CIXsection.h"
+#include "Bayes.h"
 #include "TMath.h"
 #include "TRandom3.h"
+#include "TROOT.h"
+#include "TFile.h"
 #include "Math/Random.h"
 #include "Math/GSLRndmEngines.h"
 //---------------------------------------------------------------------------
@@ -21,6 +28,27 @@ namespace {
   ROOT::Math::Random<ROOT::Math::GSLRngMT>* gslrandom = 
     new ROOT::Math::Random<ROOT::Math::GSLRngMT>();
   TRandom3 rand3;
+  const int NPTS=256; // number of lambda grid intervals
+  const int NPTS1=250;// number of intervals for a single spectrum
+  const int NPTS0=16; // number of intervals of initial adaptive grid
+
+  // the name of the sidecar file is relative to the workspace file, so
+  // look for it next to each open ROOT file and, failing that, in the
+  // current directory
+  string findSidecar(string filename)
+  {
+    if ( filename.size() > 0 && filename[0] == '/' ) return filename;
+    TIter next(gROOT->GetListOfFiles());
+    while ( TFile* file = (TFile*)next() )
+      {
+	string name(file->GetName());
+	size_t slash = name.rfind('/');
+	if ( slash == string::npos ) continue;
+	string path = name.substr(0, slash+1) + filename;
+	if ( access(path.c_str(), R_OK) == 0 ) return path;
+      }
+    return filename;
+  }
 };
 
 RooInclusiveJetPdf::RooInclusiveJetPdf(const char* name, const char* title,
@@ -35,6 +63,9 @@ RooInclusiveJetPdf::RooInclusiveJetPdf(const char* name, const char* title,
     qcd(vector<QCDSpectrum>()),
     ci(vector<CISpectrum>()),
     index(vector<int>()),    
+    sidecar(""),
+    block(vector<double>()),
+    leadingorder(vector<int>()),
     smallest(log(numeric_limits<double>::denorm_min())),
     number(-1), // loop over all spectra
     useasimov(false),
@@ -50,7 +81,20 @@ RooInclusiveJetPdf::RooInclusiveJetPdf(const char* name, const char* title,
     useinterpolation(false), // Set false initially to compute likelihood
     usebootstrap(false),
     useprofile(false),
-    interp(0)
+    interp(0),
+    loginterp(0),
+    ensemble_(0),
+    n_(vector<double>()),
+    k_(vector<double>(6, 0)),
+    logf_(vector<double>()),
+    nthreads_(1),
+    gridparallel_(false),
+    tolerance_(1.e-4),
+    nevaluations_(0),
+    tablex_(vector<double>()),
+    tablelogy_(vector<double>()),
+    countval_(vector<double>()),
+    nlnn_(0)
 {  
   count.add(_count);
   kappa.add(_kappa);
@@ -66,6 +110,9 @@ RooInclusiveJetPdf::RooInclusiveJetPdf(const RooInclusiveJetPdf& other,
     qcd(other.qcd),
     ci(other.ci),
     index(other.index),
+    sidecar(other.sidecar),
+    block(other.block),
+    leadingorder(other.leadingorder),
     smallest(other.smallest),
     number(other.number),
     useasimov(other.useasimov),
@@ -81,14 +128,354 @@ RooInclusiveJetPdf::RooInclusiveJetPdf(const RooInclusiveJetPdf& other,
     useinterpolation(other.useinterpolation),
     usebootstrap(other.usebootstrap),
     useprofile(other.useprofile),
-    interp(other.interp)
+    interp(other.interp),
+    loginterp(other.loginterp),
+    ensemble_(0),
+    n_(vector<double>()),
+    k_(vector<double>(6, 0)),
+    logf_(vector<double>()),
+    nthreads_(other.nthreads_),
+    gridparallel_(other.gridparallel_),
+    tolerance_(other.tolerance_),
+    nevaluations_(other.nevaluations_),
+    tablex_(other.tablex_),
+    tablelogy_(other.tablelogy_),
+    countval_(vector<double>()),
+    nlnn_(0)
 {}
 
 void RooInclusiveJetPdf::add(QCDSpectrum& _qcd, CISpectrum&  _ci)
 {
+  if ( leadingorder.size() > 0 )
+    {
+      cout << "** RooInclusiveJetPdf ** can't add spectra after compact"
+	   << endl;
+      return;
+    }
   qcd.push_back(_qcd);
   ci.push_back(_ci);
   index.push_back(qcd.size()-1);
+
+  // the ensemble must be rebuilt
+  delete ensemble_;
+  ensemble_ = 0;
+}
+
+const SpectrumEnsemble& RooInclusiveJetPdf::ensemble() const
+{
+  if ( ensemble_ ) return *ensemble_;
+
+  int nbins = count.getSize();
+  ensemble_ = new SpectrumEnsemble(nbins);
+  ensemble_->setNumberOfThreads(nthreads_);
+  if ( sidecar != "" )
+    {
+      // the spectra are views of a memory-mapped file
+      string path = findSidecar(sidecar);
+      if ( ! ensemble_->map(path) )
+	{
+	  cout << "** RooInclusiveJetPdf ** can't map " << path << endl;
+	  exit(0);
+	}
+      return *ensemble_;
+    }
+  else if ( leadingorder.size() > 0 )
+    {
+      // the spectra are views of the block
+      size_t nspectra = leadingorder.size();
+      ensemble_->attach(&block[0], &block[nspectra*nbins], leadingorder);
+      return *ensemble_;
+    }
+
+  vector<double> y(nbins);
+  vector<double> coef;
+  for(size_t c=0; c < qcd.size(); c++)
+    {
+      coef.clear();
+      for(int ii=0; ii < nbins; ii++)
+	{
+	  y[ii] = qcd[c](ii);
+	  vector<double> a = ci[c].coefficients(ii);
+	  coef.insert(coef.end(), a.begin(), a.end());
+	}
+      ensemble_->add(y, coef, ci[c].leadingOrder());
+    }
+  return *ensemble_;
+}
+
+void RooInclusiveJetPdf::snapshot() const
+{
+  // copy counts and kappa into plain arrays
+  countval_.resize(count.getSize());
+  for(size_t ii=0; ii < countval_.size(); ii++)
+    countval_[ii] = static_cast<RooAbsReal&>(count[ii]).getVal();
+  
+  k_.resize(6);
+  for(int c=0; c < 6; c++)
+    k_[c] = static_cast<RooAbsReal&>(kappa[c]).getVal();
+}
+
+void RooInclusiveJetPdf::setCounts() const
+{
+  // firstbin, lastbin determine the range of bins to use in
+  // calculation of likelihood. the counts are taken from the
+  // snapshot, which is taken here only if there is none
+  if ( countval_.size() == 0 ) snapshot();
+  n_.resize(lastbin-firstbin+1);
+  int jj = 0;
+  for(int ii=firstbin; ii <= lastbin; ii++)
+    {
+      if ( useasimov )
+	n_[jj] = asimov[ii];
+      else
+	n_[jj] = countval_[ii];
+      jj++;
+    }
+}
+
+int RooInclusiveJetPdf::changes_() const
+{
+  // find which of the parameters on which the cached predictions depend
+  // have changed since the last call (changes of the counts are tracked
+  // by dataConstants_). kappa must have been set by snapshot.
+  int changed = 0;
+  if ( k_ != kappakey_ )
+    {
+      kappakey_ = k_;
+      changed |= KAPPA;
+    }
+  if ( rangekey_.size() != 2 ||
+       rangekey_[0] != lambda.min() || rangekey_[1] != lambda.max() )
+    {
+      rangekey_.assign(1, lambda.min());
+      rangekey_.push_back(lambda.max());
+      changed |= RANGE;
+    }
+  if ( binkey_.size() != 2 || binkey_[0] != firstbin || binkey_[1] != lastbin )
+    {
+      binkey_.assign(1, firstbin);
+      binkey_.push_back(lastbin);
+      changed |= BINS;
+    }
+  if ( index != logpindex_ )
+    {
+      logpindex_ = index;
+      changed |= SPECTRA;
+    }
+  return changed;
+}
+
+void RooInclusiveJetPdf::checkPredictions() const
+{
+  // the predictions depend on kappa, the lambda grid, the bin range
+  // and the spectra, but not on the counts. kappa must have been set
+  // by snapshot.
+  int changed = changes_();
+
+  // only the CI basis weights are rebuilt when kappa changes; the
+  // sums of the QCD cross sections over the bin range are kept. (these
+  // calls do nothing if neither kappa nor the bin range has changed.)
+  ensemble().setKappa(k_);
+  ensemble().setBinRange(firstbin, lastbin);
+
+  dataConstants_();
+  
+  if ( changed & (KAPPA | RANGE | BINS | SPECTRA) )
+    {
+      logp_.resize((NPTS+1) * index.size() * (lastbin-firstbin+1));
+      logpdone_.assign(NPTS+1, 0);
+    }
+}
+
+const double* RooInclusiveJetPdf::dataConstants_() const
+{
+  // the term of the log multinomial likelihood that depends only
+  // on the counts is recomputed only when the counts change. counts
+  // must have been set by setCounts.
+  if ( n_ != countkey_ || countkey_.size() == 0 )
+    {
+      countkey_ = n_;
+      SpectrumEnsemble::dataTerms(n_, 1, &nlnn_);
+    }
+  return &nlnn_;
+}
+
+const double* RooInclusiveJetPdf::logPredictions(int c) const
+{
+  // checkPredictions must have been called. different grid points
+  // may be computed in different threads
+  size_t size = index.size() * (lastbin-firstbin+1);
+  if ( ! logpdone_[c] )
+    {
+      double xstep = (lambda.max()-lambda.min())/NPTS;
+      ensemble_->logPredictions(lambda.min() + c * xstep, k_,
+				firstbin, lastbin, index, &logp_[c*size]);
+      logpdone_[c] = 1;
+    }
+  return &logp_[c*size];
+}
+
+const double* RooInclusiveJetPdf::logPredictions() const
+{
+  // compute predictions at all grid points, dividing them
+  // between the threads
+  checkPredictions();
+  vector<thread> threads;
+  for(int t=0; t < nthreads_; t++)
+    threads.push_back(thread([this, t]()
+			     {
+			       for(int c=t; c <= NPTS; c += nthreads_)
+				 logPredictions(c);
+			     }));
+  for(size_t t=0; t < threads.size(); t++) threads[t].join();
+  return &logp_[0];
+}
+
+void RooInclusiveJetPdf::logMarginals_(const vector<int>& nodes,
+				       vector<double>& logy) const
+{
+  // compute the log marginal likelihood at the given grid points,
+  // dividing either the grid points (gridparallel_) or, at each grid
+  // point, the spectra between the threads. in either case, each
+  // prediction is computed by one thread and the sum over spectra is
+  // done serially, so the results do not depend on the number of
+  // threads
+  const SpectrumEnsemble& e = ensemble();
+  size_t nspectra = index.size();
+  int nnodes = nodes.size();
+  if ( ! gridparallel_ && nthreads_ > 1 )
+    {
+      // the ensemble's worker threads persist between grid points
+      size_t size = nspectra * (lastbin-firstbin+1);
+      double xstep = (lambda.max()-lambda.min())/NPTS;
+      for(int i=0; i < nnodes; i++)
+	{
+	  int c = nodes[i];
+	  if ( ! logpdone_[c] )
+	    {
+	      e.logPredictions(lambda.min() + c * xstep, k_,
+			       firstbin, lastbin, index, &logp_[c*size],
+			       nthreads_);
+	      logpdone_[c] = 1;
+	    }
+	  e.logMarginals(logPredictions(c), nspectra, n_, 1, &logy[c], 1,
+			 &nlnn_);
+	}
+      return;
+    }
+  vector<thread> threads;
+  for(int t=0; t < nthreads_; t++)
+    threads.push_back(thread([this, t, nnodes, nspectra, &e, &nodes,
+			      &logy]()
+			     {
+			       for(int i=t; i < nnodes; i += nthreads_)
+				 {
+				   int c = nodes[i];
+				   e.logMarginals(logPredictions(c), nspectra,
+						  n_, 1, &logy[c], 1,
+						  &nlnn_);
+				 }
+			     }));
+  for(size_t t=0; t < threads.size(); t++) threads[t].join();
+}
+
+vector<int> RooInclusiveJetPdf::adaptiveGrid_(const vector<double>& x,
+					      vector<double>& logy) const
+{
+  // start with a coarse grid and bisect the intervals in which the
+  // midpoint differs from the (Akima) interpolant of the current grid
+  // by more than tolerance_ x the maximum likelihood. only the grid
+  // points returned are computed
+  int step = tolerance_ > 0 ? NPTS/NPTS0 : 1;
+  vector<int> nodes;
+  for(int c=0; c <= NPTS; c += step) nodes.push_back(c);
+  logMarginals_(nodes, logy);
+
+  vector<int> active(nodes.begin(), nodes.end()-1);
+  while ( step > 1 && active.size() > 0 )
+    {
+      int half = step / 2;
+      vector<int> midpoints(active.size());
+      for(size_t i=0; i < active.size(); i++)
+	midpoints[i] = active[i] + half;
+
+      // predictions of current interpolant
+      vector<double> xs(nodes.size());
+      vector<double> ys(nodes.size());
+      for(size_t i=0; i < nodes.size(); i++)
+	{
+	  xs[i] = x[nodes[i]];
+	  ys[i] = logy[nodes[i]];
+	}
+      ROOT::Math::Interpolator ip(xs, ys, ROOT::Math::Interpolation::kAKIMA);
+      vector<double> predicted(midpoints.size());
+      for(size_t i=0; i < midpoints.size(); i++)
+	predicted[i] = ip.Eval(x[midpoints[i]]);
+
+      logMarginals_(midpoints, logy);
+      
+      double logmax = -numeric_limits<double>::infinity();
+      for(size_t i=0; i < nodes.size(); i++)
+	if ( logy[nodes[i]] > logmax ) logmax = logy[nodes[i]];
+      for(size_t i=0; i < midpoints.size(); i++)
+	if ( logy[midpoints[i]] > logmax ) logmax = logy[midpoints[i]];
+
+      // refine intervals in which the interpolation error is too large
+      vector<int> next;
+      for(size_t i=0; i < midpoints.size(); i++)
+	{
+	  double error = fabs(exp(logy[midpoints[i]] - logmax) -
+			      exp(predicted[i] - logmax));
+	  if ( error > tolerance_ )
+	    {
+	      next.push_back(active[i]);
+	      next.push_back(midpoints[i]);
+	    }
+	}
+      nodes.insert(nodes.end(), midpoints.begin(), midpoints.end());
+      sort(nodes.begin(), nodes.end());
+      active = next;
+      step = half;
+    }
+  return nodes;
+}
+
+void RooInclusiveJetPdf::compact(string filename)
+{
+  const SpectrumEnsemble& e = ensemble();
+  size_t nspectra = e.size();
+  int nbins = e.numberOfBins();
+  leadingorder.resize(nspectra);
+  for(size_t c=0; c < nspectra; c++)
+    leadingorder[c] = CI(c)->leadingOrder();
+  
+  if ( filename != "" )
+    {
+      if ( ! e.write(filename) )
+	{
+	  cout << "** RooInclusiveJetPdf ** can't write " << filename << endl;
+	  exit(0);
+	}
+      // the file is written next to the workspace file, so store only
+      // its name, which is resolved when the workspace is read
+      // (see findSidecar)
+      size_t slash = filename.rfind('/');
+      sidecar = slash == string::npos ? filename : filename.substr(slash+1);
+      block.clear();
+    }
+  else
+    {
+      sidecar = "";
+      block.assign(e.qcd(0), e.qcd(0) + nspectra*nbins);
+      block.insert(block.end(), e.coefficients(0),
+		   e.coefficients(0) + nspectra*nbins*SpectrumEnsemble::NCOEF);
+    }
+  
+  // the spectra are no longer needed
+  qcd.clear();
+  ci.clear();
+  delete ensemble_;
+  ensemble_ = 0;
 }
 
 QCDSpectrum* RooInclusiveJetPdf::QCD(int c)
@@ -109,7 +496,7 @@ vector<double>& RooInclusiveJetPdf::crossSection(int c)
 {
   for(size_t ii=0; ii < xsection.size(); ii++)  xsection[ii] = 0;
   if ( c < 0 ) return xsection;
-  if ( c >= (int)ci.size() ) return xsection;
+  if ( c >= (int)size() ) return xsection;
 
   // CI parameters
   double l = (double)lambda;
@@ -119,8 +506,8 @@ vector<double>& RooInclusiveJetPdf::crossSection(int c)
 
   for(size_t ii=0; ii < xsection.size(); ii++)
     {
-      qcdxsect[ii] = qcd[c](ii);
-      xsection[ii] = qcdxsect[ii] + ci[c](l, k, ii);
+      qcdxsect[ii] = ensemble().qcd(c)[ii];
+      xsection[ii] = qcdxsect[ii] + ensemble().ci(l, k, c, ii);
     }
   return xsection;
 }
@@ -154,11 +541,11 @@ void RooInclusiveJetPdf::bootstrap(bool yes, int number)
     {
       index.resize(number);
       for (size_t c=0; c < (size_t)number; c++)
-	index[c] = rand3.Integer(qcd.size()-1);
+	index[c] = rand3.Integer(size()-1);
     }
   else
    {
-      for (size_t c=0; c < qcd.size(); c++)
+      for (size_t c=0; c < size(); c++)
 	index[c] = c;
     }    
 }
@@ -169,6 +556,7 @@ void RooInclusiveJetPdf::setAsimov(bool yes, bool fluctuate,
 {
   // Asimov data set = average[QCD spectrum] or nominal
   useasimov = yes;
+  snapshot();
   if ( ! useasimov ) return;
 
   // set CI parameters
@@ -179,7 +567,7 @@ void RooInclusiveJetPdf::setAsimov(bool yes, bool fluctuate,
       k[c] = dynamic_cast<RooRealVar*>(&kappa[c])->getVal();
 
   int nqcd = 1; // use nominal qcd spectrum
-  if ( use_average ) nqcd = qcd.size();
+  if ( use_average ) nqcd = size();
   
   for(size_t ii=0; ii < asimov.size(); ii++)
     {
@@ -187,8 +575,8 @@ void RooInclusiveJetPdf::setAsimov(bool yes, bool fluctuate,
       for(int j=0; j < nqcd; j++)
 	{
 	  int c = index[j];
-	  xsec += qcd[c](ii);
-	  if ( l > 0 ) xsec += ci[c](l, k, ii);
+	  xsec += ensemble().qcd(c)[ii];
+	  if ( l > 0 ) xsec += ensemble().ci(l, k, c, ii);
 	}
       xsec /= nqcd;
       asimov[ii] = lumi * xsec;
@@ -204,31 +592,119 @@ void RooInclusiveJetPdf::setAsimov(bool yes, bool fluctuate,
 void RooInclusiveJetPdf::initialize(int which)
 {
   number = which;
-  if ( number > (int)qcd.size()-1 ) number =-1;
+  if ( number > (int)size()-1 ) number =-1;
 
-  int npts=250;
+  int npts= number < 0 ? NPTS : NPTS1;
   vector<double> x(npts+1);
-  vector<double> y(npts+1);
+  vector<double> logy(npts+1);
   double xmin   = lambda.min();
   double xmax   = lambda.max();
   double xstep  = (xmax-xmin)/npts;
 
   useinterpolation = false;
-  for(int c=0; c <= npts; c++)
-    {
-      x[c]   = xmin + c * xstep;
-      lambda = x[c];
-      y[c]   = evaluate();
-    }
-  useinterpolation = true;
   try
     {
       delete interp;
+      delete loginterp;
     }
   catch (...)
     { }
+  interp = 0;
+  loginterp = 0;
+  if ( number < 0 )
+    {
+      // the predictions at the grid points are cached, so only
+      // the multinomial terms depend on the counts. the likelihood
+      // is computed only at the grid points chosen by adaptiveGrid_
+      for(int c=0; c <= npts; c++) x[c] = xmin + c * xstep;
+      snapshot();
+      setCounts();
+      checkPredictions();
+      vector<int> nodes = adaptiveGrid_(x, logy);
+      
+      vector<double> xs(nodes.size());
+      vector<double> logys(nodes.size());
+      for(size_t i=0; i < nodes.size(); i++)
+	{
+	  int c = nodes[i];
+	  if ( logy[c] != logy[c] )
+	    {
+	      cout << "** RooInclusiveJetPdf ** NAN at lambda = "
+		   << x[c] << endl;
+	      exit(0);
+	    }
+	  xs[i]    = x[c];
+	  logys[i] = logy[c];
+	}
+      nevaluations_ = nodes.size();
+      
+      useinterpolation = true;
+      loginterp = new ROOT::Math::Interpolator(xs, logys,
+					       ROOT::Math::
+					       Interpolation::kAKIMA);
+      // tabulate interpolant on full grid (see table)
+      tablex_ = x;
+      tablelogy_.resize(npts+1);
+      for(int c=0; c <= npts; c++)
+	tablelogy_[c] = loginterp->Eval(x[c]);
+      return;
+    }
+  else if ( gridparallel_ && nthreads_ > 1 )
+    {
+      // each thread computes every nthreads-th grid point, summing
+      // over the spectra serially, so the results are identical to
+      // those of the serial calculation
+      for(int c=0; c <= npts; c++) x[c] = xmin + c * xstep;
+      snapshot();
+      setCounts();
+      ensemble().setKappa(k_);
+      ensemble().setBinRange(firstbin, lastbin);
+      dataConstants_();
+      vector<thread> threads;
+      for(int t=0; t < nthreads_; t++)
+	threads.push_back(thread([this, t, npts, &x, &logy]()
+				 {
+				   vector<double> logf;
+				   for(int c=t; c <= npts; c += nthreads_)
+				     logy[c] = logMarginal_(x[c], logf, 1);
+				 }));
+      for(size_t t=0; t < threads.size(); t++) threads[t].join();
+      
+      for(int c=0; c <= npts; c++)
+	{
+	  if ( logy[c] != logy[c] )
+	    {
+	      cout << "** RooInclusiveJetPdf ** NAN at lambda = "
+		   << x[c] << endl;
+	      exit(0);
+	    }
+	}
+    }
+  else
+    {
+      for(int c=0; c <= npts; c++)
+	{
+	  x[c]   = xmin + c * xstep;
+	  lambda = x[c];
+	  logy[c]= logEvaluate();
+	}
+    }
+  nevaluations_ = npts+1;
+  useinterpolation = true;
+  vector<double> y(npts+1);
+  for(int c=0; c <= npts; c++) y[c] = exp(logy[c]);
   interp = new ROOT::Math::Interpolator(x, y,
 					ROOT::Math::Interpolation::kLINEAR);
+  tablex_ = x;
+  tablelogy_ = logy;
+}
+
+bool RooInclusiveJetPdf::table(vector<double>& x, vector<double>& logy) const
+{
+  if ( ! useinterpolation || tablex_.size() < 2 ) return false;
+  x = tablex_;
+  logy = tablelogy_;
+  return true;
 }
 
 double RooInclusiveJetPdf::evaluate() const
@@ -236,43 +712,16 @@ double RooInclusiveJetPdf::evaluate() const
   double l = (double)lambda;
   if ( useinterpolation )
     {
-      return interp->Eval(l);
+      if ( interp ) return interp->Eval(l);
+      return exp(loginterp->Eval(l));
     }
   // -----------------------------
-  // set counts
+  // set counts and CI parameters. this is the RooFit interface,
+  // through which the counts may change between calls (for example,
+  // when generating data), so a new snapshot is taken
   // -----------------------------
-  // firstbin, lastbin determine the range of bins to use in
-  // calculation of likelihood
-  
-  int nbins = lastbin-firstbin+1;
-  vector<double> n(nbins);
-  vector<double> p(nbins);
-  
-  if ( useasimov )
-    {
-      // use Asimov data
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
-	{
-	  n[jj] = asimov[ii];
-	  jj++;
-	}
-    }
-  else
-    {
-      // use real data
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
-	{
-	  n[jj] = dynamic_cast<RooRealVar*>(&count[ii])->getVal();
-	  jj++;
-	}
-    }
- 
-  // CI parameters
-  vector<double> k(6);
-  for(int c=0; c < 6; c++)
-    k[c] = dynamic_cast<RooRealVar*>(&kappa[c])->getVal(); 
+  snapshot();
+  setCounts();
   
   long double y  = 0;
 
@@ -282,30 +731,20 @@ double RooInclusiveJetPdf::evaluate() const
   if      ( number >= 0 )
     {
       // use specifed spectrum
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
-	{
-	  p[jj] = qcd[number](ii) + ci[number](l, k, ii);
-	  jj++;
-	}
-      double log_f = RooInclusiveJetPdf::logMultinomial(n, p);
+      double log_f = 0;
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				vector<int>(1, number), &log_f,
+				0, dataConstants_());
       y = exp(log_f);
     }
   else if ( number < 0 )
     {
       // loop over all spectra
-      for(size_t j=0; j < index.size(); j++)
-	{
-	  int c = index[j];
-	  int jj = 0;
-	  for(int ii=firstbin; ii <= lastbin; ii++)
-	    {
-	      p[jj] = qcd[c](ii) + ci[c](l, k, ii);
-	      jj++;
-	    }
-	  double log_f = RooInclusiveJetPdf::logMultinomial(n, p);
-	  y += exp(log_f);
-	}
+      logf_.resize(index.size());
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				index, &logf_[0], 0, dataConstants_());
+      for(size_t j=0; j < logf_.size(); j++)
+	y += exp(logf_[j]);
     }
   if ( y != y )
     {
@@ -319,43 +758,170 @@ double RooInclusiveJetPdf::evaluate() const
     return (double)y;
 }
 
-double RooInclusiveJetPdf::logProfileLikelihood(double l)
-{  
+double RooInclusiveJetPdf::logEvaluate() const
+{
+  return logLikelihood((double)lambda);
+}
+
+double RooInclusiveJetPdf::logLikelihood(double l) const
+{
+  if ( useinterpolation )
+    {
+      if ( interp ) return log(interp->Eval(l));
+      return loginterp->Eval(l);
+    }
   // -----------------------------
-  // set counts
+  // set counts from snapshot
   // -----------------------------
-  // firstbin, lastbin determine the range of bins to use in
-  // calculation of likelihood
+  setCounts();
   
-  int nbins = lastbin-firstbin+1;
-  vector<double> n(nbins);
-  vector<double> p(nbins);
+  double log_y = logMarginal_(l, logf_, nthreads_);
+  if ( log_y != log_y )
+    {
+      cout << "** RooInclusiveJetPdf ** NAN at lambda = " << l << endl;
+      exit(0);
+    }
+  return log_y;
+}
+
+double RooInclusiveJetPdf::likelihood(double l) const
+{
+  double log_y = logLikelihood(l);
+  if ( log_y == -numeric_limits<double>::infinity() ) return 0;
+  return exp(log_y);
+}
+
+double RooInclusiveJetPdf::logMarginal_(double l, vector<double>& logf,
+					int nthreads) const
+{
+  if      ( number >= 0 )
+    {
+      // use specifed spectrum
+      double log_f = 0;
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				vector<int>(1, number), &log_f, nthreads,
+				dataConstants_());
+      return log_f;
+    }
+  else
+    {
+      // loop over all spectra
+      logf.resize(index.size());
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				index, &logf[0], nthreads, dataConstants_());
+      return SpectrumEnsemble::logSumExp(&logf[0], logf.size());
+    }
+}
+
+pair<double, double> RooInclusiveJetPdf::findRange(double cut, double reltol)
+{
+  snapshot();
+  setCounts();
+  double xmin = lambda.min();
+  double xmax = lambda.max();
+
+  // log of likelihood averaged over all spectra
+  nevaluations_ = 0;
+  auto logL = [this](double x)
+    {
+      nevaluations_++;
+      logf_.resize(index.size());
+      ensemble().logLikelihoods(x, k_, n_, firstbin, lastbin,
+				index, &logf_[0], 0, dataConstants_());
+      return SpectrumEnsemble::logSumExp(&logf_[0], logf_.size());
+    };
+  
+  // bracket the mode and the cut by doubling the step
+  vector<double> x(1, xmin);
+  vector<double> f(1, logL(xmin));
+  int best = 0;
+  double h = (xmax-xmin)/32;
+  while ( x.back() < xmax )
+    {
+      x.push_back(x.back() + h < xmax ? x.back() + h : xmax);
+      f.push_back(logL(x.back()));
+      if ( f.back() > f[best] ) best = x.size()-1;
+      if ( f.back() < f[best] + log(cut) ) break;
+      h *= 2;
+    }
   
-  if ( useasimov )
+  // refine the mode if it is between two points
+  double fmax = f[best];
+  if ( best > 0 && best < (int)x.size()-1 )
     {
-      // use Asimov data
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
+      const double R = 0.5*(sqrt(5.0)-1);
+      double a = x[best-1];
+      double b = x[best+1];
+      double c = b - R*(b-a);
+      double d = a + R*(b-a);
+      double fc= logL(c);
+      double fd= logL(d);
+      for(int i=0; i < 4; i++)
 	{
-	  n[jj] = asimov[ii];
-	  jj++;
+	  if ( fc > fd )
+	    {
+	      b = d; d = c; fd = fc;
+	      c = b - R*(b-a);
+	      fc= logL(c);
+	    }
+	  else
+	    {
+	      a = c; c = d; fc = fd;
+	      d = a + R*(b-a);
+	      fd= logL(d);
+	    }
 	}
+      if ( fc > fmax ) fmax = fc;
+      if ( fd > fmax ) fmax = fd;
     }
-  else
+
+  // the likelihood did not fall below the cut
+  double target = fmax + log(cut);
+  if ( f.back() >= target ) return pair<double, double>(xmin, xmax);
+  
+  // find upper end by regula falsi (Illinois variant) between the
+  // last two points
+  int k  = x.size()-1;
+  double a = x[k-1], ga = f[k-1] - target;
+  double b = x[k],   gb = f[k] - target;
+  if ( ga < 0 ) return pair<double, double>(xmin, a);
+  int side = 0;
+  for(int i=0; i < 50 && (b-a) > reltol*b; i++)
     {
-      // use real data
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
+      // bisect if the likelihood underflows
+      double c  = gb > -numeric_limits<double>::infinity() ?
+	(a*gb - b*ga)/(gb - ga) : 0.5*(a+b);
+      double gc = logL(c) - target;
+      if ( gc > 0 )
 	{
-	  n[jj] = dynamic_cast<RooRealVar*>(&count[ii])->getVal();
-	  jj++;
+	  a = c; ga = gc;
+	  if ( side == 1 ) gb /= 2;
+	  side = 1;
+	}
+      else
+	{
+	  b = c; gb = gc;
+	  if ( side == -1 ) ga /= 2;
+	  side = -1;
 	}
     }
- 
-  // CI parameters
-  vector<double> k(6);
-  for(int c=0; c < 6; c++)
-    k[c] = dynamic_cast<RooRealVar*>(&kappa[c])->getVal(); 
+  return pair<double, double>(xmin, b);
+}
+
+void RooInclusiveJetPdf::setNumberOfThreads(int n, bool gridparallel)
+{
+  nthreads_ = n > 1 ? n : 1;
+  gridparallel_ = gridparallel;
+  if ( ensemble_ ) ensemble_->setNumberOfThreads(nthreads_);
+}
+
+double RooInclusiveJetPdf::logProfileLikelihood(double l)
+{  
+  // -----------------------------
+  // set counts and CI parameters
+  // -----------------------------
+  snapshot();
+  setCounts();
   
   // -----------------------------
   // compute likelihoods
@@ -365,27 +931,19 @@ double RooInclusiveJetPdf::logProfileLikelihood(double l)
   if      ( number >= 0 )
     {
       // use specifed spectrum
-      int jj = 0;
-      for(int ii=firstbin; ii <= lastbin; ii++)
-	{
-	  p[jj] = qcd[number](ii) + ci[number](l, k, ii);
-	  jj++;
-	}
-      max_log_f = RooInclusiveJetPdf::logMultinomial(n, p);
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				vector<int>(1, number), &max_log_f,
+				0, dataConstants_());
     }
   else if ( number < 0 )
     {
       // loop over all spectra
-      for(size_t j=0; j < index.size(); j++)
+      logf_.resize(index.size());
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				index, &logf_[0], 0, dataConstants_());
+      for(size_t j=0; j < logf_.size(); j++)
 	{
-	  int c = index[j];
-	  int jj = 0;
-	  for(int ii=firstbin; ii <= lastbin; ii++)
-	    {
-	      p[jj] = qcd[c](ii) + ci[c](l, k, ii);
-	      jj++;
-	    }
-	  double log_f = RooInclusiveJetPdf::logMultinomial(n, p);
+	  double log_f = logf_[j];
 	  if ( log_f > max_log_f ) max_log_f = log_f;
 	  
 	  if (log_f < smallest) underflows += 1;
@@ -403,35 +961,168 @@ double RooInclusiveJetPdf::logProfileLikelihood(double l)
   return max_log_f;
 }
 
-double RooInclusiveJetPdf::logMultinomial(vector<double>& N,
-					  vector<double>& P)
+int RooInclusiveJetPdf::logLikelihoods(double l, double* logf)
 {
-  double sum = 0;
-  double total  = 0;
-  for(size_t c=0; c < N.size(); c++)
+  snapshot();
+  setCounts();
+  if ( number >= 0 )
     {
-      sum += P[c];
-      total += N[c];
+      // use specified spectrum
+      ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin,
+				vector<int>(1, number), logf,
+				0, dataConstants_());
+      return 1;
     }
-  long double zplus  = 0.0;
-  long double zminus = 0.0;
-  for(size_t c=0; c < P.size(); c++)
+  ensemble().logLikelihoods(l, k_, n_, firstbin, lastbin, index, logf,
+			    0, dataConstants_());
+  return index.size();
+}
+
+vector<double>
+RooInclusiveJetPdf::toyPercentiles(int ntoys,
+				   const vector<double>& percentiles,
+				   double lumi, double l,
+				   PriorFunction* prior)
+{
+  // expected counts, computed without changing the Asimov data set
+  // of the model
+  vector<double> a = asimovGrid(vector<double>(1, lumi),
+				vector<double>(1, l));
+
+  // pseudo-experiments
+  int nbins = lastbin-firstbin+1;
+  vector<double> n(ntoys*nbins);
+  for(int t=0; t < ntoys; t++)
+    for(int jj=0; jj < nbins; jj++)
+      n[t*nbins+jj] = rand3.Poisson(a[firstbin+jj]);
+  snapshot();
+  setCounts();
+  return gridPercentiles_(n, ntoys, percentiles, -1, prior);
+}
+
+vector<double>
+RooInclusiveJetPdf::asimovGrid(const vector<double>& lumis,
+			       const vector<double>& lams,
+			       bool use_average)
+{
+  snapshot();
+  const SpectrumEnsemble& e = ensemble();
+  e.setKappa(k_);
+
+  int nqcd = 1; // use nominal qcd spectrum
+  if ( use_average ) nqcd = size();
+  
+  int nbins  = count.getSize();
+  int nlumis = lumis.size();
+  vector<double> a(lams.size()*nlumis*nbins);
+  vector<double> xsec(nbins);
+  double f[4];
+  for(size_t i=0; i < lams.size(); i++)
     {
-      long double nlnp  = 0;
-      if ( N[c] > 0 )
+      // cross sections averaged over spectra (as in setAsimov)
+      CIXsection::basisFunctions(lams[i], f);
+      for(int ii=0; ii < nbins; ii++)
 	{
-	  long double x = P[c]/sum;
-	  long double y = N[c]/total;
-	  nlnp = N[c] * log(x/y);
+	  xsec[ii] = 0;
+	  for(int j=0; j < nqcd; j++)
+	    {
+	      int c = index[j];
+	      xsec[ii] += e.qcd(c)[ii];
+	      if ( lams[i] > 0 )
+		xsec[ii] += CIXsection::basisSum(e.weights(c) + ii*4, f);
+	    }
+	  xsec[ii] /= nqcd;
 	}
-      if ( nlnp < 0 )
-	zminus += -nlnp;
-      else
-	zplus  +=  nlnp;
+      for(int j=0; j < nlumis; j++)
+	for(int ii=0; ii < nbins; ii++)
+	  a[(i*nlumis+j)*nbins+ii] = lumis[j] * xsec[ii];
+    }
+  return a;
+}
+
+vector<double>
+RooInclusiveJetPdf::asimovPercentiles(const vector<double>& lumis,
+				      const vector<double>& lams,
+				      const vector<double>& percentiles,
+				      int which,
+				      bool use_average,
+				      PriorFunction* prior)
+{
+  vector<double> a = asimovGrid(lumis, lams, use_average);
+
+  // counts in bin range
+  int ndata = lams.size()*lumis.size();
+  int nbins = lastbin-firstbin+1;
+  int nall  = count.getSize();
+  vector<double> n(ndata*nbins);
+  for(int t=0; t < ndata; t++)
+    for(int jj=0; jj < nbins; jj++)
+      n[t*nbins+jj] = a[t*nall+firstbin+jj];
+  snapshot();
+  setCounts();
+  return gridPercentiles_(n, ndata, percentiles, which, prior);
+}
+
+vector<double>
+RooInclusiveJetPdf::gridPercentiles_(const vector<double>& n, int ndata,
+				     const vector<double>& percentiles,
+				     int which,
+				     PriorFunction* prior)
+{
+  // compute the percentiles for ndata data sets n (ndata x nbins),
+  // using the predictions at the grid points. counts and kappa must
+  // have been set by snapshot and setCounts. the percentiles are computed
+  // by Bayes, as are those of the observed data.
+  int np = percentiles.size();
+  vector<double> q(ndata*np, -1);
+  
+  int nbins = lastbin-firstbin+1;
+  size_t nspectra = index.size();
+  size_t size = nspectra * nbins;
+  size_t first = 0;
+  if ( which >= 0 )
+    {
+      // use a single spectrum
+      first = find(index.begin(), index.end(), which) - index.begin();
+      if ( first == index.size() ) return q;
+      nspectra = 1;
+    }
+
+  // log likelihoods of all data sets at each grid point
+  int npts=NPTS;
+  vector<double> x(npts+1);
+  double xmin   = lambda.min();
+  double xmax   = lambda.max();
+  double xstep  = (xmax-xmin)/npts;
+  const double* logp = logPredictions();
+  vector<double> logy(ndata*(npts+1));
+  vector<double> logyc(ndata);
+  vector<double> nlnn(ndata);
+  SpectrumEnsemble::dataTerms(n, ndata, &nlnn[0]);
+  for(int c=0; c <= npts; c++)
+    {
+      x[c] = xmin + c * xstep;
+      ensemble().logMarginals(logp + c*size + first*nbins, nspectra,
+			      n, ndata, &logyc[0], 0, &nlnn[0]);
+      for(int t=0; t < ndata; t++) logy[t*(npts+1)+c] = logyc[t];
+    }
+  
+  for(int t=0; t < ndata; t++)
+    {
+      Bayes bayes(x, vector<double>(&logy[t*(npts+1)],
+				    &logy[(t+1)*(npts+1)]),
+		  0.95, prior);
+      vector<double> qt = bayes.percentiles(percentiles);
+      copy(qt.begin(), qt.end(), &q[t*np]);
     }
-  return zplus - zminus;
+  return q;
 }
 
+double RooInclusiveJetPdf::logMultinomial(vector<double>& N,
+					  vector<double>& P)
+{
+  return SpectrumEnsemble::logMultinomial(&N[0], &P[0], N.size());
+}
 int RooInclusiveJetPdf::getAnalyticalIntegral(RooArgSet& allVars,
 					      RooArgSet& analVars, 
 					      const char* /*rangeName*/)
@@ -0,0 +1,548 @@
+//---------------------------------------------------------------------------
+// File: SpectrumEnsemble.cc
+// Description: compute the likelihoods of an ensemble of spectra in one
+//              pass over contiguous arrays.
+// Created: 18-Oct-2026
+// Updated: 18-Oct-2026 add logMarginals for batches of data sets
+//          18-Oct-2026 add attach, write and map
+//          18-Oct-2026 cache sums over the bin range and the data terms
+//          18-Oct-2026 vectorizable log multinomial kernel
+//          18-Oct-2026 one log multinomial kernel for all likelihoods
+//          18-Oct-2026 reuse the worker threads between calls
+//---------------------------------------------------------------------------
+#include <cmath>
+#include <limits>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <functional>
+#include <iostream>
+#include <fstream>
+#include <cstring>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include "SpectrumEnsemble.h"
+#include "CIXsection.h"
+//---------------------------------------------------------------------------
+using namespace std;
+
+namespace {
+  const char MAGIC[8] = "CIENSMB";
+  const int  VERSION  = 1;
+
+  // threads that wait between jobs, so that they are not started
+  // anew at every lambda. run() calls task(t) for t=0..ntasks-1, each
+  // in exactly one thread (the caller takes tasks too), and returns
+  // when all have finished.
+  class WorkerPool
+  {
+  public:
+    WorkerPool(int nworkers)
+      : task_(0), ntasks_(0), next_(0), pending_(0), stop_(false)
+    {
+      for(int t=0; t < nworkers; t++)
+	workers_.push_back(thread(&WorkerPool::work_, this));
+    }
+    
+    ~WorkerPool()
+    {
+      {
+	lock_guard<mutex> lock(mutex_);
+	stop_ = true;
+      }
+      start_.notify_all();
+      for(size_t t=0; t < workers_.size(); t++) workers_[t].join();
+    }
+
+    int size() const { return workers_.size(); }
+    
+    void run(int ntasks, const function<void(int)>& task)
+    {
+      lock_guard<mutex> job(job_);
+      unique_lock<mutex> lock(mutex_);
+      task_    = &task;
+      ntasks_  = ntasks;
+      next_    = 0;
+      pending_ = ntasks;
+      start_.notify_all();
+      while ( next_ < ntasks_ )
+	{
+	  int t = next_++;
+	  lock.unlock();
+	  task(t);
+	  lock.lock();
+	  pending_--;
+	}
+      done_.wait(lock, [this]() { return pending_ == 0; });
+      task_ = 0;
+    }
+
+  private:
+    mutex job_;    // one job at a time
+    mutex mutex_;  // guards the state below
+    condition_variable start_;
+    condition_variable done_;
+    vector<thread> workers_;
+    const function<void(int)>* task_;
+    int  ntasks_;
+    int  next_;    // next task to be run
+    int  pending_; // tasks not yet finished
+    bool stop_;
+
+    void work_()
+    {
+      unique_lock<mutex> lock(mutex_);
+      while ( true )
+	{
+	  start_.wait(lock, [this]() { return stop_ || next_ < ntasks_; });
+	  if ( stop_ ) return;
+	  int t = next_++;
+	  lock.unlock();
+	  (*task_)(t);
+	  lock.lock();
+	  if ( --pending_ == 0 ) done_.notify_all();
+	}
+    }
+  };
+
+  mutex poolmutex;
+  
+  // run the tasks using the pool of the ensemble, which is (re)built
+  // if it has fewer than nthreads-1 workers
+  void runTasks(void*& pool, int nthreads, int ntasks,
+		const function<void(int)>& task)
+  {
+    WorkerPool* workers = 0;
+    {
+      lock_guard<mutex> lock(poolmutex);
+      workers = static_cast<WorkerPool*>(pool);
+      if ( workers == 0 || workers->size() < nthreads-1 )
+	{
+	  delete workers;
+	  workers = new WorkerPool(nthreads-1);
+	  pool = workers;
+	}
+    }
+    workers->run(ntasks, task);
+  }
+};
+
+SpectrumEnsemble::SpectrumEnsemble(int nbins)
+  : nbins_(nbins),
+    nthreads_(1),
+    qcd_(vector<double>()),
+    coef_(vector<double>()),
+    lo_(vector<bool>()),
+    qcdp_(0),
+    coefp_(0),
+    map_(0),
+    mapsize_(0),
+    pool_(0),
+    first_(-1),
+    last_(-1)
+{}
+
+SpectrumEnsemble::~SpectrumEnsemble()
+{
+  unmap();
+  delete static_cast<WorkerPool*>(pool_);
+}
+
+void SpectrumEnsemble::add(const vector<double>& qcd,
+			   const vector<double>& coef,
+			   bool lo)
+{
+  if ( nbins_ <= 0 ) nbins_ = qcd.size();
+  if ( qcdp_ != 0 && qcdp_ != qcd_.data() )
+    {
+      // copy attached or mapped arrays before adding to them
+      qcd_.assign(qcdp_, qcdp_ + size()*nbins_);
+      coef_.assign(coefp_, coefp_ + size()*nbins_*NCOEF);
+      unmap();
+    }
+  qcd_.insert(qcd_.end(), qcd.begin(), qcd.begin() + nbins_);
+  coef_.insert(coef_.end(), coef.begin(), coef.begin() + nbins_*NCOEF);
+  lo_.push_back(lo);
+  qcdp_  = &qcd_[0];
+  coefp_ = &coef_[0];
+  w_.clear(); // weights and sums must be recomputed
+  qsum_.clear();
+}
+
+void SpectrumEnsemble::attach(const double* qcd, const double* coef,
+			      const vector<int>& lo)
+{
+  unmap();
+  qcd_.clear();
+  coef_.clear();
+  lo_.assign(lo.begin(), lo.end());
+  qcdp_  = qcd;
+  coefp_ = coef;
+  w_.clear();
+  qsum_.clear();
+}
+
+bool SpectrumEnsemble::write(string filename) const
+{
+  ofstream out(filename.c_str(), ios::binary);
+  if ( ! out.good() )
+    {
+      cout << "** SpectrumEnsemble ** can't open " << filename << endl;
+      return false;
+    }
+  int header[4] = {VERSION, (int)size(), nbins_, NCOEF};
+  out.write(MAGIC, 8);
+  out.write((const char*)header, sizeof(header));
+  vector<int> lo(size() + size() % 2, 0);
+  for(size_t c=0; c < size(); c++) lo[c] = lo_[c];
+  out.write((const char*)&lo[0], lo.size()*sizeof(int));
+  out.write((const char*)qcdp_, size()*nbins_*sizeof(double));
+  out.write((const char*)coefp_, size()*nbins_*NCOEF*sizeof(double));
+  return out.good();
+}
+
+bool SpectrumEnsemble::map(string filename)
+{
+  unmap();
+  int fd = open(filename.c_str(), O_RDONLY);
+  if ( fd < 0 )
+    {
+      cout << "** SpectrumEnsemble ** can't open " << filename << endl;
+      return false;
+    }
+  struct stat info;
+  size_t hsize = 8 + 4*sizeof(int);
+  if ( fstat(fd, &info) < 0 || (size_t)info.st_size < hsize )
+    {
+      cout << "** SpectrumEnsemble ** can't read " << filename << endl;
+      close(fd);
+      return false;
+    }
+  void* m = mmap(0, info.st_size, PROT_READ, MAP_SHARED, fd, 0);
+  close(fd);
+  if ( m == MAP_FAILED )
+    {
+      cout << "** SpectrumEnsemble ** can't map " << filename << endl;
+      return false;
+    }
+
+  // decode header
+  const char* base = (const char*)m;
+  const int* header = (const int*)(base + 8);
+  int nspectra = header[1];
+  size_t nlo = nspectra + nspectra % 2;
+  size_t size = hsize + nlo*sizeof(int)
+    + (size_t)nspectra*header[2]*(1 + NCOEF)*sizeof(double);
+  if ( memcmp(base, MAGIC, 8) != 0 || header[0] != VERSION ||
+       header[3] != NCOEF || (nbins_ > 0 && header[2] != nbins_) ||
+       size != (size_t)info.st_size )
+    {
+      cout << "** SpectrumEnsemble ** " << filename
+	   << " is not a compatible ensemble file" << endl;
+      munmap(m, info.st_size);
+      return false;
+    }
+  nbins_ = header[2];
+  const int* lo = header + 4;
+  vector<int> flags(lo, lo + nspectra);
+  const double* qcd = (const double*)(lo + nlo);
+  attach(qcd, qcd + (size_t)nspectra*nbins_, flags);
+  map_ = m;
+  mapsize_ = info.st_size;
+  return true;
+}
+
+void SpectrumEnsemble::unmap()
+{
+  if ( map_ ) munmap(map_, mapsize_);
+  map_ = 0;
+  mapsize_ = 0;
+}
+
+void SpectrumEnsemble::setKappa(const vector<double>& kappa) const
+{
+  size_t nrows = size()*nbins_;
+  if ( w_.size() == nrows*4 && kappa_ == kappa ) return;
+  kappa_ = kappa;
+  wsum_.clear();
+  
+  w_.resize(nrows*4);
+  for(size_t r=0; r < nrows; r++)
+    CIXsection::basisWeights(kappa_, coefp_ + r*NCOEF, lo_[r/nbins_],
+			     &w_[r*4]);
+}
+
+void SpectrumEnsemble::setBinRange(int firstbin, int lastbin) const
+{
+  // the QCD sums depend only on the bin range
+  if ( qsum_.size() != size() || firstbin != first_ || lastbin != last_ )
+    {
+      first_ = firstbin;
+      last_  = lastbin;
+      qsum_.assign(size(), 0);
+      for(size_t c=0; c < size(); c++)
+	{
+	  const double* q = qcd(c);
+	  for(int ii=firstbin; ii <= lastbin; ii++) qsum_[c] += q[ii];
+	}
+      wsum_.clear();
+    }
+  if ( wsum_.size() == size()*4 ) return;
+
+  // the sums of the weights also depend on kappa
+  wsum_.assign(size()*4, 0);
+  for(size_t c=0; c < size(); c++)
+    {
+      const double* w = weights(c);
+      for(int ii=firstbin; ii <= lastbin; ii++)
+	for(int k=0; k < 4; k++) wsum_[c*4+k] += w[ii*4+k];
+    }
+}
+
+double SpectrumEnsemble::ci(double lambda, const vector<double>& kappa,
+			    int c, int ii) const
+{
+  setKappa(kappa);
+  double f[4];
+  CIXsection::basisFunctions(lambda, f);
+  return CIXsection::basisSum(weights(c) + ii*4, f);
+}
+
+void SpectrumEnsemble::logLikelihoods(double lambda,
+				      const vector<double>& kappa,
+				      const vector<double>& n,
+				      int firstbin, int lastbin,
+				      const vector<int>& index,
+				      double* logf,
+				      int nthreads,
+				      const double* nlnn) const
+{
+  // update weights, sums and data term before any threads
+  // are started
+  setKappa(kappa);
+  setBinRange(firstbin, lastbin);
+  double f[4];
+  CIXsection::basisFunctions(lambda, f);
+  double term = 0;
+  if ( nlnn == 0 )
+    dataTerms(n, 1, &term);
+  else
+    term = *nlnn;
+
+  if ( nthreads < 1 ) nthreads = nthreads_;
+  size_t nspectra = index.size();
+  if ( nthreads == 1 || nspectra < 2 )
+    {
+      logLikelihoods_(f, n, firstbin, lastbin, index, 0, nspectra,
+		      term, logf);
+      return;
+    }
+
+  // give each thread a contiguous block of spectra
+  size_t block = (nspectra + nthreads - 1) / nthreads;
+  int nblocks = (nspectra + block - 1) / block;
+  runTasks(pool_, nthreads, nblocks,
+	   [&](int t)
+	   {
+	     size_t first = t*block;
+	     size_t last  = min(first + block, nspectra);
+	     logLikelihoods_(f, n, firstbin, lastbin, index, first, last,
+			     term, logf);
+	   });
+}
+
+void SpectrumEnsemble::logPrediction_(const double* f, int c,
+				      int firstbin, int nbins,
+				      double* logp) const
+{
+  // log(p/sum p) of spectrum c. the sum of the predictions over the
+  // bin range is computed from the cached sums of the QCD cross
+  // sections and the basis weights
+  const double* q = qcd(c) + firstbin;
+  const double* w = weights(c) + firstbin*4;
+  double logsum = log(qsum_[c] + CIXsection::basisSum(&wsum_[c*4], f));
+  for(int jj=0; jj < nbins; jj++)
+    logp[jj] = log(q[jj] + CIXsection::basisSum(w + jj*4, f)) - logsum;
+}
+
+void SpectrumEnsemble::logLikelihoods_(const double* f,
+				       const vector<double>& n,
+				       int firstbin, int lastbin,
+				       const vector<int>& index,
+				       size_t first, size_t last,
+				       double nlnn,
+				       double* logf) const
+{
+  int nbins = lastbin-firstbin+1;
+  vector<double> logp(nbins);
+  for(size_t j=first; j < last; j++)
+    {
+      logPrediction_(f, index[j], firstbin, nbins, &logp[0]);
+      logf[j] = logMultinomial(&n[0], &logp[0], nlnn, nbins);
+    }
+}
+
+void SpectrumEnsemble::logPredictions(double lambda,
+				      const vector<double>& kappa,
+				      int firstbin, int lastbin,
+				      const vector<int>& index,
+				      double* logp,
+				      int nthreads) const
+{
+  setKappa(kappa);
+  setBinRange(firstbin, lastbin);
+  double f[4];
+  CIXsection::basisFunctions(lambda, f);
+  int nbins = lastbin-firstbin+1;
+  if ( nthreads < 1 ) nthreads = nthreads_;
+  size_t nspectra = index.size();
+  if ( nthreads == 1 || nspectra < 2 )
+    {
+      for(size_t j=0; j < nspectra; j++)
+	logPrediction_(f, index[j], firstbin, nbins, &logp[j*nbins]);
+      return;
+    }
+
+  // give each thread a contiguous block of spectra
+  size_t block = (nspectra + nthreads - 1) / nthreads;
+  int nblocks = (nspectra + block - 1) / block;
+  runTasks(pool_, nthreads, nblocks,
+	   [&](int t)
+	   {
+	     size_t last = min(t*block + block, nspectra);
+	     for(size_t j=t*block; j < last; j++)
+	       logPrediction_(f, index[j], firstbin, nbins,
+			      &logp[j*nbins]);
+	   });
+}
+
+void SpectrumEnsemble::logMarginals(double lambda,
+				    const vector<double>& kappa,
+				    const vector<double>& n, int ntoys,
+				    int firstbin, int lastbin,
+				    const vector<int>& index,
+				    double* logy,
+				    int nthreads) const
+{
+  int nbins = lastbin-firstbin+1;
+  vector<double> logp(index.size()*nbins);
+  logPredictions(lambda, kappa, firstbin, lastbin, index, &logp[0]);
+  logMarginals(&logp[0], index.size(), n, ntoys, logy, nthreads);
+}
+
+void SpectrumEnsemble::logMarginals(const double* logp, size_t nspectra,
+				    const vector<double>& n, int ntoys,
+				    double* logy,
+				    int nthreads,
+				    const double* nlnn) const
+{
+  int nbins = n.size() / ntoys;
+  vector<double> terms;
+  if ( nlnn == 0 )
+    {
+      terms.resize(ntoys);
+      dataTerms(n, ntoys, &terms[0]);
+      nlnn = &terms[0];
+    }
+  if ( nthreads < 1 ) nthreads = nthreads_;
+  if ( nthreads == 1 || ntoys < 2 )
+    {
+      logMarginals_(logp, nspectra, n, nbins, 0, ntoys, nlnn, logy);
+      return;
+    }
+
+  // give each thread a contiguous block of data sets
+  size_t block = (ntoys + nthreads - 1) / nthreads;
+  int nblocks = (ntoys + block - 1) / block;
+  runTasks(pool_, nthreads, nblocks,
+	   [&](int t)
+	   {
+	     size_t first = t*block;
+	     size_t last  = min(first + block, (size_t)ntoys);
+	     logMarginals_(logp, nspectra, n, nbins, first, last, nlnn, logy);
+	   });
+}
+
+void SpectrumEnsemble::dataTerms(const vector<double>& n, int ntoys,
+				 double* nlnn)
+{
+  int nbins = n.size() / ntoys;
+  for(int t=0; t < ntoys; t++)
+    {
+      const double* N = &n[t*nbins];
+      double total = 0;
+      for(int jj=0; jj < nbins; jj++) total += N[jj];
+      long double sum = 0;
+      for(int jj=0; jj < nbins; jj++)
+	if ( N[jj] > 0 ) sum += N[jj] * log(N[jj]/total);
+      nlnn[t] = sum;
+    }
+}
+
+void SpectrumEnsemble::logMarginals_(const double* logp, size_t nspectra,
+				     const vector<double>& n,
+				     int nbins, size_t first, size_t last,
+				     const double* nlnn,
+				     double* logy) const
+{
+  vector<double> logf(nspectra);
+  for(size_t t=first; t < last; t++)
+    {
+      const double* N = &n[t*nbins];
+      for(size_t j=0; j < nspectra; j++)
+	logf[j] = logMultinomial(N, &logp[j*nbins], nlnn[t], nbins);
+      logy[t] = logSumExp(&logf[0], nspectra);
+    }
+}
+
+double SpectrumEnsemble::logSumExp(const double* logf, int n)
+{
+  // the running sum is kept relative to the largest value
+  // encountered so far
+  double minf = -numeric_limits<double>::infinity();
+  double max_log_f = minf;
+  long double y = 0;
+  for(int j=0; j < n; j++)
+    {
+      double log_f = logf[j];
+      // a NaN is returned, so that callers can detect it
+      if ( log_f != log_f ) return log_f;
+      if ( log_f > max_log_f )
+	{
+	  y = y * exp((long double)(max_log_f - log_f)) + 1;
+	  max_log_f = log_f;
+	}
+      else if ( log_f > minf )
+	y += exp(log_f - max_log_f);
+    }
+  return max_log_f + log((double)y);
+}
+
+double SpectrumEnsemble::logMultinomial(const double* N,
+					const double* P,
+					int nbins)
+{
+  double sum = 0;
+  for(int c=0; c < nbins; c++) sum += P[c];
+  double logsum = log(sum);
+  vector<double> logp(nbins);
+  for(int c=0; c < nbins; c++)
+    logp[c] = N[c] > 0 ? log(P[c]) - logsum : 0;
+  double nlnn;
+  dataTerms(vector<double>(N, N+nbins), 1, &nlnn);
+  return logMultinomial(N, &logp[0], nlnn, nbins);
+}
+
+double SpectrumEnsemble::logMultinomial(const double* N,
+					const double* logp,
+					double nlnn,
+					int nbins)
+{
+  // the sum is accumulated in long double, as are the data terms
+  long double nlnp = 0;
+  for(int c=0; c < nbins; c++)
+    if ( N[c] > 0 ) nlnp += N[c] * logp[c];
+  return nlnp - nlnn;
+}
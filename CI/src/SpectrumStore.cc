@@ -0,0 +1,123 @@
+//---------------------------------------------------------------------------
+// File: SpectrumStore.cc
+// Description: read-only, memory-mapped store of binned spectra.
+// Created: 18-Oct-2026
+//---------------------------------------------------------------------------
+#include <iostream>
+#include <cstring>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include "SpectrumStore.h"
+//---------------------------------------------------------------------------
+using namespace std;
+
+namespace {
+  const char MAGIC[8] = "CISTORE";
+  const int  VERSION  = 1;
+  const int  HEADER   = 8 + 6*sizeof(int);
+};
+
+SpectrumStore::SpectrumStore(string filename)
+  : filename_(""),
+    map_(0),
+    mapsize_(0),
+    nrecords_(0),
+    nbins_(0),
+    ncols_(0),
+    keysize_(0),
+    edges_(0),
+    keys_(0),
+    data_(0),
+    index_(map<string, int>())
+{
+  if ( filename != "" ) open(filename);
+}
+
+SpectrumStore::~SpectrumStore() { close(); }
+
+bool SpectrumStore::open(string filename)
+{
+  close();
+  filename_ = filename;
+  int fd = ::open(filename.c_str(), O_RDONLY);
+  if ( fd < 0 )
+    {
+      cout << "** SpectrumStore ** can't open " << filename << endl;
+      return false;
+    }
+  struct stat info;
+  if ( fstat(fd, &info) < 0 || info.st_size < HEADER )
+    {
+      cout << "** SpectrumStore ** can't read " << filename << endl;
+      ::close(fd);
+      return false;
+    }
+  mapsize_ = info.st_size;
+  map_ = mmap(0, mapsize_, PROT_READ, MAP_SHARED, fd, 0);
+  ::close(fd);
+  if ( map_ == MAP_FAILED )
+    {
+      cout << "** SpectrumStore ** can't map " << filename << endl;
+      map_ = 0;
+      return false;
+    }
+
+  // decode header
+  const char* base = (const char*)map_;
+  const int* header = (const int*)(base + 8);
+  if ( memcmp(base, MAGIC, 8) != 0 || header[0] != VERSION )
+    {
+      cout << "** SpectrumStore ** " << filename
+	   << " is not a spectrum store" << endl;
+      close();
+      return false;
+    }
+  nrecords_ = header[1];
+  nbins_    = header[2];
+  ncols_    = header[3];
+  keysize_  = header[4];
+  size_t size = HEADER
+    + sizeof(double)*(nbins_+1)
+    + (size_t)nrecords_*keysize_
+    + sizeof(double)*(size_t)nrecords_*nbins_*ncols_;
+  if ( size != mapsize_ )
+    {
+      cout << "** SpectrumStore ** " << filename
+	   << " has wrong size" << endl;
+      close();
+      return false;
+    }
+  edges_ = (const double*)(base + HEADER);
+  keys_  = (const char*)(edges_ + nbins_ + 1);
+  data_  = (const double*)(keys_ + (size_t)nrecords_*keysize_);
+
+  for(int r=0; r < nrecords_; r++) index_[key(r)] = r;
+  return true;
+}
+
+void SpectrumStore::close()
+{
+  if ( map_ ) munmap(map_, mapsize_);
+  map_ = 0;
+  mapsize_ = 0;
+  nrecords_ = nbins_ = ncols_ = keysize_ = 0;
+  edges_ = 0;
+  keys_  = 0;
+  data_  = 0;
+  index_.clear();
+}
+
+int SpectrumStore::find(string key) const
+{
+  map<string, int>::const_iterator it = index_.find(key);
+  if ( it == index_.end() ) return -1;
+  return it->second;
+}
+
+string SpectrumStore::key(int r) const
+{
+  const char* k = keys_ + (size_t)r*keysize_;
+  return string(k, strnlen(k, keysize_));
+}
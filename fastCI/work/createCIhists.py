@@ -5,8 +5,12 @@
 # Updated 17-Sep-2016 HBP - rename from mkCIhists.py to createCIhists.py
 #                         - get CIPATH, which points to CI13TeV and which is
 #                           set in setup.sh
+# Updated 18-Oct-2026     - add --store option to pack the histograms of
+#                           a PDF set into one spectrum store per PDF set
+#                           (see CI/include/SpectrumStore.h)
 #-----------------------------------------------------------------------------
 import os, sys, re
+from glob import glob
 #from histutil import *
 from string import *
 from array import array
@@ -14,6 +18,8 @@ from ROOT import *
 #-----------------------------------------------------------------------------
 LHAPATH = os.environ['LHAPDF_DATA_PATH']
 CIPATH  = os.environ['CIPATH']
+sys.path.append('%s/work' % CIPATH)
+from spectrumstore import writeStore
 
 HISTNAMES = '''
 _0.500_0.500
@@ -26,6 +32,12 @@ _2.000_2.000
 '''
 HISTNAMES = split(strip(HISTNAMES))
 MURMUF = [0, 3, 1, 4, 7, 5, 8]
+
+# coefficient families in the order in which they are packed
+# (see CISpectrum::coefficients)
+FAMILIES = [('bi',  6), ('aig', 6), ('ai',  6),
+            ('bij', 9), ('aijg',9), ('aij', 9),
+            ('bi4', 4), ('ai4g',4), ('ai4', 4)]
 #-----------------------------------------------------------------------------
 def getBins(filename='bins.txt'):    
     filename = '%s/data/%s' % (CIPATH, filename)    
@@ -72,14 +84,107 @@ def makeHistograms(dirname, name, number, pt, xsection):
         hfile.Write()
         hfile.Close()
 #-----------------------------------------------------------------------------
+# Spectrum stores: one file per PDF set holding all members x scale
+# choices (records) x bins x columns (see work/spectrumstore.py).
+#-----------------------------------------------------------------------------
+def readHistograms(filename):
+    hfile = TFile(filename)
+    if not hfile.IsOpen():
+        sys.exit("** can't open %s" % filename)
+    hists = {}
+    for key in hfile.GetListOfKeys():
+        h = hfile.Get(key.GetName())
+        if not h.InheritsFrom('TH1'): continue
+        nbins = h.GetNbinsX()
+        edges = [h.GetBinLowEdge(ii+1) for ii in xrange(nbins)]
+        edges.append(h.GetBinLowEdge(nbins)+h.GetBinWidth(nbins))
+        hists[key.GetName()] = (edges,
+                                [h.GetBinContent(ii+1)
+                                 for ii in xrange(nbins)])
+    hfile.Close()
+    return hists
+
+def makeStores(pdfsetdir, subdir=''):
+    # the QCD spectra are in the corresponding fastNLO directory
+    cidir  = os.path.abspath(pdfsetdir)
+    qcddir = replace(cidir, 'fastCI', 'fastNLO')
+    if subdir != '':
+        postfix = '_%s' % subdir
+        subdir  = '/%s' % subdir
+    else:
+        postfix = ''
+    members = map(os.path.basename, glob('%s/[0-9][0-9][0-9]' % cidir))
+    members.sort()
+
+    def checkEdges(e, filename, histname):
+        # all records of both stores share the bin edges of the first
+        # QCD histogram
+        if len(e) != len(edges) or \
+               max([abs(a-b) for a, b in zip(e, edges)]) > 1.e-6*edges[-1]:
+            sys.exit("** histogram %s in %s has bin edges that differ "\
+                     "from those of the first QCD histogram" % \
+                     (histname, filename))
+
+    keys       = []
+    cirecords  = []
+    qcdrecords = []
+    edges = None
+    for member in members:
+        print "\t%s/%s%s" % (cidir, member, subdir)
+        # one record per histogram (scale choice)
+        qcdfile = '%s/%s%s/qcd.root' % (qcddir, member, subdir)
+        qcd = readHistograms(qcdfile)
+        coef= {}
+        for name, number in FAMILIES:
+            for c in xrange(number):
+                filename = '%s/%s%s/%s%d.root' % (cidir, member, subdir,
+                                                  name, c)
+                coef[(name, c)] = (filename, readHistograms(filename))
+        histnames = qcd.keys()
+        histnames.sort()
+        for histname in histnames:
+            e, y = qcd[histname]
+            if edges == None: edges = e
+            checkEdges(e, qcdfile, histname)
+            keys.append('%s/%s' % (member, histname))
+            qcdrecords.append(array('d', y))
+
+            columns = []
+            for name, number in FAMILIES:
+                for c in xrange(number):
+                    filename, hists = coef[(name, c)]
+                    if not hists.has_key(histname):
+                        sys.exit("** histogram %s not found in %s" % \
+                                 (histname, filename))
+                    e, z = hists[histname]
+                    checkEdges(e, filename, histname)
+                    columns.append(z)
+            data = array('d')
+            for ii in xrange(len(y)):
+                data.extend([z[ii] for z in columns])
+            cirecords.append(data)
+
+    if edges == None:
+        sys.exit("** no members found in %s" % cidir)
+    writeStore('%s/ci%s.store'  % (cidir,  postfix), edges, keys,
+               len(columns), lambda r: cirecords[r])
+    writeStore('%s/qcd%s.store' % (qcddir, postfix), edges, keys,
+               1, lambda r: qcdrecords[r])
+#-----------------------------------------------------------------------------
 def main():
     argv = sys.argv[1:]
     argc = len(argv)
     if argc < 1:
         print '''
     ./createCIhists.py PDFset [PDFindex=all]
+    ./createCIhists.py --store PDFset [smearing directory, e.g., JECPDF]
         '''
         sys.exit(0)
+
+    store = argv[0] == '--store'
+    if store:
+        argv = argv[1:]
+        argc = len(argv)
         
     PDFset = argv[0]
     if   PDFset[:2] == 'CT':
@@ -92,6 +197,13 @@ def main():
         print "wrong PDFset %s" % PDFset
         sys.exit(0)
 
+    if store:
+        if argc > 1:
+            makeStores(pdfsetdir, argv[1])
+        else:
+            makeStores(pdfsetdir)
+        sys.exit(0)
+
     if argc > 1:
         PDFindexMin = atoi(argv[1])
         PDFindexMax = PDFindexMin
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# File: benchmarkSmearing.py
+# Description: time the jet energy correction uncertainty lookup, which is
+#              called in the innermost integrand of JetSpectrumSmeared, and
+#              the smearing of a synthetic spectrum. The lookup is timed in
+#              compiled code, using the array (nearest bin and bilinear) and,
+#              for comparison, the histogram attached to the file, as was
+#              done before 18-Oct-2026 (see JECUncertainty::setHistogram).
+#              The results are written to a JSON report, which can be
+#              compared between commits.
+# created 18-Oct-2026
+#-----------------------------------------------------------------------------
+import os, sys, optparse, json, subprocess
+from math import *
+from string import *
+from array import array
+from time import time, ctime
+from random import seed, gauss
+from ROOT import gSystem, gInterpreter, TFile, TH1D
+#-----------------------------------------------------------------------------
+CIPATH  = os.environ.get('CIPATH', '..')
+JECUNFILENAME = '../data/Summer16_23Sep2016BCDV4_DATA_Uncertainty_AK8PFchs.root'
+JERUNCERTAINTY= 0.1
+SPECTRUMFILE  = 'benchmark_spectrum.root'
+NHERMITE      = 16
+PTMIN   = 500.0
+PTMAX   = 4000.0
+#-----------------------------------------------------------------------------
+# lookup loops in compiled code, so that the timing is not dominated
+# by the cost of calling from Python
+LOOPS = '''
+double benchmarkJEC(JECUncertainty* jec, double ptmin, double ptmax, int n)
+{
+  double sum = 0;
+  double step = (ptmax-ptmin)/n;
+  for(int c=0; c < n; c++) sum += (*jec)(ptmin + c*step, 0);
+  return sum;
+}
+'''
+#-----------------------------------------------------------------------------
+def decodeCommandLine():
+    VERSION = '18-Oct-2026'
+    USAGE = '''
+    python benchmarkSmearing.py [options]
+
+    options
+       -l<lookups>   number of lookups                   [10000000]
+       -n<smearings> number of smeared spectra           [10]
+       -o<report>    JSON report                         [benchmarkSmearing.json]
+    '''
+    parser = optparse.OptionParser(usage=USAGE,
+                                   version=VERSION)
+    parser.add_option('-l', '--lookups',
+                      action='store',
+                      dest='nlookups',
+                      type='int',
+                      default=10000000,
+                      help='number of lookups')
+
+    parser.add_option('-n', '--smearings',
+                      action='store',
+                      dest='nsmears',
+                      type='int',
+                      default=10,
+                      help='number of smeared spectra')
+
+    parser.add_option('-o', '--output',
+                      action='store',
+                      dest='report',
+                      type='string',
+                      default='benchmarkSmearing.json',
+                      help='JSON report')
+    options, args = parser.parse_args()
+    return options
+#-----------------------------------------------------------------------------
+def qcdXsection(pt):
+    # a steeply falling spectrum (pb/bin)
+    x = 2*pt/13000
+    return 1.0e3 * (pt/56)**-5 * (1-x)**8
+
+def writeSpectrum(filename):
+    # synthetic true spectrum from 100 to 4200 GeV in 20 GeV bins
+    edges = array('d', [100.0 + 20*ii for ii in xrange(206)])
+    hfile = TFile(filename, 'recreate')
+    h = TH1D('nlo', '', len(edges)-1, edges)
+    for ii in xrange(len(edges)-1):
+        h.SetBinContent(ii+1, qcdXsection(0.5*(edges[ii]+edges[ii+1])))
+    hfile.Write()
+    hfile.Close()
+
+def gitCommit():
+    try:
+        return strip(subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                      stdout=subprocess.PIPE).communicate()[0])
+    except:
+        return ''
+#-----------------------------------------------------------------------------
+def setMode(jec, htable, mode):
+    # histogram: the table attached to the file, looked up as before
+    jec.setBilinear(mode == 'bilinear')
+    if mode == 'histogram':
+        jec.setHistogram(htable)
+    else:
+        jec.setHistogram(0)
+
+def timeLookups(jec, htable, nlookups):
+    from ROOT import benchmarkJEC
+    results = {}
+    ptmin, ptmax = jec.ptMin(), jec.ptMax()
+
+    for mode in ['histogram', 'array', 'bilinear']:
+        setMode(jec, htable, mode)
+        swatch = time()
+        benchmarkJEC(jec, ptmin, ptmax, nlookups)
+        results['%s_ns' % mode] = 1.e9*(time() - swatch)/nlookups
+    setMode(jec, htable, 'array')
+    return results
+
+def timeSmearing(jec, htable, nsmears):
+    from ROOT import JetSpectrum, JetSpectrumSmeared, JetResponseMatrix
+    results = {}
+    spectrum = JetSpectrum(SPECTRUMFILE, 'nlo')
+    seed(12345)
+    variates = [(gauss(0, 1), gauss(0, 1)) for ii in xrange(nsmears)]
+
+    for mode in ['histogram', 'array', 'bilinear']:
+        setMode(jec, htable, mode)
+        swatch = time()
+        for x, y in variates:
+            sspectrum = JetSpectrumSmeared(spectrum, jec, JERUNCERTAINTY,
+                                           x, y, PTMIN, PTMAX)
+        results['smear_%s_s' % mode] = (time() - swatch)/nsmears
+    setMode(jec, htable, 'array')
+
+    swatch = time()
+    for x, y in variates:
+        matrix = JetResponseMatrix(jec, JERUNCERTAINTY, x, y, PTMIN, PTMAX)
+        sspectrum = JetSpectrumSmeared(spectrum, matrix)
+    results['smear_matrix_s'] = (time() - swatch)/nsmears
+
+    swatch = time()
+    for x, y in variates:
+        sspectrum = JetSpectrumSmeared(spectrum, jec, JERUNCERTAINTY,
+                                       x, y, PTMIN, PTMAX, 100, NHERMITE)
+    results['smear_hermite_s'] = (time() - swatch)/nsmears
+    return results
+#-----------------------------------------------------------------------------
+def main():
+    options = decodeCommandLine()
+    gSystem.Load('%s/CI/lib/libCI' % CIPATH)
+    gInterpreter.Declare(LOOPS)
+    from ROOT import JECUncertainty
+
+    print "\n\t\t\t=== benchmarkSmearing.py ==="
+    jec = JECUncertainty(JECUNFILENAME)
+    jecfile = TFile(JECUNFILENAME)
+    htable = jecfile.Get('htable')
+    writeSpectrum(SPECTRUMFILE)
+
+    results = {'lookups':   options.nlookups,
+               'smearings': options.nsmears}
+    results.update(timeLookups(jec, htable, options.nlookups))
+    results.update(timeSmearing(jec, htable, options.nsmears))
+    jec.setHistogram(0)
+    jecfile.Close()
+    os.remove(SPECTRUMFILE)
+
+    print "lookup (ns/call)"
+    print "  %-10s %10.2f" % ('histogram', results['histogram_ns'])
+    print "  %-10s %10.2f" % ('array',     results['array_ns'])
+    print "  %-10s %10.2f" % ('bilinear',  results['bilinear_ns'])
+    print "smearing (s/spectrum)"
+    print "  %-10s %10.4f" % ('histogram', results['smear_histogram_s'])
+    print "  %-10s %10.4f" % ('array',     results['smear_array_s'])
+    print "  %-10s %10.4f" % ('bilinear',  results['smear_bilinear_s'])
+    print "  %-10s %10.4f" % ('matrix',    results['smear_matrix_s'])
+    print "  %-10s %10.4f" % ('hermite',   results['smear_hermite_s'])
+
+    report = {'commit':  gitCommit(),
+              'created': ctime(),
+              'host':    os.uname()[1],
+              'results': results}
+    out = open(options.report, 'w')
+    out.write(json.dumps(report, indent=2, sort_keys=True))
+    out.write('\n')
+    out.close()
+    print "report: %s" % options.report
+#-----------------------------------------------------------------------------
+try:
+    main()
+except KeyboardInterrupt:
+    print 'ciao!'
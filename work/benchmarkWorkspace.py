@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+#-----------------------------------------------------------------------------
+# File: benchmarkWorkspace.py
+# Description: time the creation, loading and use of synthetic workspaces
+#              with different numbers of spectra and record the peak
+#              resident memory (RSS). Each workspace is created in one
+#              process and used in another, so that the memory of one
+#              measurement does not affect the next. The results are
+#              written to a JSON report, which can be compared between
+#              commits.
+#
+#              The synthetic spectra use the binning in data/bins.txt, a
+#              steeply falling QCD spectrum and random CI coefficients.
+# created 18-Oct-2026
+#-----------------------------------------------------------------------------
+import os, sys, re, optparse, json, resource, subprocess
+from math import *
+from string import *
+from array import array
+from time import time, ctime
+from random import seed, uniform
+from spectrumstore import writeStore
+from ROOT import gSystem, TFile, kFALSE, \
+     RooWorkspace, RooMsgService, RooFit, RooDataSet, RooCmdArg, vector
+#-----------------------------------------------------------------------------
+CIPATH  = os.environ.get('CIPATH', '..')
+LUMI    = 35100.0  # 1/pb
+SIZES   = '10,100,1000,5000'
+MODES   = ['spectra', 'block', 'mmap'] # see createWorkspace.py
+NCOEF   = 57       # packed CI coefficients per bin
+NHIST   = 7        # scale choices per PDF member
+PERCENTILE = [0.16, 0.50, 0.84, 0.95]
+KAPPA   = [-1, 0, 0, 0, 0, 0] # LL model
+#-----------------------------------------------------------------------------
+def decodeCommandLine():
+    VERSION = '18-Oct-2026'
+    USAGE = '''
+    python benchmarkWorkspace.py [options]
+
+    options
+       -s<sizes>     comma-separated numbers of spectra  [%s]
+       -m<mode>      spectra, block, or mmap             [spectra]
+       -t<threads>   number of threads                   [1]
+       -o<report>    JSON report                         [benchmark.json]
+       -k            keep synthetic workspaces
+    ''' % SIZES
+    parser = optparse.OptionParser(usage=USAGE,
+                                   version=VERSION)
+    parser.add_option('-s', '--sizes',
+                      action='store',
+                      dest='sizes',
+                      type='string',
+                      default=SIZES,
+                      help='numbers of spectra')
+
+    parser.add_option('-m', '--mode',
+                      action='store',
+                      dest='mode',
+                      type='string',
+                      default='spectra',
+                      help='how spectra are stored in the workspace')
+
+    parser.add_option('-t', '--threads',
+                      action='store',
+                      dest='nthreads',
+                      type='int',
+                      default=1,
+                      help='number of threads')
+
+    parser.add_option('-o', '--output',
+                      action='store',
+                      dest='report',
+                      type='string',
+                      default='benchmark.json',
+                      help='JSON report')
+
+    parser.add_option('-k', '--keep',
+                      action='store_true',
+                      dest='keep',
+                      default=False,
+                      help='keep synthetic workspaces')
+
+    # used internally to run one phase in a separate process
+    parser.add_option('--phase',
+                      action='store',
+                      dest='phase',
+                      type='string',
+                      default='',
+                      help=optparse.SUPPRESS_HELP)
+
+    parser.add_option('-n', '--nspectra',
+                      action='store',
+                      dest='nspectra',
+                      type='int',
+                      default=0,
+                      help=optparse.SUPPRESS_HELP)
+
+    options, args = parser.parse_args()
+    if not (options.mode in MODES):
+        sys.exit("** unknown mode %s" % options.mode)
+    return options
+#-----------------------------------------------------------------------------
+def peakRSS():
+    # peak resident memory in MB (ru_maxrss is in kB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def getBins(filename='bins.txt'):
+    filename = '%s/data/%s' % (CIPATH, filename)
+    records  = map(lambda x: map(atof, x),
+                   map(split, open(filename).readlines()))
+    pt = [ptlow for ptlow, pthigh in records]
+    pt.append(records[-1][1])
+    return pt
+
+def qcdXsection(pt):
+    # a steeply falling spectrum (pb/bin)
+    x = 2*pt/13000
+    return 1.0e3 * (pt/56)**-5 * (1-x)**8
+#-----------------------------------------------------------------------------
+# write synthetic spectrum stores (see spectrumstore.py)
+#-----------------------------------------------------------------------------
+def writeStores(prefix, nspectra, edges):
+    # one record per spectrum: <member>/<histname>
+    keys = ['%3.3d/nlo_%d' % (r / NHIST, r % NHIST)
+            for r in xrange(nspectra)]
+    nbins = len(edges)-1
+    y = [qcdXsection(0.5*(edges[ii]+edges[ii+1])) for ii in xrange(nbins)]
+    seed(nspectra)
+
+    def qcd(r):
+        return array('d', [x * uniform(0.9, 1.1) for x in y])
+
+    def ci(r):
+        # coefficients small enough that the predicted cross section
+        # is positive over the lambda range
+        data = array('d')
+        for x in y:
+            data.extend([x * uniform(0, 1.0e-3) for c in xrange(NCOEF)])
+        return data
+
+    writeStore('%s_qcd.store' % prefix, edges, keys, 1, qcd)
+    writeStore('%s_ci.store'  % prefix, edges, keys, NCOEF, ci)
+    return keys
+#-----------------------------------------------------------------------------
+def create(wfilename, nspectra, mode):
+    from ROOT import QCDSpectrum, CISpectrum, RooInclusiveJetPdf, \
+         SpectrumStore
+
+    results = {}
+    swatch  = time()
+
+    prefix = replace(wfilename, '.root', '')
+    edges  = getBins()
+    keys   = writeStores(prefix, nspectra, edges)
+    results['stores_s'] = time() - swatch
+
+    RooMsgService.instance().setGlobalKillBelow(RooFit.WARNING)
+    ws = RooWorkspace("CI")
+    ws.factory('lambda[0, 0, 0.02]')
+    record = []
+    for ii in xrange(6):
+        name = 'kappa%d' % ii
+        ws.factory('%s[%d,-1,1]' % (name, KAPPA[ii]))
+        record.append(name)
+    ws.defineSet('kappaset', joinfields(record, ','))
+
+    # counts from the nominal spectrum
+    nbins = len(edges)-1
+    record = []
+    for ii in xrange(nbins):
+        c = int(LUMI * qcdXsection(0.5*(edges[ii]+edges[ii+1])))
+        name = 'N%2.2d' % ii
+        ws.factory('%s[%d, 0, %d]' % (name, c, 2*c+10))
+        record.append(name)
+    ws.defineSet('Nset', joinfields(record, ','))
+    data = RooDataSet('data', 'counts per bin', ws.set('Nset'))
+    data.add(ws.set('Nset'))
+    getattr(ws, 'import')(data, RooCmdArg())
+
+    model = RooInclusiveJetPdf('model', 'model',
+                               ws.set('Nset'),
+                               ws.var('lambda'),
+                               ws.set('kappaset'))
+    qcdstore = SpectrumStore('%s_qcd.store' % prefix)
+    cistore  = SpectrumStore('%s_ci.store'  % prefix)
+    spectra  = []
+    for index, key in enumerate(keys):
+        name = "%5.5d" % index
+        qcd = QCDSpectrum('QCD'+name, 'QCD'+name, qcdstore, key)
+        ci  = CISpectrum('CI'+name, 'CI'+name, cistore, key)
+        spectra.append((qcd, ci))
+        model.add(qcd, ci)
+
+    if mode == 'mmap':
+        model.compact('%s.ensemble' % prefix)
+    elif mode == 'block':
+        model.compact()
+    getattr(ws, 'import')(model, RooCmdArg())
+    ws.writeToFile(wfilename, kFALSE)
+
+    results['create_s'] = time() - swatch
+    results['create_rss_mb'] = peakRSS()
+    results['workspace_mb'] = os.path.getsize(wfilename) / 1048576.0
+    return results
+#-----------------------------------------------------------------------------
+def use(wfilename, nthreads):
+    from ROOT import PDFWrapper, Bayes
+
+    results = {}
+    results['start_rss_mb'] = peakRSS()
+
+    # load workspace
+    swatch = time()
+    wfile  = TFile(wfilename)
+    ws     = wfile.Get('CI')
+    model  = ws.pdf('model')
+    model.setNumberOfThreads(nthreads)
+    results['load_s'] = time() - swatch
+    results['load_rss_mb'] = peakRSS()
+
+    # tabulate likelihood
+    swatch = time()
+    model.initialize(-1)
+    results['initialize_s'] = time() - swatch
+    results['initialize_rss_mb'] = peakRSS()
+
+    # compute limits
+    poi = ws.var('lambda')
+    wrapped_model = PDFWrapper(model, ws.set('Nset'), poi)
+    percentiles = vector('double')()
+    for p in PERCENTILE: percentiles.push_back(p)
+    swatch = time()
+    bayes  = Bayes(wrapped_model, poi.getMin(), poi.getMax())
+    results['percentiles'] = list(bayes.percentiles(percentiles))
+    results['percentile_s'] = time() - swatch
+
+    # one pseudo-experiment (see ExpectedLimits in computeLimits.py)
+    swatch = time()
+    model.toyPercentiles(1, percentiles, LUMI, 1.0/10**2)
+    results['toy_s'] = time() - swatch
+    results['rss_mb'] = peakRSS()
+    return results
+#-----------------------------------------------------------------------------
+def runPhase(options):
+    # run in a separate process; the results are written to stdout
+    gSystem.Load('%s/CI/lib/libCI' % CIPATH)
+    wfilename = 'benchmark_%d_%s_workspace.root' % (options.nspectra,
+                                                    options.mode)
+    if options.phase == 'create':
+        results = create(wfilename, options.nspectra, options.mode)
+    else:
+        results = use(wfilename, options.nthreads)
+    print 'RESULTS %s' % json.dumps(results)
+
+def spawn(phase, nspectra, options):
+    cmd = [sys.executable, sys.argv[0], '--phase', phase,
+           '-n', '%d' % nspectra,
+           '-m', options.mode,
+           '-t', '%d' % options.nthreads]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    output, error = proc.communicate()
+    for line in split(output, '\n'):
+        if line[:8] == 'RESULTS ':
+            return json.loads(line[8:])
+    sys.exit("** %s failed for %d spectra" % (phase, nspectra))
+
+def gitCommit():
+    try:
+        return strip(subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                      stdout=subprocess.PIPE).communicate()[0])
+    except:
+        return ''
+#-----------------------------------------------------------------------------
+def main():
+    options = decodeCommandLine()
+    if options.phase != '':
+        runPhase(options)
+        return
+
+    sizes = map(atoi, split(options.sizes, ','))
+    print "\n\t\t\t=== benchmarkWorkspace.py ==="
+    print "mode:    %s" % options.mode
+    print "threads: %d" % options.nthreads
+    print "%8s %10s %10s %10s %10s %10s %10s" % \
+      ('spectra', 'create(s)', 'load(s)', 'init(s)', 'bayes(s)',
+       'toy(s)', 'RSS(MB)')
+
+    report = {'commit':  gitCommit(),
+              'created': ctime(),
+              'host':    os.uname()[1],
+              'mode':    options.mode,
+              'threads': options.nthreads,
+              'results': []}
+    for nspectra in sizes:
+        results = {'nspectra': nspectra}
+        results.update(spawn('create', nspectra, options))
+        results.update(spawn('use',    nspectra, options))
+        report['results'].append(results)
+        print "%8d %10.2f %10.2f %10.2f %10.2f %10.2f %10.1f" % \
+          (nspectra, results['create_s'], results['load_s'],
+           results['initialize_s'], results['percentile_s'],
+           results['toy_s'], results['rss_mb'])
+
+        if not options.keep:
+            prefix = 'benchmark_%d_%s_workspace' % (nspectra, options.mode)
+            for postfix in ['.root', '_qcd.store', '_ci.store', '.ensemble']:
+                if os.path.exists(prefix + postfix):
+                    os.remove(prefix + postfix)
+
+    out = open(options.report, 'w')
+    out.write(json.dumps(report, indent=2, sort_keys=True))
+    out.write('\n')
+    out.close()
+    print "report: %s" % options.report
+#-----------------------------------------------------------------------------
+try:
+    main()
+except KeyboardInterrupt:
+    print 'ciao!'
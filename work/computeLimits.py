@@ -11,8 +11,22 @@
 #              18-May-2018 HBP permit model-dependent lambda range
 #              22-May-2018 HBP attempt to find range automatically
 #              26-May-2018 HBP add a log-file
+#              18-Oct-2026 get the likelihoods of all spectra in one call
+#              18-Oct-2026 add option to compute posterior in log space
+#              18-Oct-2026 add options to compute likelihoods in threads
+#              18-Oct-2026 add option to run (model, sign) pairs in
+#                          separate processes and write a summary table
+#              18-Oct-2026 compute pseudo-experiments in one call to
+#                          toyPercentiles
+#              18-Oct-2026 find range of lambda with findRange
+#              18-Oct-2026 compute all percentiles in one call
+#              18-Oct-2026 add option to compute expected limits for a
+#                          grid of luminosities and write the table read
+#                          by plotLimitvsLumi.py
 #-----------------------------------------------------------------
-import os,sys,re, optparse
+import os,sys,re, optparse, ctypes
+from multiprocessing import Pool
+import numpy
 from array import array
 from time import sleep, ctime
 from histutil import *
@@ -26,16 +40,12 @@ LUMI     = 35100.0 # 1/fb
 BINMIN   =  6      # first bin to use (ROOT bin number convention)
 BINMAX   = 28      # last bin to use
 LMIN     =  0.0    # lower limit of lambda = 1/Lambda^2
-LMAX     = {'LL': {1: 0.0015, -1: 0.0040},
-            'RR': {1: 0.0015, -1: 0.0040},
-            'VV': {1: 0.0015, -1: 0.0040},
-            'AA': {1: 0.0015, -1: 0.0040},
-            'V-A':{1: 0.0060, -1: 0.0060}} # upper limit on lambda
 
 YMAX     = 0.060   # maximum Y limit of posterior density plot
 WSPACE   = 'CI'    # name of workspace
 
 RELTOL   = 1.e-4   # minimum ratio of min(like)/max(like)
+SMALLEST = numpy.log(numpy.finfo(float).tiny * numpy.finfo(float).eps) # log(denorm_min)
 # Models
 #                        kappa
 #                   0   1   2   3   4   5
@@ -62,11 +72,19 @@ def decodeCommandLine():
     options
        -f              first bin to use (default 1) 
        -O              compute observed limit [default compute expected limit]
+       -s              compute posterior in log space (no range optimization)
+       -t<nthreads>    number of threads used to compute likelihoods [1]
+       -g              divide lambda grid, rather than spectra, between threads
+       -j<njobs>       number of (model, sign) pairs to run in parallel [1]
 
     options for expected limit
        -L<Lambda>      Lambda value for expected limit [default no CI]
        -l<lumi>        integrated luminosity           [default 35.1/fb]
        -n<ntrials>     number of trials for computing scatter of percentiles
+       -G<lumis>       comma-separated luminosities (1/fb) for which to
+                       compute the expected limits in one pass
+       -S<Lambdas>     comma-separated Lambda values (TeV) of the signal
+                       for -G                          [default no CI]
 
     '''
     parser = optparse.OptionParser(usage=USAGE,
@@ -105,62 +123,90 @@ def decodeCommandLine():
                       dest='firstbin',
                       default=1,
                       help='first bin to use')       
-            
+
+    parser.add_option('-s', '--logspace',
+                      action="store_true",
+                      dest='logspace',
+                      default=False,
+                      help='compute posterior in log space')
+
+    parser.add_option('-t', '--threads',
+                      action="store",
+                      type='int',
+                      dest='nthreads',
+                      default=1,
+                      help='number of threads')
+
+    parser.add_option('-g', '--gridparallel',
+                      action="store_true",
+                      dest='gridparallel',
+                      default=False,
+                      help='divide lambda grid between threads')
+
+    parser.add_option('-j', '--jobs',
+                      action="store",
+                      type='int',
+                      dest='njobs',
+                      default=1,
+                      help='number of processes')
+    
+    parser.add_option('-G', '--lumigrid',
+                      action="store",
+                      type='string',
+                      dest='lumigrid',
+                      default='',
+                      help='luminosities for expected limit curve')
+
+    parser.add_option('-S', '--Lambdas',
+                      action="store",
+                      type='string',
+                      dest='Lambdas',
+                      default='',
+                      help='signal Lambda values for expected limit curve')
+    
     options, args = parser.parse_args()
     if len(args) == 0: sys.exit(USAGE)
     filename = args[0]
     models   = args[1:]
     if models == []: models = MODEL
     
+    lumigrid = [1e3*atof(x) for x in split(options.lumigrid, ',') if x != '']
+    Lambdas  = [atof(x) for x in split(options.Lambdas, ',') if x != '']
+    if Lambdas == []: Lambdas = [-1.0]
+    
     return (filename, not options.observed,
                 options.Lambda, 1e3*options.lumi, models,
-                options.ntrials, options.firstbin)
+                options.ntrials, options.firstbin, options.logspace,
+                options.nthreads, options.gridparallel, options.njobs,
+                lumigrid, Lambdas)
 #-----------------------------------------------------------------
 #-----------------------------------------------------------------
-def optimizeRange(model, poi, nstep=20):
+def optimizeRange(model, poi, cut=1.e-3):
+    # find the range of lambda outside of which the likelihood is
+    # less than cut x its maximum
     print "optimize range of lambda"
-    poi_lower = poi.getMin()
-    poi_upper = poi.getMax()
-    bayes     = Bayes(model, poi_lower, poi_upper)
-
     swatch = TStopwatch()
     swatch.Start()
-    
-    step = (poi_upper - poi_lower)/nstep
-
-    big_p =-1;
-    small_p=1e300
-    for ii in range(nstep+1):
-        x = ii * step
-        p = model(x)
-        if p > big_p:
-            big_p = p
-            
-        if big_p > p:
-            if p < small_p:
-                small_p = p
-
-        if small_p / big_p < 1.e-3:
-            poi_upper = x
-            print "\t%8.3f\t%8.2e" % (x, p)
-            break
-        
-        print "\t%8.3f\t%8.2e" % (x, p)
-        
-    poi.setRange(poi_lower, poi_upper)
-    print "\t\t\t==> real time: %8.3f s\n" % swatch.RealTime()            
+
+    lrange = model.findRange(cut)
+    poi.setRange(lrange.first, lrange.second)
+    print "\t\t\t==> real time: %8.3f s (%d evaluations)\n" % \
+      (swatch.RealTime(), model.numberOfEvaluations())
     print "optimized range: %8.4f ... %8.4f 1/TeV^2\n" %\
       (poi.getMin(), poi.getMax())            
 #-----------------------------------------------------------------
-def computePercentiles(log, pdf, poi):
+def computePercentiles(log, pdf, poi, logspace=False):
     bayes  = Bayes(pdf, poi.getMin(), poi.getMax())
+    bayes.setLogSpace(logspace)
     limits = []
     record = '%10s %10s' % ('percentile', 'limit')
     print record
     log.write('%s\n' % record)
     
-    for p in PERCENTILE:
-        lb = bayes.percentile(p)            
+    percentiles = vector('double')()
+    for p in PERCENTILE: percentiles.push_back(p)
+    lbs = bayes.percentiles(percentiles)
+    for p, lb in zip(PERCENTILE, lbs):
         if lb > 0:
             limits.append(1.0/sqrt(lb))
         else:
@@ -171,6 +217,14 @@ def computePercentiles(log, pdf, poi):
         log.write('%s\n' % record)            
     return (limits, bayes)
 
+def logLikelihoods(model, x, logf=None):
+    # log likelihood of every spectrum at lambda = x, computed in one
+    # call, or only of the spectrum selected by model.initialize(which)
+    if logf is None:
+        logf = numpy.zeros(model.numberOfSpectra())
+    n = model.logLikelihoods(x, logf)
+    return logf[:n]
+
 def set_kappa(ws, kappa):
     for ii in xrange(len(kappa)):
         vname = 'kappa%d' % ii
@@ -182,34 +236,28 @@ def set_lambda_kappa(ws, lam, kappa):
         vname = 'kappa%d' % ii
         ws.var(vname).setVal(kappa[ii])            
 #-----------------------------------------------------------------
-def ExpectedLimits(log, tm, bayes, model, luminosity, Lambda, ntrials=200):
+def ExpectedLimits(log, model, luminosity, Lambda, ntrials=200):
 
     swatch = TStopwatch()
     swatch.Start()
 
-    tm += 0.05
-    i   = int(tm / 0.01)
-    tm  = ntrials * (i+1)*0.01 / 60
-    
-    print "\t=> computing coverage. this will take about %5.2f minutes\n" % tm
+    print "\t=> computing coverage with %d pseudo-experiments\n" % ntrials
     
     lam = 1.0/Lambda**2
     np  = len(PERCENTILE)
-    timeleft = TimeLeft(ntrials)
+    percentiles = vector('double')()
+    for p in PERCENTILE: percentiles.push_back(p)
 
+    # percentiles of lambda for all pseudo-experiments
+    # (ntrials x np matrix)
+    q = model.toyPercentiles(ntrials, percentiles, luminosity, lam)
+    
     c   = [0.0]*np
     x1  = [0.0]*np
     x2  = [0.0]*np
     N   = 0
     for trial in range(ntrials):
-        # use Asimov dataset and add fluctuations
-        model.setAsimov(True, True, luminosity, lam)
-        model.initialize(-1) # average over syst. uncert.
-        bayes.reset()
-        
-        limits = [0]*np
-        for i, p in enumerate(PERCENTILE):
-            limits[i] = bayes.percentile(p)
+        limits = [q[trial*np+i] for i in range(np)]
         if min(limits) <= 0: continue
         N += 1
         
@@ -218,13 +266,10 @@ def ExpectedLimits(log, tm, bayes, model, luminosity, Lambda, ntrials=200):
             if Lambda > limits[ii]: c[ii] += 1.0
             x1[ii] += limits[ii]
             x2[ii] += limits[ii]**2
-
-        if (N-1) % 10 == 0:
-            t = [trial] + [ x / N for x in c ]
-            t.append(timeleft(trial))
-            print "trial: %5d\t%5.2f, %5.2f, %5.2f, %5.2f\t%s" % tuple(t) 
-    print
-
+    if N == 0:
+        print "** no valid pseudo-experiments"
+        return
+    
     record = '%10s %16s\t%16s' % ('percentile', 'expected limit', 'coverage')
     log.write('%s\n' % record)    
     
@@ -246,6 +291,78 @@ def ExpectedLimits(log, tm, bayes, model, luminosity, Lambda, ntrials=200):
         
     print "\t\t\t==> real time: %8.3f s\n" % swatch.RealTime()                    
 #-----------------------------------------------------------------
+def computeLimitsVsLumi(context, ws, model):
+    # compute the expected 95% limits for all luminosities and signal
+    # Lambda values at once from the Asimov data sets, with and without
+    # systematic uncertainties, and write one table per (model, Lambda)
+    # in the format read by plotLimitvsLumi.py
+    poi    = ws.var('lambda')
+    lumis  = vector('double')()
+    for lumi in context.lumigrid: lumis.push_back(lumi)
+    lams   = vector('double')()
+    for Lambda in context.Lambdas:
+        if Lambda > 0:
+            lams.push_back(1.0/Lambda**2)
+        else:
+            lams.push_back(0.0)
+    percentiles = vector('double')()
+    percentiles.push_back(P95)
+    nlumis = len(context.lumigrid)
+    
+    for key in context.models:
+        # columns: constructive (no syst., syst.),
+        #          destructive  (no syst., syst.)
+        columns = []
+        for sign in [1, -1]:
+            kappa = [ sign * x for x in KAPPA[key] ]
+            set_kappa(ws, kappa)
+            print "model(%s, %s)" % \
+              (key, sign > 0 and 'constructive' or 'destructive')
+
+            swatch = TStopwatch()
+            swatch.Start()
+            
+            # the posterior density is widest at the smallest luminosity,
+            # so use its range for all luminosities
+            poi.setRange(0.0, 0.02)
+            if not context.logspace:
+                upper = 0
+                for lam in lams:
+                    model.setAsimov(True, False, min(context.lumigrid), lam)
+                    upper = max(upper, model.findRange().second)
+                poi.setRange(0.0, upper)
+                
+            for which in [0, -1]:
+                q = model.asimovPercentiles(lumis, lams, percentiles, which)
+                columns.append([q[i] > 0 and 1.0/sqrt(q[i]) or -1
+                                for i in xrange(q.size())])
+            print "\t\t=> real time: %10.2f seconds" % swatch.RealTime()
+
+        for i, Lambda in enumerate(context.Lambdas):
+            postfix = ''
+            if Lambda > 0: postfix = '_L%3.3d' % int(Lambda)
+            filename = 'figures/%s/%s_%s_limitvslumi%s.txt' % \
+              (context.dname, context.prefix, key, postfix)
+            out = open(filename, 'w')
+            out.write('# created: %s\tsqrt(s): %sTeV\tmodel: %s\n' % \
+                      (ctime(), context.energy, key))
+            if Lambda > 0:
+                out.write('# signal Lambda: %8.1f TeV\n' % Lambda)
+            out.write('# expected 95%% limits on Lambda (TeV)\n')
+            out.write('# %-10s %12s %12s %12s %12s\n' % \
+                      ('lumi(1/pb)', 'constructive', 'constructive',
+                       'destructive', 'destructive'))
+            out.write('# %-10s %12s %12s %12s %12s\n' % \
+                      ('', '(no syst.)', '(syst.)', '(no syst.)', '(syst.)'))
+            for j, lumi in enumerate(context.lumigrid):
+                record = '%-12.1f' % lumi
+                for column in columns:
+                    record += ' %12.1f' % column[i*nlumis+j]
+                out.write('%s\n' % record)
+                print record
+            out.close()
+            print "table: %s" % filename
+#-----------------------------------------------------------------
 def check(o, message):
     if o == None:
         sys.exit("** %s **" % message)
@@ -255,7 +372,8 @@ def makePlot(ws, bayes, poi, hname,
              lstyle=1,
              lwidth=2,
              ymin=0.0,
-             ymax=YMAX):
+             ymax=YMAX,
+             diagnostics=True):
 
     model  = ws.pdf('model')
  
@@ -278,14 +396,15 @@ def makePlot(ws, bayes, poi, hname,
 
     max_f = -1
     max_x = 0.0
+    logf  = numpy.zeros(model.numberOfSpectra())
     for ii in xrange(xbins):
         x = xmin + (ii+0.5)*xstep
         y = bayes.posterior(x) * xstep
-        z = exp(model.logProfileLikelihood(x))*xstep
-        f = model.underflowFraction()
-        if f > max_f:
-            max_f = f
-            max_x = x
+        if diagnostics:
+            f = numpy.mean(logLikelihoods(model, x, logf) < SMALLEST)
+            if f > max_f:
+                max_f = f
+                max_x = x
         h.SetBinContent(ii+1, y)
         h.SetBinError(ii+1, 0)
 
@@ -295,8 +414,9 @@ def makePlot(ws, bayes, poi, hname,
     else:
         "Integral: %10.3f" % total
 
-    print '\t=> maximum underflow fraction %10.3f at lambda = %10.5f\n' % \
-      (max_f, max_x)
+    if diagnostics:
+        print '\t=> maximum underflow fraction %10.3f at lambda = %10.5f\n' % \
+          (max_f, max_x)
       
     h.Scale(1.0/h.Integral())
     ymax = h.GetMaximum()
@@ -345,11 +465,39 @@ def toVector(ws, setname):
         vdata.push_back( ws.var(name).getVal() )
     return vdata
 #-----------------------------------------------------------------
-def main():
+class Context:
+    pass
+#-----------------------------------------------------------------
+def getSigns(context):
+    # return the signs of kappa for which limits are to be computed.
+    # for an expected limit with a signal, the sign is given by the
+    # model name (~ = destructive)
+    if context.expected and context.Lambda > 0:
+        if context.models[0][0] == '~':
+            context.models[0] = context.models[0][1:]
+            return [-1]
+        else:
+            return [1]
+    return [-1, 1]
+#-----------------------------------------------------------------
+def getNames(context):
+    prefix = nameonly(context.filename)
+    context.dname  = split(prefix, '_')[0]
+    context.prefix = replace(prefix, '_workspace', '')
+    context.energy = '%d' % ENERGY
+    lumin = context.luminosity / 1000
+    context.lumi = '%5.2f' % lumin
 
-    filename, expected, Lambda, luminosity, models, ntrials, firstbin = decodeCommandLine()
-    BINMIN = firstbin
-    
+    postfix = '_l%3.3d' % int(lumin+0.5)
+    if context.Lambda > 0:
+        postfix += '_L%3.3d' % int(context.Lambda)
+    if context.expected:
+        postfix += '_expected'
+    else:
+        postfix += '_observed'
+    context.postfix = postfix
+#-----------------------------------------------------------------
+def loadWorkspace(context, verbose=True):
     # --------------------------------------
     # load various codes needed for the
     # calculatioms
@@ -362,266 +510,336 @@ def main():
     # --------------------------------------
     # load workspace into memory
     # --------------------------------------
-    wfile = TFile(filename)
+    wfile = TFile(context.filename)
     if not wfile.IsOpen():
-        sys.exit("** can't open %s" % filename)
+        sys.exit("** can't open %s" % context.filename)
         
     ws = wfile.Get(WSPACE)
     check(ws, "can't access workspace %s" % WSPACE)
     
-    energy ='%d' % ENERGY
-    lumin  = luminosity / 1000
-    lumi   = '%5.2f' % lumin
-        
-    prefix = nameonly(filename)
-    dname  = split(prefix, '_')[0]
-    os.system('mkdir -p figures/%s' % dname)
-    prefix = replace(prefix, '_workspace', '')
-    
     # --------------------------------------
     # get model etc.
     # --------------------------------------
     model = ws.pdf('model')
-    Nset  = ws.set('Nset')
-    poi   = ws.var('lambda')        # parameter of interest (lambda)
-    
-    data  = toVector(ws, 'Nset')
-    nbins = model.numberOfBins()
-    lam   = None
-    kappa = None
+    model.setNumberOfThreads(context.nthreads, context.gridparallel)
+    luminosity = context.luminosity
     
     # if expected = True then create and use an Asimov data set
-    if expected:
+    if context.expected:
 
-        if Lambda <= 0:
+        if context.Lambda <= 0:
             model.setAsimov(True)
-            SIGN = [-1, 1]
-            
         else:
-            if models[0][0] == '~':
-                models[0] = models[0][1:]
-                sign =-1
-            else:
-                sign = 1
-
-            lam  = 1.0/Lambda**2                
-            key  = models[0]
-            SIGN = [sign]
+            lam  = 1.0/context.Lambda**2
+            key  = context.models[0]
+            sign = context.signs[0]
             if KAPPA.has_key(key):
                 kappa = [ sign * x for x in KAPPA[key] ]
                 set_lambda_kappa(ws, lam, kappa)
-                
-            printValues(ws, ws.set('kappaset'))
+            if verbose:
+                printValues(ws, ws.set('kappaset'))
             model.setAsimov(True, False, luminosity, lam)
-            
-        print "\n\t== use Asimov data set (Lumi = %10.1f / pb)" % luminosity
+
+        if verbose:
+            print "\n\t== use Asimov data set (Lumi = %10.1f / pb)" % \
+              luminosity
         
-        Asimov = model.Asimov()
-        nn = 0
-        for ii in xrange(Asimov.size()):
-            print "%4d\t%10.1f" % (ii+1, Asimov[ii]),
-            nn += 1
-            if nn > 3:
-                print
-                nn = 0
-        print        
+            Asimov = model.Asimov()
+            nn = 0
+            for ii in xrange(Asimov.size()):
+                print "%4d\t%10.1f" % (ii+1, Asimov[ii]),
+                nn += 1
+                if nn > 3:
+                    print
+                    nn = 0
+            print        
     else:
         model.setAsimov(False)
-        SIGN = [-1, 1]
 
     # --------------------------------------
     # set range of bins to use.
     # NOTE: use ROOT bin labeling convention
     # first bin is 1 and last is nbins
     # --------------------------------------
-    binmin = BINMIN
-    binmax = BINMAX
-    model.setBinRange(binmin, binmax)
+    model.setBinRange(context.binmin, context.binmax)
+    return (wfile, ws, model)
+#-----------------------------------------------------------------
+def computeLimit(context, ws, model, key, sign):
+    Nset  = ws.set('Nset')
+    poi   = ws.var('lambda')        # parameter of interest (lambda)
+    energy= context.energy
+    lumi  = context.lumi
+    dname, prefix, postfix = context.dname, context.prefix, context.postfix
+    Lambda, logspace = context.Lambda, context.logspace
     
-    print "="*80
-    print "input filename:   %s" % filename
-    print "workspace:        %s" % WSPACE
-    print "models:           %s" % models
-    print "bin range:        [%d ... %d]" % (binmin, binmax)
-    print "integrated lumi:  %9.2f / pb" % luminosity
-    if expected:
-        print 
-        print "compute expected limits with"
-        print "Lambda:       %9.2f TeV" % Lambda
-        
-    print "="*80
+    # create wrapper for RooFit model
+    wrapped_model = PDFWrapper(model, Nset, poi)
+
+    # --------------------------------------            
+    # set kappa values for current model
+    # --------------------------------------            
+    kappa = [ sign * x for x in KAPPA[key] ]
+    set_kappa(ws, kappa)
+    printValues(ws, ws.set('kappaset'))
 
-    postfix = '_l%3.3d' % int(lumin+0.5)
-    if Lambda > 0:
-        postfix += '_L%3.3d' % int(Lambda)
-                
-    if expected:
-        postfix += '_expected'
-    else:
-        postfix += '_observed'
-        
     # --------------------------------------
-    # compute limit for each model
+    # find a reasonable range for lambda
     # --------------------------------------
-    # create wrapper for RooFit model
-    wrapped_model = PDFWrapper(model, Nset, poi)
-    
-    for key in models:
-        
-        for sign in SIGN:
+    poi.setRange(0.0, 0.02)
+    # in log space the likelihood does not underflow, so
+    # the range need not be optimized
+    if not logspace:
+        optimizeRange(model, poi)
 
-            # --------------------------------------            
-            # set kappa values for current model
-            # --------------------------------------            
-            kappa = [ sign * x for x in KAPPA[key] ]
-            set_kappa(ws, kappa)
-            printValues(ws, ws.set('kappaset'))
-
-            # --------------------------------------
-            # find a reasonable range for lambda
-            # --------------------------------------
-            poi.setRange(0.0, 0.02)            
-            optimizeRange(wrapped_model, poi)
-
-            # --------------------------------------
-            # create canvas
-            # --------------------------------------            
-            if sign > 0:
-                print "model(%s, constructive)" % key
-                name = '%s_constructive' % key
-                fname = 'figures/%s/%s_limit_%s%s' % \
-                  (dname, prefix, name, postfix)
-                clike1 = TCanvas(fname, fname, 10, 10, 500, 500)
-                clike = clike1
-
-            else:
-                print "model(%s, destructive)" % key
-                name = '%s_destructive' % key
-                fname = 'figures/%s/%s_limit_%s%s' % \
-                  (dname, prefix, name, postfix)
-                clike2 = TCanvas(fname, fname, 515, 10, 500, 500)
-                clike = clike2
+    # --------------------------------------
+    # create canvas
+    # --------------------------------------            
+    if sign > 0:
+        print "model(%s, constructive)" % key
+        name = '%s_constructive' % key
+        fname = 'figures/%s/%s_limit_%s%s' % \
+          (dname, prefix, name, postfix)
+        clike = TCanvas(fname, fname, 10, 10, 500, 500)
+    else:
+        print "model(%s, destructive)" % key
+        name = '%s_destructive' % key
+        fname = 'figures/%s/%s_limit_%s%s' % \
+          (dname, prefix, name, postfix)
+        clike = TCanvas(fname, fname, 515, 10, 500, 500)
                 
-            # --------------------------------------
-            # open log file
-            # --------------------------------------                            
-            logfile = '%s.log' % fname
-            print 'logfile: %s' % logfile
-            log = open(logfile, 'w')
-            log.write('''created: %(time)s\tsqrt(s): %(energy)sTeV\tl: %(lumi)s/fb
+    # --------------------------------------
+    # open log file
+    # --------------------------------------                            
+    logfile = '%s.log' % fname
+    print 'logfile: %s' % logfile
+    log = open(logfile, 'w')
+    log.write('''created: %(time)s\tsqrt(s): %(energy)sTeV\tl: %(lumi)s/fb
 model:   %(model)s\tkappa: %(kappa)s
-            ''' % {'time':   ctime(),
-                   'energy': energy,
-                   'lumi':   lumi,
-                   'model':  key,
-                   'kappa':  kappa})            
+    ''' % {'time':   ctime(),
+           'energy': energy,
+           'lumi':   lumi,
+           'model':  key,
+           'kappa':  kappa})            
 
-            if Lambda > 0:
-                log.write('computed with signal mass scale Lambda: %8.1fTeV\n' % Lambda)
-                
-           # delete histograms to avoid memory leaks
-            try:
-                del hnom
-            except:
-                pass
-            try:
-                del havg
-            except:
-                pass
-            try:
-                del hclone
-            except:
-                pass
-            
-            # --------------------------------------
-            # compute limits with systematic
-            # uncertainties
-            # --------------------------------------
-            record = '\n\tWITH systematic uncertainties'
-            print record
-            log.write('%s\n' % record)
+    if Lambda > 0:
+        log.write('computed with signal mass scale Lambda: %8.1fTeV\n' % Lambda)
             
-            swatch = TStopwatch()
-            swatch.Start()
+    # --------------------------------------
+    # compute limits with systematic
+    # uncertainties
+    # --------------------------------------
+    record = '\n\tWITH systematic uncertainties'
+    print record
+    log.write('%s\n' % record)
+    
+    swatch = TStopwatch()
+    swatch.Start()
 
-            model.initialize(-1) # average over syst. uncert.
-            limits_avg, bayes_avg = computePercentiles(log, wrapped_model, poi)
+    model.initialize(-1) # average over syst. uncert.
+    limits_avg, bayes_avg = computePercentiles(log, wrapped_model, poi,
+                                               logspace)
 
-            tm = swatch.RealTime()
-            print "\t\t=> real time: %10.2f seconds" % tm
-            
-            havg = makePlot(ws, bayes_avg, poi, "havg",
-                                color=kRed, lstyle=1, lwidth=2)            
-
-            # --------------------------------------
-            # estimate fluctuations in percentiles
-            # --------------------------------------            
-            if ntrials > 0:
-                set_kappa(ws, kappa)
-                ExpectedLimits(log, tm, bayes_avg, model,
-                               luminosity, Lambda, ntrials)
-            
-            # --------------------------------------
-            # compute nominal limits
-            # --------------------------------------
-            record = '\n\tNO systematic uncertainties'
+    tm = swatch.RealTime()
+    print "\t\t=> real time: %10.2f seconds" % tm
+    print "\t\t=> likelihood evaluations: %d" % model.numberOfEvaluations()
+    
+    havg = makePlot(ws, bayes_avg, poi, "havg",
+                    color=kRed, lstyle=1, lwidth=2,
+                    diagnostics=not logspace)            
+
+    # --------------------------------------
+    # estimate fluctuations in percentiles
+    # --------------------------------------            
+    if context.ntrials > 0:
+        set_kappa(ws, kappa)
+        ExpectedLimits(log, model,
+                       context.luminosity, Lambda, context.ntrials)
+    
+    # --------------------------------------
+    # compute nominal limits
+    # --------------------------------------
+    record = '\n\tNO systematic uncertainties'
+    print record
+    log.write('%s\n' % record)
+
+    swatch = TStopwatch()
+    swatch.Start()
+    
+    model.initialize(0) # use nominal cross section            
+    limits_nom, bayes_nom = computePercentiles(log, wrapped_model, poi,
+                                               logspace)
+    
+    tm = swatch.RealTime()
+    print "\t\t=> real time: %10.2f seconds" % tm
+    
+    log.close()
+    
+    hnom = makePlot(ws, bayes_nom, poi, "hnom",
+                    color=kBlue, lstyle=2,
+                    diagnostics=not logspace)
+    
+    # --------------------------------------
+    # update plot
+    # --------------------------------------
+    clike.cd()
+    hnom.Draw('l')
+    havg.Draw('l same')
+    clike.Update()
+    gSystem.ProcessEvents()
+    
+    # shade 95% region
+    hclone = havg.Clone()
+    hclone.SetAxisRange(poi.getMin(), limits_avg[-1])
+    hclone.SetFillStyle(3001)
+    hclone.SetFillColor(30)
+    clike.cd()
+    hclone.Draw('l same')
+    gSystem.ProcessEvents()
+    
+    # --------------------------------------
+    # plot posterior density and limits
+    # --------------------------------------
+    clike.cd()
+    scribe = addTitle('CMS Preliminary  '\
+                      '#surds=%sTeV  L=%sfb^{-1}' % \
+                      (energy, lumi),
+                      0.04)
+    scribe.vspace()
+    scribe.write("model: %s, #kappa = %s" % (key, kappa), 0.06)
+    scribe.write("#color[4]{#Lambda} > %4.1fTeV @ 95%s CL" % \
+                 (limits_nom[-1], '%'), 0.06)
+    scribe.write("#color[2]{#Lambda} > %4.1fTeV @ 95%s CL" % \
+                 (limits_avg[-1], '%'), 0.06)
+                    
+    for i, limit in enumerate(limits_avg):
+        scribe.write("%8.4f\t %4.1f" % (PERCENTILE[i], limit), 0.39)
+    clike.Update()
+    clike.SaveAs('.png')
+    gSystem.ProcessEvents()
+
+    return (key, sign, limits_avg, limits_nom, logfile)
+#-----------------------------------------------------------------
+def computeLimitJob(args):
+    # run in a separate process: open the workspace, compute the
+    # limits for one (model, sign) pair and write no graphics to screen
+    context, key, sign = args
+    gROOT.SetBatch(kTRUE)
+    logfile = 'figures/%s/%s_limit_%s_%s%s.out' % \
+      (context.dname, context.prefix, key,
+       sign > 0 and 'constructive' or 'destructive', context.postfix)
+
+    # redirect file descriptor 1, so that the output of the C++ code
+    # also goes to the log file, and restore it even if the job fails,
+    # since the process is reused by the pool. the C stdio buffers,
+    # which hold the output of cout, are flushed before each switch
+    libc = ctypes.CDLL(None)
+    sys.stdout.flush()
+    libc.fflush(None)
+    stdout = os.dup(1)
+    log = open(logfile, 'w')
+    os.dup2(log.fileno(), 1)
+    sys.stdout = log
+    try:
+        wfile, ws, model = loadWorkspace(context, verbose=False)
+        results = computeLimit(context, ws, model, key, sign)
+    finally:
+        sys.stdout.flush()
+        libc.fflush(None)
+        os.dup2(stdout, 1)
+        os.close(stdout)
+        sys.stdout = sys.__stdout__
+        log.close()
+    return results
+#-----------------------------------------------------------------
+def writeSummary(context, results):
+    # merge the limits and log files of all (model, sign) pairs
+    filename = 'figures/%s/%s_limits%s.txt' % \
+      (context.dname, context.prefix, context.postfix)
+    out = open(filename, 'w')
+    out.write('created: %s\tsqrt(s): %sTeV\tl: %s/fb\n' % \
+              (ctime(), context.energy, context.lumi))
+    record = '%-5s %-12s' % ('model', 'interference')
+    for p in PERCENTILE:
+        record += ' %7.3f' % p
+    record = '%s  (with syst. | without syst.)' % record
+    out.write('%s\n' % record)
+    print record
+    for key, sign, limits_avg, limits_nom, logfile in results:
+        for limits in [limits_avg, limits_nom]:
+            record = '%-5s %-12s' % \
+              (key, sign > 0 and 'constructive' or 'destructive')
+            for limit in limits:
+                record += ' %7.1f' % limit
+            if limits is limits_nom: record += '  (no syst.)'
+            out.write('%s\n' % record)
             print record
-            log.write('%s\n' % record)
+    for key, sign, limits_avg, limits_nom, logfile in results:
+        out.write('\n%s\n%s\n' % ('='*80, logfile))
+        out.write(open(logfile).read())
+    out.close()
+    print "summary: %s" % filename
+#-----------------------------------------------------------------
+def main():
 
-            swatch = TStopwatch()
-            swatch.Start()
-            
-            model.initialize(0) # use nominal cross section            
-            limits_nom, bayes_nom = computePercentiles(log, wrapped_model, poi)
-            
-            tm = swatch.RealTime()
-            print "\t\t=> real time: %10.2f seconds" % tm
-            
-            log.close()
-            
-            hnom = makePlot(ws, bayes_nom, poi, "hnom",
-                                color=kBlue, lstyle=2)
-            
-            # --------------------------------------
-            # update plot
-            # --------------------------------------
-            clike.cd()
-            hnom.Draw('l')
-            havg.Draw('l same')
-            clike.Update()
-            gSystem.ProcessEvents()
-            
-            # shade 95% region
-            hclone = havg.Clone()
-            hclone.SetAxisRange(poi.getMin(), limits_avg[-1])
-            hclone.SetFillStyle(3001)
-            hclone.SetFillColor(30)
-            clike.cd()
-            hclone.Draw('l same')
-            gSystem.ProcessEvents()
-            
-            # --------------------------------------
-            # plot posterior density and limits
-            # --------------------------------------
-            clike.cd()
-            scribe = addTitle('CMS Preliminary  '\
-                              '#surds=%sTeV  L=%sfb^{-1}' % \
-                              (energy, lumi),
-                              0.04)
-            scribe.vspace()
-            scribe.write("model: %s, #kappa = %s" % (key, kappa), 0.06)
-            scribe.write("#color[4]{#Lambda} > %4.1fTeV @ 95%s CL" % \
-                         (limits_nom[-1], '%'), 0.06)
-            scribe.write("#color[2]{#Lambda} > %4.1fTeV @ 95%s CL" % \
-                            (limits_avg[-1], '%'), 0.06)
-                            
-            for i, limit in enumerate(limits_avg):
-                scribe.write("%8.4f\t %4.1f" % (PERCENTILE[i], limit), 0.39)
-            clike.Update()
-            clike.SaveAs('.png')
-            gSystem.ProcessEvents()
+    context = Context()
+    context.filename, context.expected, context.Lambda, context.luminosity, \
+      context.models, context.ntrials, firstbin, context.logspace, \
+      context.nthreads, context.gridparallel, \
+      context.njobs, context.lumigrid, context.Lambdas = decodeCommandLine()
+    context.binmin = firstbin
+    context.binmax = BINMAX
+    context.signs  = getSigns(context)
+    getNames(context)
+    os.system('mkdir -p figures/%s' % context.dname)
+
+    # (model, sign) pairs for which to compute limits
+    pairs = []
+    for key in context.models:
+        for sign in context.signs:
+            pairs.append((key, sign))
+
+    # expected limits for a grid of luminosities
+    if context.lumigrid != []:
+        wfile, ws, model = loadWorkspace(context, verbose=False)
+        computeLimitsVsLumi(context, ws, model)
+        return
+    
+    # in multi-process mode, each process opens the workspace
+    if context.njobs < 2:
+        wfile, ws, model = loadWorkspace(context)
+    
+    print "="*80
+    print "input filename:   %s" % context.filename
+    print "workspace:        %s" % WSPACE
+    print "models:           %s" % context.models
+    print "bin range:        [%d ... %d]" % (context.binmin, context.binmax)
+    print "threads:          %d" % context.nthreads
+    print "processes:        %d" % max(1, context.njobs)
+    print "integrated lumi:  %9.2f / pb" % context.luminosity
+    if context.expected:
+        print 
+        print "compute expected limits with"
+        print "Lambda:       %9.2f TeV" % context.Lambda
+        
+    print "="*80
+
+    # --------------------------------------
+    # compute limit for each model
+    # --------------------------------------
+    results = []
+    if context.njobs > 1:
+        pool = Pool(context.njobs)
+        results = pool.map(computeLimitJob,
+                           [(context, key, sign) for key, sign in pairs])
+        pool.close()
+        pool.join()
+    else:
+        for key in context.models:
+            for sign in context.signs:
+                results.append(computeLimit(context, ws, model, key, sign))
+            if not gROOT.IsBatch(): sleep(5)
             
-        sleep(5)
+    writeSummary(context, results)
 #----------------------------------------------------------------------
 try:
     main()
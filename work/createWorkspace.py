@@ -7,6 +7,11 @@
 #         16-May-2016 HBP - update to use random sampling implemented and
 #                     tested by Roberto
 #         30-Apr-2018 HBP - limit number of spectra to MAXSPECTRA
+#         18-Oct-2026     - add option to read spectra from spectrum stores
+#         18-Oct-2026     - add options to store the spectra as a flat block,
+#                     either in the workspace or in a memory-mapped file
+#         18-Oct-2026     - add option to use only the smeared spectra
+#                     recorded in the manifest of the smearing cache
 #-----------------------------------------------------------------------------
 import os, sys, re, optparse, histutil
 from math import *
@@ -15,6 +20,7 @@ from glob import glob
 from array import array
 from time import sleep
 from random import shuffle, randint
+from smearcache import readManifest
 from ROOT import gSystem, TFile, kFALSE, kTRUE, \
      RooWorkspace, RooMsgService, RooFit, RooDataSet, RooCmdArg, vector
 #-----------------------------------------------------------------------------
@@ -44,6 +50,12 @@ def decodeCommandLine():
        -o<root filename>                       [<PDF>_<s>_workspace.root]
        -n<number of PDF members>               [%d]
        -b                                      [no boostrap] 
+       -f  read spectra from spectrum stores   [read ROOT files]
+           (see fastCI/work/createCIhists.py --store)
+       -c  store spectra as one flat block     [store spectra]
+       -m  store flat block in memory-mapped file <output>.ensemble
+       -k<cachedir> use only the smeared spectra recorded in the
+           manifest of the smearing cache (see smearSpectra.py)
     ''' % NMEMBERS
     if len(sys.argv) < 2:
         print USAGE
@@ -76,6 +88,31 @@ def decodeCommandLine():
                       action='store_true',
                       dest='bootstrap',
                       help='use a bootstrap sample of spectra')    
+
+    parser.add_option('-f', '--store',
+                      action='store_true',
+                      dest='store',
+                      default=False,
+                      help='read spectra from spectrum stores')
+
+    parser.add_option('-c', '--compact',
+                      action='store_true',
+                      dest='compact',
+                      default=False,
+                      help='store spectra as one flat block')
+
+    parser.add_option('-m', '--mmap',
+                      action='store_true',
+                      dest='mmap',
+                      default=False,
+                      help='store flat block in a memory-mapped file')
+
+    parser.add_option('-k', '--cache',
+                      action='store',
+                      dest='cachedir',
+                      type='string',
+                      default='',
+                      help='smearing cache')
                                       
     options, PDFsets = parser.parse_args()
     if len(PDFsets) == 0:
@@ -94,20 +131,23 @@ def decodeCommandLine():
         filename = '%s_%s_workspace.root' % (prefix, directory)
 
     return (directory, PDFsets, filename,
-            options.nmembers, options.bootstrap, options.smearing)
+            options.nmembers, options.bootstrap, options.smearing,
+            options.store, options.compact, options.mmap,
+            options.cachedir)
 #-----------------------------------------------------------------------------
 def main():
     print "\n\t\t\t=== createWorkspace.py ==="
 
     # number of PDF members = number of subdirectories under each PDF
     # directory
-    dirname, PDFsets, wfilename, ndirs, bootstrap, smearing=decodeCommandLine()
+    dirname, PDFsets, wfilename, ndirs, bootstrap, smearing, \
+      usestore, compact, usemmap, cachedir = decodeCommandLine()
     PDFset = PDFsets[0]
     
     try:
         gSystem.Load("$CIPATH/CI/lib/libCI")
         from ROOT import hutil, \
-     QCDSpectrum, CIXsection, CISpectrum, RooInclusiveJetPdf
+     QCDSpectrum, CIXsection, CISpectrum, RooInclusiveJetPdf, SpectrumStore
     except:
         sys.exit('\n\t** problem loading library. please re-compile CI or check path **\n')
         
@@ -156,6 +196,35 @@ def main():
             QCDdirs.append(filename)
     QCDdirs.sort()
 
+    # -------------------------------------
+    # if requested, keep only the members
+    # for which the QCD and CI spectra were
+    # written by smearSpectra.py from the
+    # spectra in its cache
+    # -------------------------------------
+    if cachedir != '':
+        if usestore:
+            hutil.error("createWorkspace.py",
+                        "options -f and -k are incompatible")
+        outputs = readManifest(cachedir)['outputs']
+        smeared = {}
+        for outfile in outputs.keys():
+            smeared[os.path.dirname(outfile)] = 1
+        dirs = []
+        for QCDdir in QCDdirs:
+            CIdir = replace(QCDdir, 'fastNLO', 'fastCI')
+            if not outputs.has_key(os.path.abspath('%s/qcd.root' % QCDdir)):
+                continue
+            if not smeared.has_key(os.path.abspath(CIdir)):
+                continue
+            dirs.append(QCDdir)
+        print "==> %d of %d members in smearing cache %s" % \
+          (len(dirs), len(QCDdirs), cachedir)
+        if len(dirs) == 0:
+            hutil.error("createWorkspace.py",
+                        "no smeared spectra in cache %s" % cachedir)
+        QCDdirs = dirs
+
     # -------------------------------------                
     # make a sample of histograms in which
     # the renormalization and factorization
@@ -299,6 +368,23 @@ def main():
     
     print "==> saving %d spectra to workspace %s" % (nspectra, wfilename)
 
+    # -------------------------------------
+    # if requested, open one QCD and one CI
+    # spectrum store per PDF set. a spectrum
+    # is identified by <member>/<histname>
+    # -------------------------------------
+    stores = {}
+    if usestore:
+        for pdfset in PDFsets:
+            for prefix, name in [('fastNLO', 'qcd'), ('fastCI', 'ci')]:
+                filename = '../%s/%s/%s_%s.store' % \
+                  (prefix, pdfset, name, dirname[1:])
+                store = SpectrumStore(filename)
+                if not store.good():
+                    hutil.error("createWorkspace.py",
+                                "can't open store %s" % filename)
+                stores[(pdfset, name)] = store
+    
     hfile = TFile(wfilename, "recreate")
     qcdspectrum = []
     cispectrum  = []
@@ -310,10 +396,19 @@ def main():
         if index % 100 == 0:
             print "%5d %s\t%s" % (index, QCDdir, histname)
 
+        if usestore:
+            t = split(QCDdir, '/')
+            pdfset, key = t[-3], '%s/%s' % (t[-2], histname)
+            
         name = "QCD%5.5d" % index
         qcdrecords.append(name)
-        qcdspectrum.append(QCDSpectrum(name, name, QCDdir,
-                                       histname, nbins, ptlow))
+        if usestore:
+            qcdspectrum.append(QCDSpectrum(name, name,
+                                           stores[(pdfset, 'qcd')],
+                                           key, nbins, ptlow))
+        else:
+            qcdspectrum.append(QCDSpectrum(name, name, QCDdir,
+                                           histname, nbins, ptlow))
         if index == 0:
             h  = qcdspectrum[-1]()
             nb = h.GetNbinsX()
@@ -324,8 +419,13 @@ def main():
             
         name = "CI%5.5d" % index
         cirecords.append(name)
-        cispectrum.append(CISpectrum(name, name, CIdir,
-                                        histname, nbins, ptlow))
+        if usestore:
+            cispectrum.append(CISpectrum(name, name,
+                                         stores[(pdfset, 'ci')],
+                                         key, nbins, ptlow))
+        else:
+            cispectrum.append(CISpectrum(name, name, CIdir,
+                                         histname, nbins, ptlow))
         if index == 0:
             k = vector('double')(6,0)
             k[0]=-1        
@@ -339,6 +439,19 @@ def main():
         # also add spectra to probability model
         model.add(qcdspectrum[-1], cispectrum[-1])
 
+    # -------------------------------------
+    # if requested, replace spectra by a
+    # flat block of cross sections and
+    # coefficients
+    # -------------------------------------
+    if usemmap:
+        sidecar = replace(wfilename, '.root', '.ensemble')
+        print "==> writing spectra to memory-mapped file: %s" % sidecar
+        model.compact(sidecar)
+    elif compact:
+        print "==> storing spectra as a flat block"
+        model.compact()
+        
     getattr(ws, 'import')(model, RooCmdArg())
     # -------------------------------------                
     print "="*80    
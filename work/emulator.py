@@ -0,0 +1,115 @@
+#-----------------------------------------------------------------------------
+# File: emulator.py
+# Description: response-surface emulator of JES/JER smearing. The cross
+#              section in each bin of a smeared spectrum is a smooth
+#              function of the JES and JER variates (x, y). Given the
+#              spectra smeared exactly at a small design of (x, y) points,
+#              each bin is fitted, by least squares, with a polynomial in
+#              (x, y) of given total degree; the fit is to the log of the
+#              cross section if it is positive at every design point. The
+#              emulator then predicts the smeared spectrum at any (x, y).
+# created 18-Oct-2026
+#-----------------------------------------------------------------------------
+from math import *
+#-----------------------------------------------------------------------------
+def designPoints(npoints=7, xmax=3.0, ymax=None):
+    # npoints x npoints grid in [-xmax, xmax] x [-ymax, ymax]
+    if ymax == None: ymax = xmax
+    u = [-xmax + ii*2*xmax/(npoints-1) for ii in xrange(npoints)]
+    v = [-ymax + ii*2*ymax/(npoints-1) for ii in xrange(npoints)]
+    return [(x, y) for x in u for y in v]
+
+def numberOfTerms(degree):
+    # number of monomials x^i y^j with i + j <= degree
+    return (degree+1)*(degree+2)/2
+
+def monomials(x, y, powers):
+    return [x**i * y**j for i, j in powers]
+#-----------------------------------------------------------------------------
+class LeastSquares:
+    # least squares solution of A c = b, for several b, using the
+    # Householder QR decomposition of A (m rows, n columns, m >= n)
+    def __init__(self, A):
+        self.m = len(A)
+        self.n = len(A[0])
+        if self.m < self.n:
+            raise ValueError('** LeastSquares: %d rows < %d columns' % \
+                             (self.m, self.n))
+        R = [list(row) for row in A]
+        self.v = []
+        for k in xrange(self.n):
+            norm = sqrt(sum([R[i][k]**2 for i in xrange(k, self.m)]))
+            if norm == 0:
+                raise ValueError('** LeastSquares: singular matrix')
+            alpha = -norm if R[k][k] >= 0 else norm
+            v = [0.0]*self.m
+            v[k] = R[k][k] - alpha
+            for i in xrange(k+1, self.m): v[i] = R[i][k]
+            vv = sum([v[i]**2 for i in xrange(k, self.m)])
+            for j in xrange(k, self.n):
+                s = sum([v[i]*R[i][j] for i in xrange(k, self.m)])
+                f = 2*s/vv
+                for i in xrange(k, self.m): R[i][j] -= f*v[i]
+            self.v.append((v, vv))
+        self.R = R
+
+    def solve(self, b):
+        b = list(b)
+        # b <- Q^T b
+        for k, (v, vv) in enumerate(self.v):
+            s = sum([v[i]*b[i] for i in xrange(k, self.m)])
+            f = 2*s/vv
+            for i in xrange(k, self.m): b[i] -= f*v[i]
+        # back substitution R c = b
+        R, n = self.R, self.n
+        c = [0.0]*n
+        for k in xrange(n-1, -1, -1):
+            s = b[k] - sum([R[k][j]*c[j] for j in xrange(k+1, n)])
+            c[k] = s/R[k][k]
+        return c
+#-----------------------------------------------------------------------------
+class ResponseSurface:
+    def __init__(self, points, spectra, degree=4):
+        # points:  design (x, y) points
+        # spectra: cross sections/bin at the design points
+        self.degree = degree
+        self.npoints= len(points)
+        self.powers = [(i, d-i) for d in xrange(degree+1)
+                       for i in xrange(d, -1, -1)]
+        lsq = LeastSquares([monomials(x, y, self.powers)
+                            for x, y in points])
+        nbins = len(spectra[0])
+        self.uselog = []
+        self.coeffs = []
+        for ii in xrange(nbins):
+            values = [spectrum[ii] for spectrum in spectra]
+            uselog = min(values) > 0
+            if uselog: values = map(log, values)
+            self.uselog.append(uselog)
+            self.coeffs.append(lsq.solve(values))
+
+    def __call__(self, x, y):
+        # predicted cross sections/bin at (x, y)
+        m = monomials(x, y, self.powers)
+        spectrum = []
+        for c, uselog in zip(self.coeffs, self.uselog):
+            value = sum([a*b for a, b in zip(c, m)])
+            if uselog: value = exp(value)
+            spectrum.append(value)
+        return spectrum
+
+    def residuals(self, points, spectra):
+        # relative residuals (predicted/exact - 1) for each bin,
+        # summarized as (rms, maximum absolute value) per bin
+        nbins = len(spectra[0])
+        sumsq = [0.0]*nbins
+        maxabs= [0.0]*nbins
+        for (x, y), spectrum in zip(points, spectra):
+            predicted = self(x, y)
+            for ii in xrange(nbins):
+                if spectrum[ii] == 0: continue
+                r = predicted[ii]/spectrum[ii] - 1
+                sumsq[ii] += r*r
+                maxabs[ii] = max(maxabs[ii], abs(r))
+        n = max(1, len(points))
+        return [(sqrt(s/n), m) for s, m in zip(sumsq, maxabs)]
@@ -317,6 +317,10 @@ def main():
     # get model and CI spectra
     # --------------------------------------------------------    
     pdf = ws.pdf('model')
+    if pdf.compacted():
+        print "** the spectra of a compacted model can't be plotted; "\
+          "create the workspace without -c or -m **"
+        sys.exit(0)
     nspectra = pdf.size()
     print "number of spectra %d" % nspectra
 
@@ -1,4 +1,9 @@
 #!/usr/bin/env python
+#-------------------------------------------------------------------------------
+# plot expected limits vs integrated luminosity
+# usage: python plotLimitvsLumi.py [table]
+# Updated: 18-Oct-2026 read table written by computeLimits.py -G
+#-------------------------------------------------------------------------------
 import os, sys, re
 from string import *
 from histutil import *
@@ -16,10 +21,20 @@ DATA = '''
 10000		43.2	34.6	37.1	17.2
 30000		53.6	38.8	49.4	18.5
 '''
-DATA = map(lambda x: map(atof, x),
-           map(split, split(strip(DATA), '\n')))
+#-----------------------------------------------------------------------------
+def readTable(records):
+    # columns: lumi (1/pb), constructive (no syst., syst.),
+    # destructive (no syst., syst.). lines starting with # are skipped
+    records = [x for x in map(strip, records) if x != '' and x[0] != '#']
+    return map(lambda x: map(atof, x), map(split, records))
 #-----------------------------------------------------------------------------
 def main():
+    # the table may be given on the command line (see the -G option of
+    # computeLimits.py)
+    if len(sys.argv) > 1:
+        data = readTable(open(sys.argv[1]).readlines())
+    else:
+        data = readTable(split(DATA, '\n'))
     setStyle()
     
     x  = array('d')
@@ -27,7 +42,7 @@ def main():
     y2 = array('d')
     y3 = array('d')
     y4 = array('d')
-    for lumi, l1, l2, l3, l4 in DATA:
+    for lumi, l1, l2, l3, l4 in data:
         lumi /= 1000
         x.append(lumi)
         y1.append(l1)
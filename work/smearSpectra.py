@@ -8,6 +8,17 @@
 #         23-Jun-2016 HBP update to Run II
 #         14-Sep-2016 HBP change EWK correction histogram to histo.
 #                         also place correction files in data directory
+#         18-Oct-2026 add batch mode, in which the files are divided
+#                     between processes. the (JES, JER) variates are
+#                     assigned before any file is smeared, so the results
+#                     do not depend on the number of processes
+#         18-Oct-2026 add option to smear with precomputed response
+#                     matrices (see JetResponseMatrix)
+#         18-Oct-2026 add option to smear with Gauss-Hermite quadrature
+#         18-Oct-2026 compute cross sections/bin with binIntegrals
+#         18-Oct-2026 reuse smeared spectra from a cache (see smearcache.py)
+#         18-Oct-2026 add option to emulate JES/JER smearing with response
+#                     surfaces (see emulator.py)
 #-----------------------------------------------------------------------------
 import os, sys, re, optparse
 from math import *
@@ -16,7 +27,12 @@ from string import *
 from glob import glob
 from array import array
 from time import sleep
-from ROOT import gSystem, gPad, TH1D, TFile, TCanvas, kFALSE, kTRUE, kBlue
+from multiprocessing import Pool
+from smearcache import SmearCache, histogramDigest, digest, \
+     readManifest, updateManifest, CACHEVERSION
+from emulator import ResponseSurface, designPoints, numberOfTerms
+from ROOT import gSystem, gROOT, gPad, TH1D, TFile, TCanvas, \
+     kFALSE, kTRUE, kBlue
 #-----------------------------------------------------------------------------
 LHAPATH = os.environ['LHAPDF_DATA_PATH']
 CIPATH  = os.environ['CIPATH']
@@ -40,18 +56,34 @@ CORFILENAME   = '../data/data_13TeV_L035.1ifb_plus_corrections.root'
 EWKCHISTNAME  = 'ak7/y_0.0-0.5/EwkCor'
 NPCHISTNAME   = 'ak7/y_0.0-0.5/NPCor'
 JERUNCERTAINTY= 0.1  # 10% relative uncertainty in jet energy resolution
+CACHEDIR      = '../smearcache'
+CACHESIZE     = 2000 # maximum size of cache (MB)
+NVALIDATE     = 20   # number of points at which to validate emulator
+EMULATORTOL   = 1.e-3# maximum relative validation residual of emulator
 #-----------------------------------------------------------------------------
 LUMI = 35100.0 # 1/pb
 #-----------------------------------------------------------------------------
 def decodeCommandLine():
-    VERSION = '16-Sep-2016'
+    VERSION = '18-Oct-2026'
     USAGE = '''
     python smearSpectra.py [options] <pathname to unsmeared spectra>
 
     options
        -s<smearing>   pdf, jec, jecpdf [jecpdf]
        -m<member>     PDF member       [*]
-    '''
+       -b             batch mode (no graphics)
+       -j<njobs>      number of processes (implies -b) [1]
+       -r             smear with response matrices
+       -q<nodes>      Gauss-Hermite nodes (0 = adaptive integration) [0]
+       -c<cachedir>   cache of smeared spectra [%s]
+       -z<size>       maximum size of cache (MB) [%d]
+       -n             do not use cache
+       -e<degree>     emulate JES/JER smearing with response surfaces
+                      of given degree (jec only; 0 = no emulator) [0]
+       -t<tolerance>  maximum relative validation residual of
+                      emulator, above which spectra are smeared
+                      exactly [%7.1e]
+    ''' % (CACHEDIR, CACHESIZE, EMULATORTOL)
     parser = optparse.OptionParser(usage=USAGE,
                                    version=VERSION)
     parser.add_option('-s', '--smearing',
@@ -67,15 +99,86 @@ def decodeCommandLine():
                       type='string',
                       default='*',
                       help='PDF member')    
+
+    parser.add_option('-b', '--batch',
+                      action='store_true',
+                      dest='batch',
+                      default=False,
+                      help='batch mode')
+
+    parser.add_option('-j', '--jobs',
+                      action='store',
+                      dest='njobs',
+                      type='int',
+                      default=1,
+                      help='number of processes')
+
+    parser.add_option('-r', '--response',
+                      action='store_true',
+                      dest='response',
+                      default=False,
+                      help='smear with response matrices')
+
+    parser.add_option('-q', '--quadrature',
+                      action='store',
+                      dest='nhermite',
+                      type='int',
+                      default=0,
+                      help='number of Gauss-Hermite nodes')
+
+    parser.add_option('-c', '--cache',
+                      action='store',
+                      dest='cachedir',
+                      type='string',
+                      default=CACHEDIR,
+                      help='cache of smeared spectra')
+
+    parser.add_option('-z', '--cachesize',
+                      action='store',
+                      dest='cachesize',
+                      type='int',
+                      default=CACHESIZE,
+                      help='maximum size of cache (MB)')
+
+    parser.add_option('-n', '--nocache',
+                      action='store_true',
+                      dest='nocache',
+                      default=False,
+                      help='do not use cache')
+
+    parser.add_option('-e', '--emulate',
+                      action='store',
+                      dest='emulate',
+                      type='int',
+                      default=0,
+                      help='degree of response surfaces')
+
+    parser.add_option('-t', '--tolerance',
+                      action='store',
+                      dest='tolerance',
+                      type='float',
+                      default=EMULATORTOL,
+                      help='maximum validation residual of emulator')
     options, args = parser.parse_args()
     if len(args) == 0:
         print USAGE
         sys.exit(0)
     PDFdir = args[0]
     if PDFdir[-1] == '/': PDFdir=PDFdir[:-1]
-    return (upper(options.smearing), PDFdir, options.member)
+    if options.emulate > 0 and upper(options.smearing) != 'JEC':
+        sys.exit("** smearSpectra.py ** the emulator can be used "\
+                 "with -s jec only")
+    if numberOfTerms(options.emulate) > len(designPoints()):
+        sys.exit("** smearSpectra.py ** the emulator degree must be "\
+                 "such that the number of terms is at most the number "\
+                 "of design points (%d)" % len(designPoints()))
+    return (upper(options.smearing), PDFdir, options.member,
+            options.batch or options.njobs > 1, options.njobs,
+            options.response, options.nhermite,
+            options.nocache and '' or options.cachedir, options.cachesize,
+            options.emulate, options.tolerance)
 #-----------------------------------------------------------------------------
-def makePlot(hname, spectrum, pt, COLOR=kBlue):
+def makeHist(hname, xsection, pt, COLOR=kBlue):
     x = array('d')
     nbins = pt.size()-1
     for ii in xrange(nbins+1): x.append(pt[ii])
@@ -85,26 +188,355 @@ def makePlot(hname, spectrum, pt, COLOR=kBlue):
     h.SetLineColor(COLOR)
     h.SetLineWidth(1)
     for ii in xrange(nbins):
-        # save cross section/bin
-        h.SetBinContent(ii+1, spectrum(pt[ii], pt[ii+1]))
+        h.SetBinContent(ii+1, xsection[ii])
         h.SetBinError(ii+1, 0)
     return h
 #-----------------------------------------------------------------------------
-def main():
-    print "\n\t<=== smearSpectra.py ===>"
-    
-    smearingLevel, PDFdir, PDFmember = decodeCommandLine()
-    doJEC = find(smearingLevel, 'J') > -1
-    doPDF = find(smearingLevel, 'P') > -1
-
-    cmd = '(?<=%s/)[0-9]+' % PDFdir
-    getPDFmember = re.compile(cmd)
+class Context:
+    pass
+#-----------------------------------------------------------------------------
+def getPDFmember(context, rootfile):
+    cmd = '(?<=%s/)[0-9]+' % context.PDFdir
+    member = re.compile(cmd).findall(rootfile)
+    if len(member) == 0:
+        sys.exit("** smearSpectra.py ** can't get PDF member from %s" % \
+                 rootfile)
+    return member[0]
 
+def getVariates(context):
+    # --------------------------------------------------------
+    # read normalvariates.
+    # we do this so that we maintain the JES/JER correlation
+    # between QCD and the CI cross sections. Any (PDF member,
+    # mur, muf) triplet can go with any random choice of the
+    # (JES, JER) doublets, but we want to make sure that the
+    # same doublet is used for the same QCD and CI triplet.
+    # we do this using the variate map, which is built here,
+    # in the order in which the files are smeared serially,
+    # before any file is smeared.
+    # --------------------------------------------------------
+    variates = {} # map between (PDF member, mur, muf) and (x, y)
+    if not context.doJEC: return variates
+    
+    nxy = map(lambda x: map(atof, x),
+              map(split, open("normalvariates.txt").readlines()))
+    jxy = 0
+    for rootfile in context.rootfiles:
+        member = getPDFmember(context, rootfile)
+        for histname in context.histnames:
+            for ii in xrange(context.nsmears):
+                key = '%s/%s/%3.3d' % (member, histname, ii)
+                if not variates.has_key(key):
+                    x, y = nxy[jxy]
+                    jxy += 1
+                    variates[key] = (x, y)
+    return variates
+#-----------------------------------------------------------------------------
+def smearFiles(context, indices):
     gSystem.Load("libCI.so")
-    from ROOT import hutil, JECUncertainty, JetSpectrum, JetSpectrumSmeared
+    from ROOT import hutil, JECUncertainty, JetSpectrum
     
     setStyle()
+    
+    # --------------------------------------------------------
+    # get correction functions
+    # --------------------------------------------------------
+    # get jet energy corrections
+    if not os.path.exists(JECUNFILENAME):
+        hutil.error('smearSpectra.py',
+                    "can't open file %s" % JECUNFILENAME)
+        
+    JESunc = JECUncertainty(JECUNFILENAME)
+    JERunc = JERUNCERTAINTY
+    
+    # get electroweak corrections
+    if not os.path.exists(CORFILENAME):
+        hutil.error('smearSpectra.py',
+                    "can't open file %s" % CORFILENAME)        
+    fCor = TFile(CORFILENAME)
+    hEWK = fCor.Get(EWKCHISTNAME)
+    if hEWK == None:
+        hutil.error('smearSpectra.py',
+                    "can't get histogram %s" % EWKCHISTNAME)
+
+    # get non-perturbative corrections
+    hNPC = fCor.Get(NPCHISTNAME)
+    if hNPC == None:
+        hutil.error('smearSpectra.py',
+                    "can't gethistogram %s" % HPCHISTNAME)
 
+    # --------------------------------------------------------      
+    # read data
+    # --------------------------------------------------------    
+    hdfile = TFile(DATAFILENAME)
+    if not hdfile.IsOpen():
+        hutil.error('smearSpectra.py',
+                    "can't open file %s" % DATAFILENAME)
+    hdata = hdfile.Get('hdata')
+    hdata.GetYaxis().SetTitle('#sigma / bin (pb)')
+    hdata.Scale(1.0/LUMI)
+    nbins = hdata.GetNbinsX()
+    pT    = hutil.binlowedges(hdata)
+    pT.push_back(pT.back()+hdata.GetBinWidth(nbins))
+
+    # minimum and maximum pTs of smeared spectrum
+    pTmin = pT[0]
+    pTmax = pT[-1]
+    if not context.batch:
+        print "\n\t==> bins = %4d,  "\
+          "pT-range = (%-6.1f... %-6.1f) GeV\n" % (nbins, pTmin, pTmax)
+
+    # --------------------------------------------------------
+    # if requested, reuse smeared spectra from the cache. the
+    # key of a smeared spectrum is a hash of the configuration
+    # below, the input histogram and the (x, y) variates.
+    # --------------------------------------------------------
+    cache = None
+    if context.cachedir != '':
+        cache = SmearCache(context.cachedir, context.manifest)
+        config = [CACHEVERSION,
+                  histogramDigest(hNPC),
+                  histogramDigest(hEWK),
+                  list(pT),
+                  context.fastNLO,
+                  context.doJEC]
+        if context.doJEC:
+            config += [histogramDigest(JESunc.table()),
+                       JERunc,
+                       context.response,
+                       context.nhermite]
+        if context.emulate > 0:
+            config += ['emulator', context.emulate, NVALIDATE,
+                       context.tolerance]
+        config = digest(*config)
+    
+    # --------------------------------------------------------
+    # loop over files and smear selected histograms within
+    # each file
+    # --------------------------------------------------------
+    # response matrices, one per (x, y), shared by all files of a
+    # PDF member (the variates depend on the member, histogram and
+    # smearing, but not on the file). the files of a member are
+    # smeared consecutively, so the cache need only hold the matrices
+    # of one member.
+    matrices = {}
+    maxmatrices = len(context.histnames)*context.nsmears
+    nsmeared = 0
+    ncached  = 0
+    
+    if not context.batch:
+        cspect = TCanvas('cspec', 'spectra', 10, 10, 500, 500)
+    for index in indices:
+        rootfile = context.rootfiles[index]
+        outfile  = context.outfiles[index]
+        if not os.path.exists(rootfile):
+            hutil.error('smearSpectra.py',
+                        "can't find rootfile %s" % rootfile)
+        member = getPDFmember(context, rootfile)
+
+        if index % 100 == 0:
+            print "%5d\t%s" % (index, rootfile)
+
+        # cache keys of smeared spectra in this file
+        keys = []
+        if cache:
+            hinfile = TFile(rootfile)
+            for histname in context.histnames:
+                h = hinfile.Get(histname)
+                if h == None:
+                    hutil.error('smearSpectra.py',
+                                "can't get histogram %s" % histname)
+                hdigest = histogramDigest(h)
+                for ii in xrange(context.nsmears):
+                    key = '%s/%s/%3.3d' % (member, histname, ii)
+                    keys.append(digest(config, hdigest,
+                                       context.variates.get(key)))
+            hinfile.Close()
+
+            # skip file if it was written from the same spectra
+            if context.batch and cache.hasOutput(outfile, keys):
+                ncached += len(keys)
+                continue
+        
+        # open an output file for smeared histograms
+        hfile = TFile(outfile, 'recreate')
+        hist = []
+        jj = 0
+        for histname in context.histnames:
+
+            # (x, y) variates, if any, of each smearing
+            variates = [context.variates.get('%s/%s/%3.3d' % \
+                                             (member, histname, ii))
+                        for ii in xrange(context.nsmears)]
+            xsections = [None]*context.nsmears
+            if cache:
+                for ii in xrange(context.nsmears):
+                    xsections[ii] = cache.get(keys[jj+ii], pT.size()-1)
+            missing = filter(lambda ii: xsections[ii] == None,
+                             xrange(context.nsmears))
+            ncached += context.nsmears - len(missing)
+
+            if len(missing) > 0:
+                # not cached, so smear
+                spectrum = JetSpectrum(rootfile, histname,
+                                       context.fastNLO,
+                                       hNPC, hEWK)
+                def smearAt(xy):
+                    return smear(context, spectrum, JESunc, JERunc,
+                                 matrices, maxmatrices,
+                                 xy, pT, pTmin, pTmax)
+
+                surface = None
+                if context.emulate > 0 and len(missing) > NVALIDATE:
+                    # smear exactly at the design points and at the
+                    # first NVALIDATE missing variates and emulate
+                    # the others, unless the emulator fails validation,
+                    # in which case the others are smeared exactly.
+                    # the design covers all the missing variates, so
+                    # that none is extrapolated
+                    validate = missing[:NVALIDATE]
+                    xmax = max([1.0]+[abs(variates[ii][0]) for ii in missing])
+                    ymax = max([1.0]+[abs(variates[ii][1]) for ii in missing])
+                    surface, exact, maxres = emulate(context, smearAt,
+                                                     [variates[ii]
+                                                      for ii in validate],
+                                                     xmax, ymax,
+                                                     pT, outfile, histname)
+                    for ii, xsection in zip(validate, exact):
+                        xsections[ii] = xsection
+                    nsmeared += len(exact) + surface.npoints
+                    if maxres > context.tolerance:
+                        print "\temulator %s: validation residual %.1e > "\
+                          "%.1e; smear exactly" % \
+                          (histname, maxres, context.tolerance)
+                        surface = None
+                
+                for ii in missing:
+                    if xsections[ii] == None:
+                        if surface:
+                            xsections[ii] = surface(*variates[ii])
+                        else:
+                            xsections[ii] = smearAt(variates[ii])
+                            nsmeared += 1
+                    if cache:
+                        cache.put(keys[jj+ii], xsections[ii],
+                                  '%s:%s_%3.3d' % (rootfile, histname, ii))
+            jj += context.nsmears
+
+            for ii in xrange(context.nsmears):
+                # create histogram containing cross sections/bin
+                hname = '%s_%3.3d' % (histname, ii)
+                hfile.cd()
+                h = makeHist(hname, xsections[ii], pT, kBlue)
+                    
+                # cache histograms so that they aren't deleted
+                hist.append(h)
+
+                if context.batch: continue
+                
+                cspect.cd()
+                if context.fastNLO:
+                    gPad.SetLogy()
+                    hdata.Draw('ep')
+                    h.Draw('c same')
+                else:
+                    gPad.SetLogy(kFALSE)
+                    h.Draw('c')
+                cspect.Update()
+        hfile.Write()
+        hfile.Close()
+        if cache:
+            cache.addOutput(outfile, keys, context.prefix)
+            
+    print "\tsmeared: %d\treused: %d" % (nsmeared, ncached)
+    if cache:
+        return cache.updates()
+    else:
+        return ({}, {})
+
+def smear(context, spectrum, JESunc, JERunc, matrices, maxmatrices,
+          xy, pT, pTmin, pTmax):
+    # return cross sections/bin of smeared spectrum
+    from ROOT import JetSpectrumSmeared, JetResponseMatrix
+    if not context.doJEC:
+        # no jet energy correction smearing
+        return spectrum.binIntegrals(pT)
+
+    # apply jet energy correction smearing with variates (x, y)
+    x, y = xy
+    if context.response:
+        if not matrices.has_key((x, y)):
+            if len(matrices) >= maxmatrices:
+                matrices.clear()
+            matrices[(x, y)] = JetResponseMatrix(JESunc,
+                                                 JERunc,
+                                                 x, y,
+                                                 pTmin,
+                                                 pTmax)
+        sspectrum = JetSpectrumSmeared(spectrum,
+                                       matrices[(x, y)])
+    else:
+        sspectrum = JetSpectrumSmeared(spectrum,
+                                       JESunc,
+                                       JERunc,
+                                       x, y,
+                                       pTmin, pTmax,
+                                       100,
+                                       context.nhermite)
+    return sspectrum.binIntegrals(pT)
+
+def emulate(context, smearAt, variates, xmax, ymax, pT, outfile, histname):
+    # fit a response surface to the spectra smeared at the design
+    # points in [-xmax, xmax] x [-ymax, ymax], validate it at the given
+    # variates and write the residuals to <outfile>_<histname>_emulator.txt
+    design  = designPoints(xmax=xmax, ymax=ymax)
+    spectra = [list(smearAt(xy)) for xy in design]
+    surface = ResponseSurface(design, spectra, context.emulate)
+    exact = [list(smearAt(xy)) for xy in variates]
+
+    fitres = surface.residuals(design, spectra)
+    valres = surface.residuals(variates, exact)
+    filename = '%s_%s_emulator.txt' % (replace(outfile, '.root', ''),
+                                       histname)
+    out = open(filename, 'w')
+    out.write('# response surface of degree %d, %d design points in '\
+              '[-%.2f, %.2f] x [-%.2f, %.2f], %d validation points\n' % \
+              (context.emulate, len(design), xmax, xmax, ymax, ymax,
+               len(variates)))
+    out.write('# relative residuals (emulated/exact - 1)\n')
+    out.write('#%9s %10s %4s %10s %10s %10s %10s\n' % \
+              ('pTlow', 'pThigh', 'log',
+               'fit-rms', 'fit-max', 'val-rms', 'val-max'))
+    for ii in xrange(pT.size()-1):
+        out.write('%10.1f %10.1f %4d %10.2e %10.2e %10.2e %10.2e\n' % \
+                  (pT[ii], pT[ii+1], surface.uselog[ii],
+                   fitres[ii][0], fitres[ii][1],
+                   valres[ii][0], valres[ii][1]))
+    out.close()
+    maxres = max([m for r, m in valres])
+    print "\temulator %s: max |residual| fit = %.1e, validation = %.1e" % \
+      (histname, max([m for r, m in fitres]), maxres)
+    return (surface, exact, maxres)
+
+def smearJob(args):
+    # run in a separate process
+    context, indices = args
+    gROOT.SetBatch(kTRUE)
+    return smearFiles(context, indices)
+#-----------------------------------------------------------------------------
+def main():
+    print "\n\t<=== smearSpectra.py ===>"
+
+    context = Context()
+    smearingLevel, context.PDFdir, PDFmember, \
+      context.batch, njobs, context.response, \
+      context.nhermite, context.cachedir, cachesize, \
+      context.emulate, context.tolerance = decodeCommandLine()
+    context.doJEC = find(smearingLevel, 'J') > -1
+    context.doPDF = find(smearingLevel, 'P') > -1
+    doJEC, doPDF  = context.doJEC, context.doPDF
+    PDFdir = context.PDFdir
+    
     if  doPDF and not doJEC:
         # --------------------------------------------------------------------
         # do PDF smearing only
@@ -136,6 +568,9 @@ def main():
         histnames= HISTNAMES
         nsmears  = 1
         prefix   = 'JECPDF'
+    context.histnames = histnames
+    context.nsmears   = nsmears
+    context.prefix    = prefix
                 
     # ------------------------------------------------------------------------
     # get input rootfiles and construct output file names
@@ -156,9 +591,11 @@ def main():
         if not os.path.exists(dirname):
             os.system('mkdir -p %s' % dirname)
         outfiles.append(outfile)
-        
+    context.rootfiles = rootfiles
+    context.outfiles  = outfiles
+    
     # which is it, fastCI or fastNLO?
-    fastNLO = find(rootfiles[0], 'fastNLO') > 0
+    context.fastNLO = find(rootfiles[0], 'fastNLO') > 0
     
     print "="*80
     print "\tfirst input root file:   %s" % rootfiles[0]
@@ -173,153 +610,67 @@ def main():
     if doPDF:
         print "\tinclude PDF uncertainties"
         
-    if fastNLO:
+    if context.fastNLO:
         print "\tfastNLO"
     else:
         print "\tfastCI"
-    print "="*80
 
-    # --------------------------------------------------------
-    # get correction functions
-    # --------------------------------------------------------
-    # get jet energy corrections
-    if not os.path.exists(JECUNFILENAME):
-        hutil.error('smearSpectra.py',
-                    "can't open file %s" % JECUNFILENAME)
-        
-    JESunc = JECUncertainty(JECUNFILENAME)
-    JERunc = JERUNCERTAINTY
-    
-    # get electroweak corrections
-    if not os.path.exists(CORFILENAME):
-        hutil.error('smearSpectra.py',
-                    "can't open file %s" % CORFILENAME)        
-    fCor = TFile(CORFILENAME)
-    hEWK = fCor.Get(EWKCHISTNAME)
-    if hEWK == None:
-        hutil.error('smearSpectra.py',
-                    "can't get histogram %s" % EWKCHISTNAME)
-
-    # get non-perturbative corrections
-    hNPC = fCor.Get(NPCHISTNAME)
-    if hNPC == None:
-        hutil.error('smearSpectra.py',
-                    "can't gethistogram %s" % HPCHISTNAME)
-        
-    # --------------------------------------------------------
-    # read normalvariates.
-    # we do this so that we maintain the JES/JER correlation
-    # between QCD and the CI cross sections. Any (PDF member,
-    # mur, muf) triplet can go with any random choice of the
-    # (JES, JER) doublets, but we want to make sure that the
-    # same doublet is used for the same QCD and CI triplet.
-    # we do this using the variate map (see below).
-    # --------------------------------------------------------
-    nxy = map(lambda x: map(atof, x),
-              map(split, open("normalvariates.txt").readlines()))
+    if context.response:
+        print "\tsmear with response matrices"
+    elif context.nhermite > 0:
+        print "\tsmear with %d Gauss-Hermite nodes" % context.nhermite
+    if context.emulate > 0:
+        print "\temulate with response surfaces of degree %d" % \
+          context.emulate
+        print "\temulator tolerance:      %7.1e" % context.tolerance
+    if njobs > 1:
+        print "\tprocesses:               %d" % njobs
+    if context.cachedir != '':
+        print "\tcache:                   %s" % context.cachedir
+    print "="*80
 
-    # --------------------------------------------------------      
-    # read data
-    # --------------------------------------------------------    
-    hdfile = TFile(DATAFILENAME)
-    if not hdfile.IsOpen():
-        hutil.error('smearSpectra.py',
-                    "can't open file %s" % DATAFILENAME)
-    hdata = hdfile.Get('hdata')
-    hdata.GetYaxis().SetTitle('#sigma / bin (pb)')
-    hdata.Scale(1.0/LUMI)
-    nbins = hdata.GetNbinsX()
-    pT    = hutil.binlowedges(hdata)
-    pT.push_back(pT.back()+hdata.GetBinWidth(nbins))
+    # assign (JES, JER) variates
+    context.variates = getVariates(context)
 
-    # minimum and maximum pTs of smeared spectrum
-    pTmin = pT[0]
-    pTmax = pT[-1]
-    print "\n\t==> bins = %4d,  "\
-      "pT-range = (%-6.1f... %-6.1f) GeV\n" % (nbins, pTmin, pTmax)
+    if context.cachedir != '':
+        context.manifest = readManifest(context.cachedir)
     
     # --------------------------------------------------------
-    # loop over files and smear selected histograms within
-    # each file
-    # --------------------------------------------------------              
-    cspect = TCanvas('cspec', 'spectra', 10, 10, 500, 500)
-    jxy = 0
-    variates = {} # map between (PDF member, mur, muf) and (x, y)
-    for index, rootfile in enumerate(rootfiles):
-        if not os.path.exists(rootfile):
-            hutil.error('smearSpectra.py',
-                        "can't find rootfile %s" % rootfile)
-
-        member = getPDFmember.findall(rootfile)
-        if len(member) == 0:
-            hutil.error('smearSpectra.py',
-                        "can't get PDF member from %s" % \
-                        rootfile)
-        member = member[0]
-
-        if index % 100 == 0:
-            print "%5d\t%s" % (index, rootfile)
-         
-        # open an output file for smeared histograms
-        hfile = TFile(outfiles[index], 'recreate')
-        hist = []
-        for histname in histnames:
-            
-            spectrum = JetSpectrum(rootfile, histname, fastNLO, hNPC, hEWK)
-            
-            for ii in xrange(nsmears):
-
-                hname = '%s_%3.3d' % (histname, ii)
-                
-                if doJEC:
-                    # apply jet energy correction smearing.
-                    #
-                    # get the correct mapping between
-                    # (PDFmember, mur, muf) and (x, y)
-                    key = '%s/%s/%3.3d' % (member, histname, ii)
-                    if variates.has_key(key):
-                        x, y = variates[key]
-                    else:
-                        x, y = nxy[jxy]
-                        jxy += 1
-                        variates[key] = (x, y)
-
-                    sspectrum = JetSpectrumSmeared(spectrum,
-                                                   JESunc,
-                                                   JERunc,
-                                                   x, y,
-                                                       pTmin, pTmax)
-                    hfile.cd()
-                    # create histogram containing cross sections/bin
-                    h = makePlot(hname, sspectrum, pT, kBlue)
-                else:
-                    # no jet energy correction smearing
-                    hfile.cd()
-                    h = makePlot(hname,  spectrum, pT, kBlue)
-                    
-                # cache histograms so that they aren't deleted
-                hist.append(h)
+    # smear, either in this process or by dividing the files
+    # between processes
+    # --------------------------------------------------------
+    indices = range(len(rootfiles))
+    if njobs > 1:
+        # give all files of a PDF member to the same process, so that
+        # they share the response matrices of the member
+        members = []
+        findex  = {}
+        for index in indices:
+            member = getPDFmember(context, rootfiles[index])
+            if not findex.has_key(member):
+                findex[member] = []
+                members.append(member)
+            findex[member].append(index)
+        jobs = [[] for i in xrange(njobs)]
+        for i, member in enumerate(members):
+            jobs[i % njobs] += findex[member]
+        pool = Pool(njobs)
+        updates = pool.map(smearJob, [(context, job) for job in jobs])
+        pool.close()
+        pool.join()
+    else:
+        if context.batch: gROOT.SetBatch(kTRUE)
+        updates = [smearFiles(context, indices)]
+        if not context.batch: sleep(5)
 
-                cspect.cd()
-                if fastNLO:
-                    gPad.SetLogy()
-                    hdata.Draw('ep')
-                    h.Draw('c same')
-                else:
-                    gPad.SetLogy(kFALSE)
-                    h.Draw('c')
-                cspect.Update()
-            try:
-                del spectrum
-            except:
-                pass
-            try:
-                del sspectrum
-            except:
-                pass
-        hfile.Write()
-        hfile.Close()
-    sleep(5)
+    # record the new and reused spectra and outputs in the
+    # manifest and bound the size of the cache
+    if context.cachedir != '':
+        nentries, size, nevicted = updateManifest(context.cachedir,
+                                                  updates,
+                                                  cachesize*1024*1024)
+        print "\tcache: %d spectra, %.1f MB, %d evicted" % \
+          (nentries, size/1048576.0, nevicted)
 #-----------------------------------------------------------------------------
 try:
     main()
@@ -0,0 +1,169 @@
+#-----------------------------------------------------------------------------
+# File: smearcache.py
+# Description: content-addressed cache of smeared spectra (see
+#              smearSpectra.py). A smeared spectrum (the cross section/bin)
+#              is stored under a key that is a hash of everything it
+#              depends on: the contents of the input histogram, the JES
+#              table, the NPC and EWK correction histograms, the bins,
+#              the smearing method and the (x, y) variates. The manifest
+#              (manifest.json in the cache directory) records the size
+#              and the time of last use of each entry, which are used to
+#              bound the size of the cache, and the entries from which
+#              each output file was written, so that createWorkspace.py
+#              can find the smeared spectra.
+# created 18-Oct-2026
+#-----------------------------------------------------------------------------
+import os, json, hashlib
+from array import array
+from time import time
+#-----------------------------------------------------------------------------
+CACHEVERSION = 1
+MANIFEST     = 'manifest.json'
+#-----------------------------------------------------------------------------
+def histogramDigest(h):
+    # hash of the bin edges and contents of a 1-D or 2-D histogram
+    sha = hashlib.sha1()
+    sha.update(h.GetName())
+    axes = [h.GetXaxis()]
+    if h.GetDimension() > 1: axes.append(h.GetYaxis())
+    for axis in axes:
+        edges = array('d')
+        for ii in xrange(1, axis.GetNbins()+2):
+            edges.append(axis.GetBinLowEdge(ii))
+        sha.update(edges.tostring())
+    contents = array('d')
+    nx = h.GetNbinsX()
+    if h.GetDimension() > 1:
+        ny = h.GetNbinsY()
+        for ii in xrange(1, nx+1):
+            for jj in xrange(1, ny+1):
+                contents.append(h.GetBinContent(ii, jj))
+    else:
+        for ii in xrange(1, nx+1):
+            contents.append(h.GetBinContent(ii))
+    sha.update(contents.tostring())
+    return sha.hexdigest()
+
+def digest(*args):
+    # hash of strings, or of their repr
+    sha = hashlib.sha1()
+    for arg in args:
+        if type(arg) != type(''): arg = repr(arg)
+        sha.update(arg)
+        sha.update('|')
+    return sha.hexdigest()
+
+def readManifest(cachedir):
+    filename = '%s/%s' % (cachedir, MANIFEST)
+    if not os.path.exists(filename):
+        return {'version': CACHEVERSION, 'entries': {}, 'outputs': {}}
+    manifest = json.load(open(filename))
+    if manifest.get('version', 0) != CACHEVERSION:
+        return {'version': CACHEVERSION, 'entries': {}, 'outputs': {}}
+    return manifest
+#-----------------------------------------------------------------------------
+class SmearCache:
+    def __init__(self, cachedir, manifest=None):
+        self.cachedir = cachedir
+        if manifest == None:
+            manifest = readManifest(cachedir)
+        self.manifest = manifest
+        # entries and outputs added or used by this instance
+        self.entries = {}
+        self.outputs = {}
+
+    def filename(self, key):
+        return '%s/%s/%s.dat' % (self.cachedir, key[:2], key)
+
+    def get(self, key, nbins):
+        # return the cross sections/bin, or None if not cached
+        filename = self.filename(key)
+        if not os.path.exists(filename): return None
+        xsection = array('d')
+        try:
+            xsection.fromfile(open(filename, 'rb'), nbins)
+        except:
+            return None
+        self.use(key, filename)
+        return xsection
+
+    def put(self, key, xsection, source=''):
+        filename = self.filename(key)
+        dirname  = os.path.dirname(filename)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass # created by another process
+        # write to a temporary file, then rename, so that an entry is
+        # never seen partially written
+        tmpname = '%s.%d' % (filename, os.getpid())
+        out = open(tmpname, 'wb')
+        array('d', xsection).tofile(out)
+        out.close()
+        os.rename(tmpname, filename)
+        self.use(key, filename, source)
+
+    def use(self, key, filename, source=''):
+        entry = self.manifest['entries'].get(key, {})
+        self.entries[key] = {'size':   os.path.getsize(filename),
+                             'used':   time(),
+                             'source': source or entry.get('source', '')}
+
+    def hasOutput(self, outfile, keys):
+        # true if outfile was written from these entries
+        output = self.manifest['outputs'].get(os.path.abspath(outfile))
+        if output == None: return False
+        if not os.path.exists(outfile): return False
+        if output['keys'] != keys: return False
+        for key in keys:
+            filename = self.filename(key)
+            if not os.path.exists(filename): return False
+            self.use(key, filename)
+        return True
+
+    def addOutput(self, outfile, keys, smearing):
+        self.outputs[os.path.abspath(outfile)] = {'keys': keys,
+                                                  'smearing': smearing,
+                                                  'created': time()}
+    def updates(self):
+        return (self.entries, self.outputs)
+#-----------------------------------------------------------------------------
+def updateManifest(cachedir, updates, maxsize):
+    # merge the entries and outputs added or used by each process and
+    # remove the least recently used entries until the size of the
+    # cache is at most maxsize (bytes)
+    manifest = readManifest(cachedir)
+    for entries, outputs in updates:
+        manifest['entries'].update(entries)
+        manifest['outputs'].update(outputs)
+
+    entries = manifest['entries']
+    size  = sum([entry['size'] for entry in entries.values()])
+    keys  = entries.keys()
+    keys.sort(lambda a, b: cmp(entries[a]['used'], entries[b]['used']))
+    evicted = {}
+    for key in keys:
+        if size <= maxsize: break
+        filename = '%s/%s/%s.dat' % (cachedir, key[:2], key)
+        if os.path.exists(filename): os.remove(filename)
+        size -= entries[key]['size']
+        evicted[key] = 1
+        del entries[key]
+
+    # forget outputs written from evicted entries
+    if len(evicted) > 0:
+        for outfile, output in manifest['outputs'].items():
+            for key in output['keys']:
+                if evicted.has_key(key):
+                    del manifest['outputs'][outfile]
+                    break
+    if not os.path.exists(cachedir): os.makedirs(cachedir)
+    filename = '%s/%s' % (cachedir, MANIFEST)
+    tmpname  = '%s.%d' % (filename, os.getpid())
+    out = open(tmpname, 'w')
+    out.write(json.dumps(manifest, indent=1, sort_keys=True))
+    out.write('\n')
+    out.close()
+    os.rename(tmpname, filename)
+    return (len(entries), size, len(evicted))
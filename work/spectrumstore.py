@@ -0,0 +1,46 @@
+#-----------------------------------------------------------------------------
+# File: spectrumstore.py
+# Description: write spectrum stores, which are read (memory-mapped) by
+#              CI/src/SpectrumStore.cc. A store holds many records (e.g.,
+#              all PDF members x scale choices of a PDF set), each an array
+#              of (bin x column) doubles. Used by fastCI/work/createCIhists.py
+#              and benchmarkWorkspace.py.
+#
+#              Layout (native byte order):
+#                char   magic[8]     "CISTORE"
+#                int    version, nrecords, nbins, ncols, keysize, unused
+#                double edges[nbins+1]
+#                char   keys[nrecords][keysize]
+#                double data[nrecords][nbins][ncols]
+# created 18-Oct-2026
+#-----------------------------------------------------------------------------
+import sys, struct
+from array import array
+#-----------------------------------------------------------------------------
+STOREMAGIC   = 'CISTORE'
+STOREVERSION = 1
+STOREKEYSIZE = 64
+#-----------------------------------------------------------------------------
+def writeStore(filename, edges, keys, ncols, record):
+    # record(r) returns the data of record r as an array('d') of
+    # nbins x ncols values, so that the records need not all be in
+    # memory at once
+    nbins = len(edges)-1
+    for key in keys:
+        if len(key) >= STOREKEYSIZE:
+            sys.exit("** key %s too long" % key)
+    out = open(filename, 'wb')
+    out.write(struct.pack('8s6i', STOREMAGIC, STOREVERSION,
+                          len(keys), nbins, ncols, STOREKEYSIZE, 0))
+    array('d', edges).tofile(out)
+    for key in keys:
+        out.write(struct.pack('%ds' % STOREKEYSIZE, key))
+    for r in xrange(len(keys)):
+        data = record(r)
+        if len(data) != nbins*ncols:
+            sys.exit("** record %s of %s has %d values; expected %d" % \
+                     (keys[r], filename, len(data), nbins*ncols))
+        data.tofile(out)
+    out.close()
+    print "\t==> %s: %d records x %d bins x %d columns" % \
+      (filename, len(keys), nbins, ncols)